@@ -13,12 +13,21 @@ from common.Sphere import Sphere
 
 
 class BoundingGeometry:
-    _points: list[list[float]]
+    # points as numpy arrays which are concatenated into a single one when needed
+    _chunks: list[ndarray]
+    # points added by extendByPoint since the last concatenation
+    _singlePoints: list[list[float]]
+    _hullPoints: Optional[ndarray]
     _sphere: Optional[Sphere]
     _box: Optional[Box]
+    # use Ritter's approximate bounding sphere instead of the minimal bounding sphere of the convex hull
+    approximate: bool
 
-    def __init__(self, points=None):
-        self._points = []
+    def __init__(self, points=None, approximate: bool = False):
+        self._chunks = []
+        self._singlePoints = []
+        self.approximate = approximate
+        self._resetSphereAndBox()
         if points is not None:
             self.extendByPoints(points)
 
@@ -32,18 +41,44 @@ class BoundingGeometry:
             self._computeBoundingBox()
         return self._box
 
-    def _computeBoundingSphere(self) -> None:
-        if len(self._points) == 0:
-            raise Exception("missing points")
+    def getHullPoints(self) -> ndarray:
+        # vertices of the convex hull in the order they were added (or all points if the hull is degenerate)
+        if self._hullPoints is None:
+            points = self._getPoints()
+            if len(points) == 0:
+                raise Exception("missing points")
+
+            try:
+                hull = ConvexHull(points)
+                self._hullPoints = points[hull.vertices]
+            except QhullError:
+                self._hullPoints = points
+
+        return self._hullPoints
+
+    def _getPoints(self) -> ndarray:
+        self._concatenateSinglePoints()
+        if len(self._chunks) == 0:
+            return np.empty((0, 3))
+        if len(self._chunks) > 1:
+            self._chunks = [np.concatenate(self._chunks)]
+        return self._chunks[0]
+
+    def _concatenateSinglePoints(self) -> None:
+        if len(self._singlePoints) > 0:
+            self._chunks.append(np.array(self._singlePoints, dtype=float))
+            self._singlePoints = []
 
-        try:
-            hull = ConvexHull(self._points)
-            vertices = hull.vertices
-        except QhullError:
-            vertices = range(len(self._points))
+    def _computeBoundingSphere(self) -> None:
+        if self.approximate:
+            points = self._getPoints()
+            if len(points) == 0:
+                raise Exception("missing points")
 
-        points = np.array([self._points[i] for i in vertices])
+            self._sphere = BoundingGeometry.calculateRitterSphere(points)
+            return
 
+        points = self.getHullPoints()
         try:
             rng = np.random.default_rng(seed=0)
             center, r2 = miniball.get_bounding_ball(points, rng=rng)
@@ -56,23 +91,63 @@ class BoundingGeometry:
         radius = max(np.linalg.norm(np.subtract(convexHullPoints, center), axis=1))
         self._sphere = Sphere(center.tolist(), radius)
 
+    @staticmethod
+    def calculateRitterSphere(points: ndarray) -> Sphere:
+        """
+        Ritter's approximate bounding sphere: starts with the sphere spanned by two distant points and grows it
+        towards the point furthest outside until all points are enclosed. This is only an approximation without a
+        tight bound: the sphere always encloses all points but is larger than the minimal bounding sphere, usually
+        by a few percent, by 5 to 20 percent for some point sets (e.g. groups of distant entities). In exchange it
+        only needs a few vectorized passes over the points.
+        """
+        first = points[np.argmax(np.linalg.norm(points - points[0], axis=1))]
+        second = points[np.argmax(np.linalg.norm(points - first, axis=1))]
+        center = (first + second) / 2
+        radius = np.linalg.norm(second - first) / 2
+
+        # a grown sphere contains the previous one, hence only the points outside need to be considered further
+        candidates = points
+        while True:
+            distances = np.linalg.norm(candidates - center, axis=1)
+            outside = distances > radius * (1 + 1e-9)
+            if not outside.any():
+                break
+
+            candidates = candidates[outside]
+            distances = distances[outside]
+            furthest = np.argmax(distances)
+            distance = distances[furthest]
+
+            newRadius = (radius + distance) / 2
+            center = center + (candidates[furthest] - center) * ((newRadius - radius) / distance)
+            radius = newRadius
+
+        # guarantee that rounding errors do not leave points slightly outside
+        radius = max(radius, np.max(np.linalg.norm(points - center, axis=1)))
+        return Sphere(center.tolist(), float(radius))
+
     def _computeBoundingBox(self) -> None:
-        if len(self._points) == 0:
+        points = self._getPoints()
+        if len(points) == 0:
             raise Exception("missing points")
 
-        points = np.array(self._points)
         self._box = Box(np.min(points, axis=0).tolist(), np.max(points, axis=0).tolist())
 
     def _resetSphereAndBox(self) -> None:
+        self._hullPoints = None
         self._sphere = None
         self._box = None
 
     def extendByPoint(self, point: list[float]) -> None:
-        self._points.append(point)
+        self._singlePoints.append(point)
         self._resetSphereAndBox()
 
     def extendByPoints(self, points: list[list[float]]) -> None:
-        self._points.extend(points)
+        if len(points) == 0:
+            return
+
+        self._concatenateSinglePoints()
+        self._chunks.append(np.array(points, dtype=float))
         self._resetSphereAndBox()
 
     def extendBySphere(self, center: list[float], radius: float) -> None:
@@ -82,4 +157,4 @@ class BoundingGeometry:
         self.extendByPoints([minVertex, maxVertex])
 
     def extendByBoundingGeometry(self, boundingGeometry: "BoundingGeometry") -> None:
-        self.extendByPoints(boundingGeometry._points)
+        self.extendByPoints(boundingGeometry._getPoints())
@@ -50,6 +50,10 @@ class Box:
         self.min = np.minimum(self.min, point).tolist()
         self.max = np.maximum(self.max, point).tolist()
 
+    def extendByBox(self, box: "Box"):
+        self.min = np.minimum(self.min, box.min).tolist()
+        self.max = np.maximum(self.max, box.max).tolist()
+
     def isValid(self):
         for i in range(3):
             if not math.isfinite(self.min[i]) or not math.isfinite(self.max[i]) or self.min[i] > self.max[i]:
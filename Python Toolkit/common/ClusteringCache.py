@@ -0,0 +1,132 @@
+import hashlib
+import os
+from typing import Any, Callable, Optional
+
+import numpy as np
+import scipy
+import sklearn
+
+
+class ClusteringCache:
+    """
+    Persistent memoization of clustering results. The clusterings are deterministic functions of the points and the
+    parameters, hence their results are stored on disk keyed by a hash of both and reused by later runs on the same
+    inputs. The results (an array or a tuple of arrays, lists and numbers) are stored as .npz files and loaded without
+    pickle. The least recently used entries are evicted once the entries exceed MAX_SIZE bytes in total.
+    """
+
+    # incremented whenever the results of the clustering functions change for the same inputs
+    CACHE_VERSION = 2
+    MAX_SIZE = 64 << 20
+    EXTENSION = ".npz"
+
+    # directory of the cache entries or None to disable the cache
+    directory: Optional[str] = os.path.join(os.path.dirname(__file__), "..", ".clusteringCache")
+
+    # total size of the entries as known to this process or None if the directory was not scanned yet
+    _size: Optional[int] = None
+
+    @staticmethod
+    def getOrCompute(function: str, X: np.ndarray, parameters: tuple, compute: Callable[[], Any]) -> Any:
+        if ClusteringCache.directory is None:
+            return compute()
+
+        key = ClusteringCache.calculateKey(function, X, parameters)
+        path = os.path.join(ClusteringCache.directory, key + ClusteringCache.EXTENSION)
+        try:
+            result = ClusteringCache._read(path)
+            # the modification time of an entry is the time it was last used
+            os.utime(path)
+            return result
+        except Exception:
+            pass
+
+        result = compute()
+        ClusteringCache._write(path, result)
+        return result
+
+    @staticmethod
+    def calculateKey(function: str, X: np.ndarray, parameters: tuple) -> str:
+        points = np.ascontiguousarray(X, dtype=np.float64)
+        hasher = hashlib.sha256(repr((ClusteringCache.CACHE_VERSION, np.__version__, scipy.__version__, sklearn.__version__, function, points.shape, parameters)).encode())
+        hasher.update(points.tobytes())
+        return hasher.hexdigest()
+
+    @staticmethod
+    def _read(path: str) -> Any:
+        with np.load(path, allow_pickle=False) as arrays:
+            items = []
+            for i, kind in enumerate(arrays["kinds"].tolist()):
+                item = arrays[str(i)]
+                if kind == "list":
+                    item = item.tolist()
+                elif kind == "int":
+                    item = int(item)
+                elif kind == "float":
+                    item = float(item)
+                items.append(item)
+
+            return tuple(items) if bool(arrays["isTuple"]) else items[0]
+
+    @staticmethod
+    def _toArrays(result: Any) -> dict[str, np.ndarray]:
+        isTuple = isinstance(result, tuple)
+        items = result if isTuple else (result,)
+        kinds = []
+        arrays = {"isTuple": np.array(isTuple)}
+        for i, item in enumerate(items):
+            if isinstance(item, np.ndarray):
+                kinds.append("array")
+            elif isinstance(item, list):
+                kinds.append("list")
+            elif isinstance(item, (int, np.integer)):
+                kinds.append("int")
+            else:
+                kinds.append("float")
+            arrays[str(i)] = np.asarray(item)
+        arrays["kinds"] = np.array(kinds)
+        return arrays
+
+    @staticmethod
+    def _write(path: str, result: Any):
+        # entries are written by several worker processes, hence the temporary file is unique per process
+        tmpPath = path + "." + str(os.getpid()) + ".tmp"
+        try:
+            os.makedirs(ClusteringCache.directory, exist_ok=True)
+            with open(tmpPath, "wb") as f:
+                np.savez(f, **ClusteringCache._toArrays(result))
+            size = os.path.getsize(tmpPath)
+            os.replace(tmpPath, path)
+        except OSError as e:
+            print("\t\tWARNING: could not write clustering cache entry " + path + ": " + str(e))
+            return
+
+        if ClusteringCache._size is None:
+            ClusteringCache._evict()
+        else:
+            ClusteringCache._size += size
+            if ClusteringCache._size > ClusteringCache.MAX_SIZE:
+                ClusteringCache._evict()
+
+    @staticmethod
+    def _evict():
+        entries = []
+        for entry in os.scandir(ClusteringCache.directory):
+            if entry.name.endswith(ClusteringCache.EXTENSION):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+        size = sum(entrySize for mtime, entrySize, entryPath in entries)
+        for mtime, entrySize, entryPath in sorted(entries):
+            if size <= ClusteringCache.MAX_SIZE:
+                break
+            try:
+                os.remove(entryPath)
+            except OSError:
+                continue
+            size -= entrySize
+
+        ClusteringCache._size = size
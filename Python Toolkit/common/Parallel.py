@@ -0,0 +1,68 @@
+import contextlib
+import io
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Iterator, Optional
+
+from common.ClusteringCache import ClusteringCache
+
+# context of the current pool, set once per worker process so it does not need to be sent along with every task
+_context: Any = None
+
+
+class Parallel:
+    @staticmethod
+    def map(function: Callable[..., Any], context: Any, tasks: list[tuple], jobs: int, pool: Optional[ProcessPoolExecutor] = None) -> list[Any]:
+        """Calls function(context, *task) for all tasks and returns the results in the order of tasks.
+
+        With jobs > 1 the tasks are distributed over a pool of worker processes. Hence, function must be defined
+        at module or class level and context as well as the tasks must be picklable. Output printed by a task is
+        captured and printed in order of the tasks, so the log is the same as when running serially.
+
+        If pool (see createPool) is given, the tasks are run by its worker processes with the context the pool was
+        created with instead of starting a new pool for this call.
+        """
+        return list(Parallel.imap(function, context, tasks, jobs, pool))
+
+    @staticmethod
+    def imap(function: Callable[..., Any], context: Any, tasks: list[tuple], jobs: int, pool: Optional[ProcessPoolExecutor] = None) -> Iterator[Any]:
+        """Same as map but yields the results one after another, so that the caller can process (e.g. write) each
+        result before the next one is computed (jobs <= 1) or received from the pool."""
+        if jobs <= 1 or len(tasks) <= 1:
+            for task in tasks:
+                yield function(context, *task)
+            return
+
+        if pool is not None:
+            yield from Parallel._imapPool(pool, function, tasks)
+            return
+
+        with Parallel.createPool(context, min(jobs, len(tasks))) as pool:
+            yield from Parallel._imapPool(pool, function, tasks)
+
+    @staticmethod
+    def createPool(context: Any, jobs: int) -> ProcessPoolExecutor:
+        """Creates a pool of worker processes which can be shared by several calls of map and imap. The context is
+        sent to each worker process only once when it is started, hence it must not change in a way that affects the
+        tasks while the pool is in use. The caller is responsible for shutting down the pool."""
+        return ProcessPoolExecutor(max_workers=jobs, initializer=Parallel._initWorker, initargs=(context, ClusteringCache.directory))
+
+    @staticmethod
+    def _imapPool(pool: ProcessPoolExecutor, function: Callable[..., Any], tasks: list[tuple]) -> Iterator[Any]:
+        for result, output in pool.map(Parallel._runTask, [function] * len(tasks), tasks):
+            print(output, end="")
+            yield result
+
+    @staticmethod
+    def _initWorker(context: Any, clusteringCacheDirectory: Optional[str]):
+        global _context
+        _context = context
+        # worker processes may be spawned rather than forked, hence settings changed by main are passed explicitly
+        ClusteringCache.directory = clusteringCacheDirectory
+
+    @staticmethod
+    def _runTask(function: Callable[..., Any], task: tuple) -> tuple[Any, str]:
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            result = function(_context, *task)
+
+        return result, output.getvalue()
@@ -0,0 +1,59 @@
+import re
+from typing import Union
+
+
+class Template:
+    """
+    Text template with ${NAME} placeholders which is parsed once and can then be rendered any number of times.
+
+    A placeholder that forms a line on its own (e.g. ${ENTITIES} between <entities> and </entities>) is a block
+    placeholder: its value replaces the whole line including the line break, so the value should end with a line
+    break itself (or be empty). A value may also be given as list of chunks which are emitted one after another.
+    Placeholders without a value are kept as they are.
+    """
+
+    _PLACEHOLDER_PATTERN = re.compile('^\\$\\{([^}]+)\\}\\n|\\$\\{([^}]+)\\}', re.M)
+
+    content: str
+    # literal text before the first placeholder
+    head: str
+    # (name, placeholder as written in content, literal text following the placeholder)
+    segments: list[tuple[str, str, str]]
+
+    @staticmethod
+    def readFile(path: str) -> "Template":
+        f = open(path, 'r')
+        content = f.read()
+        f.close()
+
+        return Template(content)
+
+    def __init__(self, content: str):
+        self.content = content
+        self.segments = []
+
+        matches = list(Template._PLACEHOLDER_PATTERN.finditer(content))
+        self.head = content[:matches[0].start()] if matches else content
+        for i, match in enumerate(matches):
+            end = matches[i + 1].start() if i + 1 < len(matches) else len(content)
+            name = match.group(1) if match.group(1) is not None else match.group(2)
+            self.segments.append((name, match.group(0), content[match.end():end]))
+
+    def render(self, values: dict[str, Union[str, list[str]]]) -> str:
+        parts = []
+        self.renderTo(parts, values)
+        return "".join(parts)
+
+    def renderTo(self, parts: list[str], values: dict[str, Union[str, list[str]]]):
+        """
+        Appends the rendered template to parts. Rendering many items into the same list and joining it once
+        avoids creating intermediate strings for each item.
+        """
+        parts.append(self.head)
+        for name, placeholder, literal in self.segments:
+            value = values.get(name, placeholder)
+            if isinstance(value, str):
+                parts.append(value)
+            else:
+                parts.extend(value)
+            parts.append(literal)
@@ -1,3 +1,4 @@
+import heapq
 import math
 import os
 import shutil
@@ -9,7 +10,7 @@ import numpy as np
 import transforms3d
 from datetime import datetime
 from natsort import natsorted
-from scipy.spatial import ConvexHull
+from scipy.spatial import ConvexHull, KDTree
 from scipy.spatial.distance import pdist
 from scipy.spatial.qhull import QhullError
 from sklearn.cluster import AgglomerativeClustering
@@ -18,10 +19,13 @@ from shapely.geometry import Point
 from shapely.geometry.polygon import Polygon
 
 from common import Box, Sphere
+from common.ClusteringCache import ClusteringCache
 
 
 class Util:
     MIN_LOD_DISTANCE = 10
+    # upper bound of the number of coordinate differences held in memory at once when computing pairwise distances
+    PAIRWISE_DISTANCE_BLOCK_ELEMENTS = 1 << 18
 
     @staticmethod
     def floatToStr(val: float) -> str:
@@ -34,6 +38,19 @@ class Util:
             converted.append(Util.floatToStr(vertex[i]))
         return " ".join(converted)
 
+    @staticmethod
+    def getVectorFormat(length: int) -> str:
+        # %-style format of a vector with the given number of components, yields the same as vectorToStr
+        return " ".join(["%.8f"] * length)
+
+    @staticmethod
+    def formatRows(rowFormat: str, rows: np.ndarray) -> str:
+        """
+        Formats all rows of the 2D array rows at once (similar to np.savetxt), each row with the %-style rowFormat,
+        and returns them concatenated.
+        """
+        return "".join([rowFormat % row for row in map(tuple, rows.tolist())])
+
     @staticmethod
     def calculateFurthestDistance(coords: list[list[float]]) -> float:
         coords = np.unique(coords, axis=0)
@@ -43,37 +60,67 @@ class Util:
         elif len(coords) == 1:
             return 0
         elif len(coords[0]) == 1:
-            return max(coords) - min(coords)
+            return coords.max() - coords.min()
         elif len(coords) < 11:
             # this is only mandatory for len(coords) < 5 because ConvexHull needs at least 5 points
             # however if there are only a few points then just compute the pairwise distances
             return max(pdist(coords))
+        elif len(coords) < 100:
+            # computing the convex hull does not pay off for a moderate number of points
+            return Util._calculateMaxPairwiseDistance(coords)
 
         # for a large set of points do not compute the pairwise distances but first calculate the convex hull and
         # just compute the maximum of the pairwise distances from that hull vertices.
-        # also don't use pdist here since we are only interested in the maximum distances and hence there is no need to
-        # actually create a list of size n*(n-1)/2 (where n is the number of vertices of the convex hull)
-        points = np.array(coords)
         try:
-            hull = ConvexHull(points)
+            hull = ConvexHull(coords)
             vertices = hull.vertices
         except QhullError:
-            vertices = range(len(coords))
+            vertices = np.arange(len(coords))
 
-        maxDistance = 0
-        for index1 in vertices:
-            point1 = coords[index1]
-            for index2 in vertices:
-                if index1 >= index2:
-                    continue
+        return Util._calculateMaxPairwiseDistance(coords[vertices])
 
-                point2 = coords[index2]
-                maxDistance = max(maxDistance, math.dist(point1, point2))
+    @staticmethod
+    def _calculateMaxPairwiseDistance(points: np.ndarray) -> float:
+        # don't use pdist here since we are only interested in the maximum distance and hence there is no need to
+        # actually create a list of size n*(n-1)/2. instead compare blocks of rows against all points.
+        numPoints = len(points)
+        blockSize = max(1, Util.PAIRWISE_DISTANCE_BLOCK_ELEMENTS // numPoints)
+
+        maxSquaredDistance = -1
+        furthestPair = (0, 0)
+        for start in range(0, numPoints, blockSize):
+            differences = points[start:start + blockSize, None, :] - points[None, :, :]
+            squaredDistances = np.einsum("ijk,ijk->ij", differences, differences)
+            row, column = np.unravel_index(np.argmax(squaredDistances), squaredDistances.shape)
+            if squaredDistances[row, column] > maxSquaredDistance:
+                maxSquaredDistance = squaredDistances[row, column]
+                furthestPair = (start + row, column)
 
-        return maxDistance
+        return math.dist(points[furthestPair[0]], points[furthestPair[1]])
 
     @staticmethod
-    def _performClustering(X: np.ndarray, numClusters: Optional[int], distanceThreshold: Optional[float], unevenClusters: bool) -> (Any, int, list[float]):
+    def calculateFurthestDistances(X: np.ndarray, clusters) -> list[float]:
+        """
+        Calculates the furthest distance within each cluster of the given clustering in one pass, indexed by cluster.
+        Clusters without points have a furthest distance of 0.
+        """
+        clusters = np.asarray(clusters)
+        numClusters = clusters.max() + 1
+
+        # stable sort keeps the points of each cluster in their original order
+        order = np.argsort(clusters, kind="stable")
+        bounds = np.searchsorted(clusters[order], np.arange(numClusters + 1))
+
+        furthestDistances = [0] * numClusters
+        for cluster in range(numClusters):
+            if bounds[cluster] < bounds[cluster + 1]:
+                furthestDistances[cluster] = Util.calculateFurthestDistance(X[order[bounds[cluster]:bounds[cluster + 1]]])
+
+        return furthestDistances
+
+    @staticmethod
+    def _performClustering(X: np.ndarray, numClusters: Optional[int], distanceThreshold: Optional[float], unevenClusters: bool,
+                           initialCenters: Optional[np.ndarray] = None) -> (Any, int, list[float]):
         numPoints = X.shape[0]
         if numClusters is None:
             print("\t\tcalculating clustering using distance threshold " + str(distanceThreshold) + " for " + str(numPoints) + " points")
@@ -87,22 +134,15 @@ class Util:
         else:
             if unevenClusters:
                 model = AgglomerativeClustering(n_clusters=numClusters, distance_threshold=distanceThreshold, linkage="complete")
+            elif initialCenters is not None:
+                model = KMeans(n_clusters=numClusters, init=initialCenters, n_init=1)
             else:
                 model = KMeans(n_clusters=numClusters, random_state=0, n_init=10)
             clusters = model.fit_predict(X)
 
             clusters = Util._fixClusterLabels(clusters, X)
 
-        numClusters = max(clusters) + 1
-
-        maxClusterSize = -1
-        furthestDistances = [0] * numClusters
-        for cluster in np.unique(clusters):
-            clusterEntries = np.where(clusters == cluster)
-
-            maxClusterSize = max(maxClusterSize, len(clusterEntries[0]))
-
-            furthestDistances[cluster] = Util.calculateFurthestDistance(X[clusterEntries[0]])
+        maxClusterSize, furthestDistances = Util._calculateClusterSizeAndFurthestDistances(X, clusters)
 
         return clusters, maxClusterSize, furthestDistances
 
@@ -194,12 +234,57 @@ class Util:
     @staticmethod
     def performClusteringFixedNumClusters(points: list[list[float]], numClusters: int, unevenClusters: bool = False) -> (Any, int, list[float]):
         X = np.array(points)
-        return Util._performClustering(X, numClusters, None, unevenClusters)
+        return ClusteringCache.getOrCompute("performClusteringFixedNumClusters", X, (numClusters, unevenClusters),
+                                            lambda: Util._performClustering(X, numClusters, None, unevenClusters))
 
     @staticmethod
     def performClusteringMaxFurthestDistance(points: list[list[float]], maxFurthestDistance: float) -> (Any, int, list[float]):
         X = np.array(points)
-        return Util._performClustering(X, None, maxFurthestDistance, True)
+        return ClusteringCache.getOrCompute("performClusteringMaxFurthestDistance", X, (maxFurthestDistance,),
+                                            lambda: Util._performClustering(X, None, maxFurthestDistance, True))
+
+    @staticmethod
+    def performGreedyClusteringMaxFurthestDistance(points: list[list[float]], maxFurthestDistance: float) -> np.ndarray:
+        X = np.array(points, dtype=float)
+        return ClusteringCache.getOrCompute("performGreedyClusteringMaxFurthestDistance", X, (maxFurthestDistance,),
+                                            lambda: Util._performGreedyClustering(X, maxFurthestDistance))
+
+    @staticmethod
+    def _performGreedyClustering(X: np.ndarray, maxFurthestDistance: float) -> np.ndarray:
+        # near-linear alternative to AgglomerativeClustering with complete linkage: every point not yet assigned
+        # (in input order) becomes the seed of a new cluster, which then grows by the unassigned points nearest to the
+        # seed as long as the furthest distance within the cluster does not exceed maxFurthestDistance
+        numPoints = len(X)
+        print("\t\tcalculating greedy clustering using distance threshold " + str(maxFurthestDistance) + " for " + str(numPoints) + " points")
+
+        clusters = np.full(numPoints, -1, dtype=int)
+        if numPoints == 0:
+            return clusters
+
+        tree = KDTree(X)
+        numClusters = 0
+        for seed in range(numPoints):
+            if clusters[seed] >= 0:
+                continue
+
+            candidates = np.array(tree.query_ball_point(X[seed], maxFurthestDistance), dtype=int)
+            candidates = candidates[clusters[candidates] < 0]
+            distances = np.linalg.norm(X[candidates] - X[seed], axis=1)
+            order = np.argsort(distances, kind="stable")
+            candidates = candidates[order]
+            distances = distances[order]
+
+            # points within half of maxFurthestDistance to the seed cannot be further apart than maxFurthestDistance
+            numWithinHalf = np.searchsorted(distances, maxFurthestDistance / 2, side="right")
+            members = list(candidates[:numWithinHalf])
+            for candidate in candidates[numWithinHalf:]:
+                if np.linalg.norm(X[members] - X[candidate], axis=1).max() <= maxFurthestDistance:
+                    members.append(candidate)
+
+            clusters[members] = numClusters
+            numClusters += 1
+
+        return clusters
 
     @staticmethod
     def performClustering(points: list[list[float]], maxPoints: int, maxFurthestDistance: float, unevenClusters: bool = False) -> (Any, list[float]):
@@ -208,7 +293,57 @@ class Util:
             return np.array([0]), [0]
 
         X = np.array(points)
+        return ClusteringCache.getOrCompute("performClustering", X, (maxPoints, maxFurthestDistance, unevenClusters),
+                                            lambda: Util._performClusteringWithLimits(X, maxPoints, maxFurthestDistance, unevenClusters))
+
+    @staticmethod
+    def _performClusteringWithLimits(X: np.ndarray, maxPoints: int, maxFurthestDistance: float, unevenClusters: bool) -> (Any, list[float]):
+        numPoints = X.shape[0]
 
+        # a single hierarchical decomposition provides a valid clustering as upper bound for the number of clusters
+        # and, cut at any lower number of clusters, the initial centers for KMeans
+        splits = Util._calculateBisectionHierarchy(X, maxPoints, maxFurthestDistance)
+        smallestValidNumClusters = len(splits) + 1
+        clustersForSmallestValidNumClusters = Util._fixClusterLabels(Util._cutBisectionHierarchy(splits, smallestValidNumClusters, numPoints), X)
+        maxClusterSize, furthestDistancesForSmallestValidNumClusters = Util._calculateClusterSizeAndFurthestDistances(X, clustersForSmallestValidNumClusters)
+        if Util._exceedsClusteringLimits(clustersForSmallestValidNumClusters, maxClusterSize, furthestDistancesForSmallestValidNumClusters, maxPoints, maxFurthestDistance):
+            # the hierarchy could not be split any further, hence it does not provide an upper bound
+            return Util._performClusteringWithLimitsBySearch(X, maxPoints, maxFurthestDistance, unevenClusters)
+
+        # with fewer clusters at least one cluster exceeds maxPoints
+        largestNonValidNumClusters = math.ceil(numPoints / maxPoints) - 1 if maxPoints > 0 else 0
+
+        while largestNonValidNumClusters + 1 < smallestValidNumClusters:
+            numClusters = math.floor((largestNonValidNumClusters + smallestValidNumClusters) / 2)
+
+            # warm start from the centroids of the smallest valid clustering found so far, merged down to numClusters
+            # starting from the centroids of the hierarchy cut (KMeans only, the agglomerative clustering has no centers)
+            initialCenters = None
+            if not unevenClusters:
+                initialCenters = Util._calculateClusterCenters(X, Util._cutBisectionHierarchy(splits, numClusters, numPoints), numClusters)
+                initialCenters = Util._mergeClusterCenters(X, clustersForSmallestValidNumClusters, initialCenters)
+            clusters, maxClusterSize, furthestDistances = Util._performClustering(X, numClusters, None, unevenClusters, initialCenters)
+            exceedsLimits = Util._exceedsClusteringLimits(clusters, maxClusterSize, furthestDistances, maxPoints, maxFurthestDistance)
+            if exceedsLimits and not unevenClusters:
+                # a single warm-started fit may end in a worse local optimum than the fit with several initializations
+                clusters, maxClusterSize, furthestDistances = Util._performClustering(X, numClusters, None, unevenClusters)
+                exceedsLimits = Util._exceedsClusteringLimits(clusters, maxClusterSize, furthestDistances, maxPoints, maxFurthestDistance)
+
+            if exceedsLimits:
+                largestNonValidNumClusters = numClusters
+            else:
+                clustersForSmallestValidNumClusters = clusters
+                furthestDistancesForSmallestValidNumClusters = furthestDistances
+                smallestValidNumClusters = numClusters
+
+        print("\t\tfound valid clustering consisting of " + str(len(np.unique(clustersForSmallestValidNumClusters))) + " clusters")
+
+        return clustersForSmallestValidNumClusters, furthestDistancesForSmallestValidNumClusters
+
+    @staticmethod
+    def _performClusteringWithLimitsBySearch(X: np.ndarray, maxPoints: int, maxFurthestDistance: float, unevenClusters: bool) -> (Any, list[float]):
+        # increases the number of clusters until the limits are met and then binary searches the smallest valid one
+        numPoints = X.shape[0]
         largestNonValidNumClusters = 0
         smallestValidNumClusters = None
         clustersForSmallestValidNumClusters = None
@@ -222,15 +357,7 @@ class Util:
         while largestNonValidNumClusters + 1 != smallestValidNumClusters:
             clusters, maxClusterSize, furthestDistances = Util._performClustering(X, numClusters, None, unevenClusters)
 
-            furthestDistanceWeightedMean = 0
-            for cluster in np.unique(clusters):
-                clusterEntries = np.where(clusters == cluster)
-                clusterSize = len(clusterEntries[0])
-                furthestDistanceWeightedMean += clusterSize * furthestDistances[cluster]
-            furthestDistanceWeightedMean /= max(1, numPoints)
-
-            exceededLimits = 0 < maxPoints < maxClusterSize or furthestDistanceWeightedMean > maxFurthestDistance
-            if exceededLimits:
+            if Util._exceedsClusteringLimits(clusters, maxClusterSize, furthestDistances, maxPoints, maxFurthestDistance):
                 largestNonValidNumClusters = numClusters
                 if smallestValidNumClusters is None:
                     nextNumClusters = numClusters + 1
@@ -253,6 +380,98 @@ class Util:
 
         return clustersForSmallestValidNumClusters, furthestDistancesForSmallestValidNumClusters
 
+    @staticmethod
+    def _exceedsClusteringLimits(clusters, maxClusterSize: int, furthestDistances: list[float], maxPoints: int, maxFurthestDistance: float) -> bool:
+        numPoints = len(clusters)
+        clusterSizes = np.bincount(clusters)
+        furthestDistanceWeightedMean = np.dot(clusterSizes, furthestDistances) / max(1, numPoints)
+
+        return 0 < maxPoints < maxClusterSize or furthestDistanceWeightedMean > maxFurthestDistance
+
+    @staticmethod
+    def _calculateClusterSizeAndFurthestDistances(X: np.ndarray, clusters) -> (int, list[float]):
+        return np.bincount(clusters).max(), Util.calculateFurthestDistances(X, clusters)
+
+    @staticmethod
+    def _calculateBisectionHierarchy(X: np.ndarray, maxPoints: int, maxFurthestDistance: float) -> list[np.ndarray]:
+        """
+        Repeatedly bisects the cluster contributing most to the exceeded limits until the clustering satisfies them.
+        Returns the splits in order: split i moves the given point indices into the new cluster i + 1.
+        """
+        numPoints = X.shape[0]
+        members = [np.arange(numPoints)]
+        furthestDistances = [float(Util.calculateFurthestDistance(X))]
+        weightedFurthestDistanceSum = numPoints * furthestDistances[0]
+        numExceedingMaxPoints = 1 if 0 < maxPoints < numPoints else 0
+
+        def priority(cluster: int) -> tuple:
+            size = len(members[cluster])
+            return -(0 < maxPoints < size), -size * furthestDistances[cluster], cluster
+
+        heap = [priority(0)]
+        splits = []
+        while numExceedingMaxPoints > 0 or weightedFurthestDistanceSum / numPoints > maxFurthestDistance:
+            cluster = heapq.heappop(heap)[2]
+            indices = members[cluster]
+            if len(indices) < 2:
+                break
+
+            newCluster = len(members)
+            newIndices = indices[Util._bisect(X[indices])]
+            indices = np.setdiff1d(indices, newIndices, assume_unique=True)
+            members[cluster] = indices
+            members.append(newIndices)
+            splits.append(newIndices)
+
+            weightedFurthestDistanceSum -= (len(indices) + len(newIndices)) * furthestDistances[cluster]
+            numExceedingMaxPoints -= 0 < maxPoints < len(indices) + len(newIndices)
+            furthestDistances[cluster] = float(Util.calculateFurthestDistance(X[indices]))
+            furthestDistances.append(float(Util.calculateFurthestDistance(X[newIndices])))
+            for c in (cluster, newCluster):
+                weightedFurthestDistanceSum += len(members[c]) * furthestDistances[c]
+                numExceedingMaxPoints += 0 < maxPoints < len(members[c])
+                heapq.heappush(heap, priority(c))
+
+        return splits
+
+    @staticmethod
+    def _bisect(X: np.ndarray) -> np.ndarray:
+        # split along the principal axis at the centroid
+        centered = X - X.mean(axis=0)
+        direction = np.linalg.svd(centered, full_matrices=False)[2][0]
+        mask = centered @ direction > 0
+        if not mask.any() or mask.all():
+            # all points (almost) coincide
+            mask = np.arange(len(X)) >= len(X) // 2
+        return mask
+
+    @staticmethod
+    def _cutBisectionHierarchy(splits: list[np.ndarray], numClusters: int, numPoints: int) -> np.ndarray:
+        clusters = np.zeros(numPoints, dtype=int)
+        for i in range(numClusters - 1):
+            clusters[splits[i]] = i + 1
+        return clusters
+
+    @staticmethod
+    def _calculateClusterCenters(X: np.ndarray, clusters: np.ndarray, numClusters: int) -> np.ndarray:
+        counts = np.bincount(clusters, minlength=numClusters)
+        centers = np.zeros((numClusters, X.shape[1]))
+        np.add.at(centers, clusters, X)
+        return centers / counts[:, None]
+
+    @staticmethod
+    def _mergeClusterCenters(X: np.ndarray, clusters: np.ndarray, initialCenters: np.ndarray) -> np.ndarray:
+        # merges the centroids of the given clustering into len(initialCenters) centers by KMeans on the centroids
+        # weighted by the sizes of their clusters
+        numClusters = len(np.unique(clusters))
+        counts = np.bincount(clusters, minlength=numClusters)
+        centers = Util._calculateClusterCenters(X, clusters, numClusters)
+        if len(centers) <= len(initialCenters):
+            return initialCenters
+        model = KMeans(n_clusters=len(initialCenters), init=initialCenters, n_init=1)
+        model.fit(centers, sample_weight=counts)
+        return model.cluster_centers_
+
     @staticmethod
     def calculateLodDistance(boundingBox: Box, boundingSphere: Sphere, scale: list[float], hasParent: bool) -> float:
         scaledBoundingBox = boundingBox.getScaled(scale)
@@ -349,6 +568,16 @@ class Util:
         else:
             return vector / norm
 
+    @staticmethod
+    def normalizeAll(vectors: np.ndarray) -> np.ndarray:
+        """
+        Vectorized version of normalize for vectors of shape (n, m). The squared norms are computed as (batched) dot
+        products like np.linalg.norm does for a single vector, so results are bit-identical to normalize.
+        """
+        norms = np.sqrt(np.matmul(vectors[:, np.newaxis, :], vectors[:, :, np.newaxis])[:, 0, 0])
+        norms[np.abs(norms) < 1e-8] = 1
+        return vectors / norms[:, np.newaxis]
+
     @staticmethod
     def getFilenameFromMapname(mapName: str) -> str:
         return mapName + ".ymap.xml"
@@ -362,15 +591,20 @@ class Util:
 
     @staticmethod
     def findAvailableMapName(dir: str, mapName: str, suffix: str, ensureSuffix: bool) -> str:
+        return Util.findAvailableMapNameWith(lambda name: os.path.exists(os.path.join(dir, Util.getFilenameFromMapname(name))),
+                                             mapName, suffix, ensureSuffix)
+
+    @staticmethod
+    def findAvailableMapNameWith(exists: Callable[[str], bool], mapName: str, suffix: str, ensureSuffix: bool) -> str:
         if ensureSuffix:
             newMapName = re.sub(suffix + "\\d*$", "", mapName) + suffix
         else:
             newMapName = mapName
 
-        if os.path.exists(os.path.join(dir, Util.getFilenameFromMapname(newMapName))):
+        if exists(newMapName):
             newMapName = re.sub(suffix + "\\d*$", "", newMapName) + suffix
             i = -1
-            while os.path.exists(os.path.join(dir, Util.getFilenameFromMapname(newMapName + ("" if i < 0 else str(i))))):
+            while exists(newMapName + ("" if i < 0 else str(i))):
                 i += 1
             if i >= 0:
                 newMapName += str(i)
@@ -396,6 +630,36 @@ class Util:
     def applyTransformation(vertex: list[float], rotation: list[float], scaling: list[float], translation: list[float]) -> list[float]:
         return np.add(np.multiply(Util.applyRotation(vertex, rotation), scaling), translation).tolist()
 
+    @staticmethod
+    def applyRotations(vectors: np.ndarray, rotations: np.ndarray) -> np.ndarray:
+        """
+        Rotates vectors of shape (..., 3) by quaternions (w, x, y, z) of shape (..., 4), broadcasting the leading dimensions.
+
+        This evaluates the same floating point operations in the same order as applyRotation
+        (i.e. q * v * conjugate(q) in transforms3d), so results are bit-identical.
+        """
+        qw, qx, qy, qz = rotations[..., 0], rotations[..., 1], rotations[..., 2], rotations[..., 3]
+        cw, cx, cy, cz = qw * 1.0, qx * -1.0, qy * -1.0, qz * -1.0
+        vx, vy, vz = vectors[..., 0], vectors[..., 1], vectors[..., 2]
+
+        # v * conjugate(q) with v = (0, vx, vy, vz)
+        w = 0.0 * cw - vx * cx - vy * cy - vz * cz
+        x = 0.0 * cx + vx * cw + vy * cz - vz * cy
+        y = 0.0 * cy + vy * cw + vz * cx - vx * cz
+        z = 0.0 * cz + vz * cw + vx * cy - vy * cx
+
+        # q * (v * conjugate(q)) without the unused w component
+        return np.stack([
+            qw * x + qx * w + qy * z - qz * y,
+            qw * y + qy * w + qz * x - qx * z,
+            qw * z + qz * w + qx * y - qy * x
+        ], axis=-1)
+
+    @staticmethod
+    def applyTransformations(vertices: np.ndarray, rotations: np.ndarray, scalings: np.ndarray, translations: np.ndarray) -> np.ndarray:
+        # vectorized version of applyTransformation, see applyRotations
+        return Util.applyRotations(vertices, rotations) * scalings + translations
+
     @staticmethod
     def hashFloat(val: float) -> int:
         return hash(round(val, ndigits=5))
@@ -0,0 +1,54 @@
+from typing import Callable, Optional
+
+import numpy as np
+
+from common.Util import Util
+
+
+class EntityIndex:
+    """
+    Compact index of the entity blocks of a ymap which are emitted again in a second pass (e.g. after clustering).
+    In contrast to ParsedYmap it does not keep the parsed entities but only the span of each entity block within
+    the content and one integer tag per entity (e.g. the group an entity belongs to), both stored as numpy arrays.
+    The content itself is only kept if the map is held in memory anyway, otherwise it is read again from path.
+    """
+
+    # content of the ymap or None if it is read from path when needed
+    content: Optional[str]
+    path: Optional[str]
+    # start and end offsets of each entity block within content, shape (n, 2)
+    spans: np.ndarray
+    # arbitrary integer tag of each entity, shape (n,)
+    tags: np.ndarray
+
+    def __init__(self, content: Optional[str], spans: list[tuple[int, int]], tags: Optional[list[int]] = None, path: Optional[str] = None):
+        self.content = content
+        self.path = path
+        self.spans = np.array(spans, dtype=np.int64).reshape(-1, 2)
+        self.tags = np.zeros(len(self.spans), dtype=np.int32) if tags is None else np.array(tags, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self.spans)
+
+    def getContent(self) -> str:
+        return Util.readFile(self.path) if self.content is None else self.content
+
+    def getEntityContent(self, index: int) -> str:
+        start, end = self.spans[index]
+        return self.getContent()[start:end]
+
+    def getEntityContents(self) -> list[str]:
+        content = self.getContent()
+        return [content[start:end] for start, end in self.spans.tolist()]
+
+    def replaceEntities(self, repl: Callable[[int, str], str]) -> str:
+        content = self.getContent()
+        parts = []
+        pos = 0
+        for i, (start, end) in enumerate(self.spans.tolist()):
+            parts.append(content[pos:start])
+            parts.append(repl(i, content[start:end]))
+            pos = end
+        parts.append(content[pos:])
+
+        return "".join(parts)
@@ -14,9 +14,11 @@ class EntityItem:
     numChildren: Optional[int]
     lodLevel: Optional[str]
     flags: Optional[int]
+    priorityLevel: Optional[str]
 
     def __init__(self, archetypeName: str, position: list[float], scale: list[float], rotation: list[float], lodDistance: float, childLodDist: Optional[float] = None,
-            parentIndex: Optional[int] = None, numChildren: Optional[int] = None, lodLevel: Optional[str] = None, flags: Optional[int] = None):
+            parentIndex: Optional[int] = None, numChildren: Optional[int] = None, lodLevel: Optional[str] = None, flags: Optional[int] = None,
+            priorityLevel: Optional[str] = None):
         self.archetypeName = archetypeName
         self.position = position
         self.scale = scale
@@ -27,6 +29,7 @@ class EntityItem:
         self.numChildren = numChildren
         self.lodLevel = lodLevel
         self.flags = flags
+        self.priorityLevel = priorityLevel
 
     def applyTransformationTo(self, vertex: list[float]) -> list[float]:
         return Util.applyTransformation(vertex, self.rotation, self.scale, self.position)
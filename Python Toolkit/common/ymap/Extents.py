@@ -1,78 +1,81 @@
 import numpy as np
-import transforms3d
-
-import re
 
 from common.Box import Box
 from common.Util import Util
+from common.ymap.Patterns import Patterns
 from common.ytyp.YtypItem import YtypItem
 
 
 class Extents:
     CARGEN_LOD_DISTANCE = 250
 
+    # for each of the 8 corners of a box whether to take min (0) or max (1) per axis
+    _CORNER_SELECTION = np.array([[i % 2, (i >> 1) % 2, (i >> 2) % 2] for i in range(8)])
+
     @staticmethod
     def createReversedInfinityExtents() -> "Extents":
         return Extents(Box.createReversedInfinityBox(), Box.createReversedInfinityBox())
 
-    @staticmethod
-    def getExpressionForCalculateExtents() -> str:
-        return '<Item type="CEntityDef">' + \
-               '\\s*<archetypeName>([^<]+)</archetypeName>' + \
-               '(?:\\s*<[^/].*>)*?' + \
-               '\\s*<position x="([^"]+)" y="([^"]+)" z="([^"]+)"/>' + \
-               '\\s*<rotation x="([^"]+)" y="([^"]+)" z="([^"]+)" w="([^"]+)"/>' + \
-               '\\s*<scaleXY value="([^"]+)"/>' + \
-               '\\s*<scaleZ value="([^"]+)"/>' + \
-               '(?:\\s*<[^/].*>)*?' + \
-               '\\s*<lodDist value="([^"]+)"/>' + \
-               '(?:\\s*<[^/].*>)*?' + \
-               '\\s*</Item>'
-
-    @staticmethod
-    def getExpressionForCalculateExtentsCarGen() -> str:
-        return '<Item>' + \
-               '\\s*<position x="([^"]+)" y="([^"]+)" z="([^"]+)"/>' + \
-               '(?:\\s*<[^/].*>)*?' + \
-               '\\s*<perpendicularLength value="([^"]+)"/>' + \
-               '\\s*<carModel>([^<]+)</carModel>' + \
-               '(?:\\s*<[^/].*>)*?' + \
-               '\\s*</Item>'
-
     @staticmethod
     def calculateExtents(ymapContent: str, ytypItems: dict[str, YtypItem]) -> "Extents":
-        extents = Extents.createReversedInfinityExtents()
-
-        for match in re.finditer(Extents.getExpressionForCalculateExtents(), ymapContent):
+        positions = []
+        rotationQuaternions = []
+        scales = []
+        lodDistances = []
+        bboxMins = []
+        bboxMaxs = []
+
+        for match in Patterns.ENTITY_EXTENTS.finditer(ymapContent):
             archetypeName = match.group(1).lower()
 
             if archetypeName not in ytypItems:
                 print("WARNING: could not find archetype " + archetypeName + ". Proceeding without it but this might yield wrong extents")
                 continue
 
-            position = [float(match.group(2)), float(match.group(3)), float(match.group(4))]
-            rotationQuat = [float(match.group(8)), -float(match.group(5)), -float(match.group(6)), -float(match.group(7))]
-            scale = [float(match.group(9)), float(match.group(9)), float(match.group(10))]
+            positions.append([float(match.group(2)), float(match.group(3)), float(match.group(4))])
+            rotationQuaternions.append([float(match.group(8)), -float(match.group(5)), -float(match.group(6)), -float(match.group(7))])
+            scales.append([float(match.group(9)), float(match.group(9)), float(match.group(10))])
             lodDistance = float(match.group(11))
             if lodDistance < 0:
                 lodDistance = ytypItems[archetypeName].lodDist
+            lodDistances.append(lodDistance)
             bbox = ytypItems[archetypeName].boundingBox
+            bboxMins.append(bbox.min)
+            bboxMaxs.append(bbox.max)
 
-            extents.adaptExtents(position, rotationQuat, scale, lodDistance, bbox)
-
-        for match in re.finditer(Extents.getExpressionForCalculateExtentsCarGen(), ymapContent):
+        for match in Patterns.CAR_GENERATOR_EXTENTS.finditer(ymapContent):
             perpendicularLength = float(match.group(4))
             carModel = match.group(5).lower()
 
             print("INFO: found carGenerator for car model " + carModel + ". Using " + str(Extents.CARGEN_LOD_DISTANCE) + " as lodDistance.")
 
-            position = [float(match.group(1)), float(match.group(2)), float(match.group(3))]
+            positions.append([float(match.group(1)), float(match.group(2)), float(match.group(3))])
+            rotationQuaternions.append([0, 0, 0, 1])
+            scales.append([1, 1, 1])
+            lodDistances.append(Extents.CARGEN_LOD_DISTANCE)
             bbox = Box.createUnitBox().getScaled([perpendicularLength] * 3)
+            bboxMins.append(bbox.min)
+            bboxMaxs.append(bbox.max)
 
-            extents.adaptExtents(position, [0, 0, 0, 1], [1, 1, 1], Extents.CARGEN_LOD_DISTANCE, bbox)
-
+        extents = Extents.createReversedInfinityExtents()
+        extents.adaptExtentsOfAll(
+            np.array(positions, dtype=float).reshape(-1, 3),
+            np.array(rotationQuaternions, dtype=float).reshape(-1, 4),
+            np.array(scales, dtype=float).reshape(-1, 3),
+            np.array(lodDistances, dtype=float),
+            np.array(bboxMins, dtype=float).reshape(-1, 3),
+            np.array(bboxMaxs, dtype=float).reshape(-1, 3)
+        )
         return extents
 
+    @staticmethod
+    def getCorners(boxMins: np.ndarray, boxMaxs: np.ndarray) -> np.ndarray:
+        """
+        Returns the 8 corners of each of the given boxes as array of shape (n, 8, 3).
+        Corner i takes its x, y and z coordinate from min or max according to bit 0, 1 and 2 of i.
+        """
+        return np.stack([boxMins, boxMaxs], axis=1)[:, Extents._CORNER_SELECTION, [0, 1, 2]]
+
     entities: Box
     streaming: Box
 
@@ -81,11 +84,7 @@ class Extents:
         self.streaming = streaming
 
     def replaceExtents(self, contentYmap: str) -> str:
-        return re.sub(
-            '(<streamingExtentsMin x=")[^"]+(" y=")[^"]+(" z=")[^"]+("/>' +
-            '\\s*<streamingExtentsMax x=")[^"]+(" y=")[^"]+(" z=")[^"]+("/>' +
-            '\\s*<entitiesExtentsMin x=")[^"]+(" y=")[^"]+(" z=")[^"]+("/>' +
-            '\\s*<entitiesExtentsMax x=")[^"]+(" y=")[^"]+(" z=")[^"]+("/>)',
+        return Patterns.MAP_EXTENTS.sub(
             "\\g<1>" + Util.floatToStr(self.streaming.min[0]) + "\\g<2>" + Util.floatToStr(self.streaming.min[1]) + "\\g<3>" +
             Util.floatToStr(self.streaming.min[2]) +
             "\\g<4>" + Util.floatToStr(self.streaming.max[0]) + "\\g<5>" + Util.floatToStr(self.streaming.max[1]) + "\\g<6>" +
@@ -97,19 +96,33 @@ class Extents:
         )
 
     def adaptExtents(self, position: list[float], rotationQuaternion: list[float], scale: list[float], lodDistance: float, bbox: Box):
-        scaledBbox = bbox.getScaled(scale)
-        scaledLodBbox = scaledBbox.getExtended([lodDistance] * 3)
-
-        scaledBboxList = [scaledBbox.min, scaledBbox.max]
-        scaledLodBboxList = [scaledLodBbox.min, scaledLodBbox.max]
-        for i in range(8):
-            point = [scaledBboxList[i % 2][0], scaledBboxList[(i >> 1) % 2][1], scaledBboxList[(i >> 2) % 2][2]]
-            transformedPoint = np.add(transforms3d.quaternions.rotate_vector(point, rotationQuaternion), position).tolist()
-            self.entities.extendByPoint(transformedPoint)
-
-            lodPoint = [scaledLodBboxList[i % 2][0], scaledLodBboxList[(i >> 1) % 2][1], scaledLodBboxList[(i >> 2) % 2][2]]
-            transformedLodPoint = np.add(transforms3d.quaternions.rotate_vector(lodPoint, rotationQuaternion), position).tolist()
-            self.streaming.extendByPoint(transformedLodPoint)
+        self.adaptExtentsOfAll(
+            np.array([position], dtype=float), np.array([rotationQuaternion], dtype=float), np.array([scale], dtype=float),
+            np.array([lodDistance], dtype=float), np.array([bbox.min], dtype=float), np.array([bbox.max], dtype=float)
+        )
+
+    def adaptExtentsOfAll(self, positions: np.ndarray, rotationQuaternions: np.ndarray, scales: np.ndarray, lodDistances: np.ndarray,
+                          bboxMins: np.ndarray, bboxMaxs: np.ndarray):
+        """
+        Extends the extents by n entities at once, given as arrays of shape (n, 3) (resp. (n, 4) for the quaternions
+        and (n,) for the lod distances). Corners of all entities are transformed in a single pass.
+        """
+        if len(positions) == 0:
+            return
+
+        scaledMins = bboxMins * scales
+        scaledMaxs = bboxMaxs * scales
+        lodDistances = lodDistances[:, np.newaxis]
+
+        positions = positions[:, np.newaxis, :]
+        rotationQuaternions = rotationQuaternions[:, np.newaxis, :]
+        corners = Util.applyRotations(Extents.getCorners(scaledMins, scaledMaxs), rotationQuaternions) + positions
+        lodCorners = Util.applyRotations(Extents.getCorners(scaledMins - lodDistances, scaledMaxs + lodDistances), rotationQuaternions) + positions
+
+        corners = corners.reshape(-1, 3)
+        lodCorners = lodCorners.reshape(-1, 3)
+        self.entities.extendByBox(Box(corners.min(axis=0).tolist(), corners.max(axis=0).tolist()))
+        self.streaming.extendByBox(Box(lodCorners.min(axis=0).tolist(), lodCorners.max(axis=0).tolist()))
 
     def isValid(self):
         return self.entities.isValid() and self.streaming.isValid()
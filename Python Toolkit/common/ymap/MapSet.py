@@ -0,0 +1,161 @@
+import os
+import shutil
+from typing import Optional
+
+from natsort import natsorted
+
+from common.Util import Util
+from common.ymap.EntityItem import EntityItem
+from common.ymap.ParsedYmap import ParsedYmap
+from common.ymap.YmapParser import YmapParser
+
+
+class MapSet:
+    # content of the .ymap.xml files by filename or None if the content is not kept but read from paths[filename]
+    ymaps: dict[str, Optional[str]]
+    # path of the .ymap.xml files which are read from disk, i.e. files read from a directory which were not changed
+    # yet and files already written to directory
+    paths: dict[str, str]
+    # path of all other files (which are passed through unchanged) by filename
+    others: dict[str, str]
+    parsedYmaps: dict[str, ParsedYmap]
+    # directory the content of a map is written to as soon as it is set or None to keep the content in memory
+    directory: Optional[str]
+
+    def __init__(self, directory: Optional[str] = None):
+        self.ymaps = {}
+        self.paths = {}
+        self.others = {}
+        self.parsedYmaps = {}
+        self.directory = directory
+
+    @staticmethod
+    def readDirectory(inputDir: str, writeBack: bool = False) -> "MapSet":
+        # with writeBack the maps set later on are written back to inputDir
+        mapSet = MapSet(inputDir if writeBack else None)
+        for filename in Util.getListOfFiles(inputDir):
+            path = os.path.join(inputDir, filename)
+            if filename.endswith(".ymap.xml"):
+                # read lazily so that only the maps currently processed are held in memory
+                mapSet.ymaps[filename] = None
+                mapSet.paths[filename] = path
+            else:
+                mapSet.others[filename] = path
+
+        return mapSet
+
+    def writeDirectory(self, outputDir: str):
+        for filename in natsorted(self.ymaps):
+            path = os.path.join(outputDir, filename)
+            if self.paths.get(filename) != path:
+                Util.writeFile(path, self.getContent(filename))
+
+        for filename in natsorted(self.others):
+            destination = os.path.join(outputDir, filename)
+            if not os.path.isfile(destination):
+                shutil.copyfile(self.others[filename], destination)
+
+    def getYmapFilenames(self) -> list[str]:
+        return natsorted(self.ymaps)
+
+    def containsYmap(self, filename: str) -> bool:
+        return filename in self.ymaps
+
+    def getContent(self, filename: str) -> str:
+        content = self.ymaps[filename]
+        if content is None:
+            # not kept, the file is read again on the next access
+            content = Util.readFile(self.paths[filename])
+
+        return content
+
+    def getPath(self, filename: str) -> Optional[str]:
+        # path the content of the map is read from or None if it is held in memory
+        return self.paths[filename] if self.ymaps[filename] is None else None
+
+    def getEntities(self, filename: str) -> list[EntityItem]:
+        parsedYmap = self.parsedYmaps.get(filename)
+        if parsedYmap is not None:
+            return parsedYmap.entities
+
+        if self.ymaps[filename] is None:
+            return YmapParser.readYmapEntitiesFromFile(self.paths[filename])
+
+        return self.getYmap(filename, False).entities
+
+    def getYmap(self, filename: str, cache: bool = True) -> ParsedYmap:
+        # maps which are read only once (e.g. in a first pass that keeps an EntityIndex instead)
+        # should be requested with cache=False so their parsed entities do not stay in memory
+        parsedYmap = self.parsedYmaps.get(filename)
+        if parsedYmap is None:
+            if self.ymaps[filename] is None:
+                parsedYmap = YmapParser.readYmapFile(self.paths[filename])
+            else:
+                parsedYmap = YmapParser.readYmapContent(self.ymaps[filename])
+            if cache:
+                self.parsedYmaps[filename] = parsedYmap
+
+        return parsedYmap
+
+    def setContent(self, filename: str, content: str):
+        self.parsedYmaps.pop(filename, None)
+        if self.directory is None:
+            self.ymaps[filename] = content
+            self.paths.pop(filename, None)
+            return
+
+        path = os.path.join(self.directory, filename)
+        Util.writeFile(path, content)
+        self.ymaps[filename] = None
+        self.paths[filename] = path
+
+    def removeYmap(self, filename: str):
+        if self.isWritten(filename):
+            os.remove(self.paths[filename])
+        del self.ymaps[filename]
+        self.paths.pop(filename, None)
+        self.parsedYmaps.pop(filename, None)
+
+    def isWritten(self, filename: str) -> bool:
+        return self.directory is not None and self.paths.get(filename) == os.path.join(self.directory, filename)
+
+    def relocate(self, directory: str):
+        """
+        Refers to the maps written so far by their filename in the given directory instead, e.g. after the files were
+        moved there. Maps set afterwards are written to that directory as well.
+        """
+        for filename in self.ymaps:
+            if self.isWritten(filename):
+                self.paths[filename] = os.path.join(directory, filename)
+        self.directory = directory
+
+    def getSubset(self, filenames: list[str]) -> "MapSet":
+        # maps that were not read yet are only referenced by their path
+        subset = MapSet()
+        for filename in filenames:
+            subset.ymaps[filename] = self.ymaps[filename]
+            if filename in self.paths:
+                subset.paths[filename] = self.paths[filename]
+
+        return subset
+
+    def update(self, other: "MapSet"):
+        for filename in other.ymaps:
+            if self.directory is not None and other.ymaps[filename] is not None:
+                self.setContent(filename, other.ymaps[filename])
+                continue
+
+            self.ymaps[filename] = other.ymaps[filename]
+            if filename in other.paths:
+                self.paths[filename] = other.paths[filename]
+            else:
+                self.paths.pop(filename, None)
+            self.parsedYmaps.pop(filename, None)
+
+    def copyOthers(self, source: "MapSet"):
+        for filename, path in source.others.items():
+            if filename not in self.others:
+                self.others[filename] = path
+
+    def findAvailableMapName(self, mapName: str, suffix: str, ensureSuffix: bool) -> str:
+        return Util.findAvailableMapNameWith(lambda name: self.containsYmap(Util.getFilenameFromMapname(name)), mapName, suffix, ensureSuffix)
@@ -0,0 +1,55 @@
+from typing import Callable, Optional
+
+from common.Util import Util
+from common.ymap.EntityIndex import EntityIndex
+from common.ymap.Patterns import Patterns
+from common.ymap.EntityItem import EntityItem
+
+
+class ParsedYmap:
+    content: str
+    entities: list[EntityItem]
+    spans: list[tuple[int, int]]
+
+    def __init__(self, content: str, entities: list[EntityItem], spans: list[tuple[int, int]]):
+        self.content = content
+        self.entities = entities
+        # start and end offsets of each entity block (including indentation and line break) within content
+        self.spans = spans
+
+    def getEntityContent(self, index: int) -> str:
+        start, end = self.spans[index]
+        return self.content[start:end]
+
+    def createIndex(self, tags: Optional[list[int]] = None, path: Optional[str] = None) -> EntityIndex:
+        # with path the index does not keep the content but reads it again from that file when needed
+        return EntityIndex(None if path is not None else self.content, self.spans, tags, path)
+
+    def replaceEntities(self, repl: Callable[[int, str], str]) -> str:
+        parts = []
+        pos = 0
+        for i in range(len(self.spans)):
+            start, end = self.spans[i]
+            parts.append(self.content[pos:start])
+            parts.append(repl(i, self.content[start:end]))
+            pos = end
+        parts.append(self.content[pos:])
+
+        return "".join(parts)
+
+    @staticmethod
+    def replaceValue(entityContent: str, name: str, value: str) -> str:
+        return Patterns.getValuePattern(name).sub(lambda match: match.group(1) + value + match.group(2), entityContent, count=1)
+
+    @staticmethod
+    def replaceText(entityContent: str, name: str, text: str) -> str:
+        return Patterns.getTextPattern(name).sub(lambda match: match.group(1) + text + match.group(2), entityContent, count=1)
+
+    @staticmethod
+    def replaceRotation(entityContent: str, rotationQuaternion: list[float]) -> str:
+        # rotationQuaternion is given in order w, -x, -y, -z
+        rotation = 'x="' + Util.floatToStr(-rotationQuaternion[1]) + \
+                   '" y="' + Util.floatToStr(-rotationQuaternion[2]) + \
+                   '" z="' + Util.floatToStr(-rotationQuaternion[3]) + \
+                   '" w="' + Util.floatToStr(rotationQuaternion[0]) + '"'
+        return Patterns.ENTITY_ROTATION.sub(lambda match: match.group(1) + rotation, entityContent, count=1)
@@ -0,0 +1,154 @@
+import re
+
+
+class Patterns:
+    """
+    Precompiled regular expressions for ymap and ytyp content shared by all workers.
+
+    Patterns are compiled once on import instead of being assembled on every call, which also keeps them
+    independent of the size of the internal cache of the re module.
+    """
+
+    # single element, i.e. a self-closing tag or an opening tag optionally followed by text and a closing tag on the
+    # same line (but not a closing tag following a self-closing tag, e.g. </Item> if all is written in a single line)
+    _ELEMENT = '<(?!/)[^>\\n]*(?:/>|(?<!/)>(?:[^<\\n]*</[^>\\n]*>)?)'
+
+    # skips any number of elements until the rest of the expression matches. Each element is matched atomically so
+    # that long runs of elements, e.g. within <extensions>, can not be split up in different ways when the rest of the
+    # expression fails.
+    SKIP_ELEMENTS = '(?:(?>\\s*' + _ELEMENT + '))*?'
+
+    # elements of an entity: same as SKIP_ELEMENTS but skips <extensions> as a whole since it may contain nested <Item>
+    # blocks. Any other <Item> ends the entity, so that an entity without </Item> does not extend into the next one.
+    SKIP_ENTITY_ELEMENTS = '(?:(?>\\s*(?:<extensions>[\\S\\s]*?</extensions>|(?!<Item\\b)' + _ELEMENT + ')))*?'
+
+    # a complete <Item type="CEntityDef"> block including its indentation and line break with its content as group 1
+    ENTITY = re.compile('[\\t ]*<Item type="CEntityDef">(' + SKIP_ENTITY_ELEMENTS + ')\\s*</Item>[\\t ]*(?:\\r?\\n)?')
+
+    # same as ENTITY but for scanning memory-mapped files without decoding them as a whole
+    ENTITY_BYTES = re.compile(ENTITY.pattern.encode())
+
+    ENTITY_EXTENTS = re.compile(
+        '<Item type="CEntityDef">' +
+        '\\s*<archetypeName>([^<]+)</archetypeName>' +
+        SKIP_ELEMENTS +
+        '\\s*<position x="([^"]+)" y="([^"]+)" z="([^"]+)"/>' +
+        '\\s*<rotation x="([^"]+)" y="([^"]+)" z="([^"]+)" w="([^"]+)"/>' +
+        '\\s*<scaleXY value="([^"]+)"/>' +
+        '\\s*<scaleZ value="([^"]+)"/>' +
+        SKIP_ELEMENTS +
+        '\\s*<lodDist value="([^"]+)"/>' +
+        SKIP_ELEMENTS +
+        '\\s*</Item>'
+    )
+
+    CAR_GENERATOR_EXTENTS = re.compile(
+        '<Item>' +
+        '\\s*<position x="([^"]+)" y="([^"]+)" z="([^"]+)"/>' +
+        SKIP_ELEMENTS +
+        '\\s*<perpendicularLength value="([^"]+)"/>' +
+        '\\s*<carModel>([^<]+)</carModel>' +
+        SKIP_ELEMENTS +
+        '\\s*</Item>'
+    )
+
+    MAP_EXTENTS = re.compile(
+        '(<streamingExtentsMin x=")[^"]+(" y=")[^"]+(" z=")[^"]+("/>' +
+        '\\s*<streamingExtentsMax x=")[^"]+(" y=")[^"]+(" z=")[^"]+("/>' +
+        '\\s*<entitiesExtentsMin x=")[^"]+(" y=")[^"]+(" z=")[^"]+("/>' +
+        '\\s*<entitiesExtentsMax x=")[^"]+(" y=")[^"]+(" z=")[^"]+("/>)'
+    )
+
+    ENTITY_LOD_DISTANCE = re.compile(
+        '(\\s*<Item type="CEntityDef">' +
+        '\\s*<archetypeName>([^<]+)</archetypeName>' +
+        SKIP_ELEMENTS +
+        '\\s*<scaleXY value="([^"]+)"\\s*/>' +
+        '\\s*<scaleZ value="([^"]+)"\\s*/>' +
+        '\\s*<parentIndex value="([^"]+)"/>' +
+        SKIP_ELEMENTS +
+        '\\s*<lodDist value=")([^"]+)("\\s*/>' +
+        SKIP_ELEMENTS +
+        '\\s*<priorityLevel>)[^<]*(</priorityLevel>' +
+        SKIP_ELEMENTS +
+        '\\s*</Item>)', flags=re.M
+    )
+
+    BLOCK_DATETIME = re.compile(
+        '(?<=<block>)(' +
+        SKIP_ELEMENTS +
+        '\\s*<exportedBy>)[^<]+(</exportedBy>' +
+        SKIP_ELEMENTS +
+        '\\s*<time>)[^<]+(</time>' +
+        SKIP_ELEMENTS +
+        '\\s*)(?=</block>)'
+    )
+
+    MAP_NAME = re.compile('(?<=<CMapData>)(\\s*<name>)[^<]+(?=</name>)')
+
+    BLOCK_NAME = re.compile(
+        '(?<=<block>)(' +
+        SKIP_ELEMENTS +
+        '\\s*<name>)[^<]+(</name>' +
+        SKIP_ELEMENTS +
+        '\\s*)(?=</block>)'
+    )
+
+    PARENT = re.compile('<parent\\s*(?:/>|>[^<]*</parent>)', flags=re.M)
+
+    FLAGS_AND_CONTENT_FLAGS = re.compile('(<flags\\s+value=")[^"]*("\\s*/>\\s*<contentFlags\\s+value=")[^"]*("\\s*/>)')
+
+    PARENT_INDEX = re.compile('(<parentIndex value=")[^"]+("/>)')
+
+    NUM_CHILDREN = re.compile('(<numChildren value=")[^"]+("/>)')
+
+    ENTITIES_START = re.compile('<entities>\\n', flags=re.M)
+
+    ENTITIES_END = re.compile('[\\t ]+</entities>[\\S\\s]*?\\Z', flags=re.M)
+
+    ENTITY_ARCHETYPE_NAME = re.compile('<Item type="CEntityDef">\\s*<archetypeName>([^<]+)</archetypeName>')
+
+    ENTITY_ROTATION = re.compile('(<rotation )x="[^"]*" y="[^"]*" z="[^"]*" w="[^"]*"')
+
+    YTYP_ITEM = re.compile(
+        '\\s*<Item type="CBaseArchetypeDef">' +
+        '\\s*<lodDist value="([^"]+)"/>' +
+        SKIP_ELEMENTS +
+        '\\s*<bbMin x="([^"]+)" y="([^"]+)" z="([^"]+)"/>' +
+        '\\s*<bbMax x="([^"]+)" y="([^"]+)" z="([^"]+)"/>' +
+        '\\s*<bsCentre x="([^"]+)" y="([^"]+)" z="([^"]+)"/>' +
+        '\\s*<bsRadius value="([^"]+)"/>' +
+        SKIP_ELEMENTS +
+        '\\s*<name>([^<]+)</name>'
+    )
+
+    YTYP_NAME = re.compile(
+        '\\s*<name>([^<]+)</name>' +
+        '\\s*(?:<dependencies/>|<dependencies>[\\S\\s]*</dependencies>)' +
+        '\\s*(?:<compositeEntityTypes/>|<compositeEntityTypes>[\\S\\s]*</compositeEntityTypes>)' +
+        '\\s*</CMapTypes>', flags=re.M
+    )
+
+    # patterns for single elements by element name, see getValuePattern and getTextPattern
+    _valuePatterns: dict[str, re.Pattern] = {}
+    _textPatterns: dict[str, re.Pattern] = {}
+
+    @staticmethod
+    def getValuePattern(name: str) -> re.Pattern:
+        """Pattern for <name value="..."/> with the parts before and after the value as groups 1 and 2."""
+        pattern = Patterns._valuePatterns.get(name)
+        if pattern is None:
+            pattern = re.compile('(<' + re.escape(name) + ' value=")[^"]*(")')
+            Patterns._valuePatterns[name] = pattern
+
+        return pattern
+
+    @staticmethod
+    def getTextPattern(name: str) -> re.Pattern:
+        """Pattern for <name>...</name> with the opening and closing tag as groups 1 and 2."""
+        pattern = Patterns._textPatterns.get(name)
+        if pattern is None:
+            pattern = re.compile('(<' + re.escape(name) + '>)[^<]*(</' + re.escape(name) + '>)')
+            Patterns._textPatterns[name] = pattern
+
+        return pattern
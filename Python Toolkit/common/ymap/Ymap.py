@@ -1,10 +1,12 @@
 import math
-import re
 from re import Match
 from typing import Optional
 
+from common.Parallel import Parallel
 from common.Util import Util
 from common.ymap.Extents import Extents
+from common.ymap.MapSet import MapSet
+from common.ymap.Patterns import Patterns
 from common.ymap.PriorityLevel import PriorityLevel
 from common.ytyp.YtypItem import YtypItem
 
@@ -37,42 +39,18 @@ class Ymap:
 
     @staticmethod
     def calculateAndReplaceLodDistance(contentNoLod: str, ytypItems: dict[str, YtypItem], archetypes=None, forceHasParent=False) -> str:
-        pattern = re.compile('(\\s*<Item type="CEntityDef">' +
-                             '\\s*<archetypeName>([^<]+)</archetypeName>' +
-                             '(?:\\s*<[^/].*>)*?' +
-                             '\\s*<scaleXY value="([^"]+)"\\s*/>' +
-                             '\\s*<scaleZ value="([^"]+)"\\s*/>' +
-                             '\\s*<parentIndex value="([^"]+)"/>' +
-                             '(?:\\s*<[^/].*>)*?' +
-                             '\\s*<lodDist value=")([^"]+)("\\s*/>' +
-                             '(?:\\s*<[^/].*>)*?' +
-                             '\\s*<priorityLevel>)[^<]*(</priorityLevel>'
-                             '(?:\\s*<[^/].*>)*?' +
-                             '\\s*</Item>)', flags=re.M)
-
-        return pattern.sub(lambda match: Ymap._replCalculateAndReplaceLodDistance(match, ytypItems, archetypes, forceHasParent), contentNoLod)
+        return Patterns.ENTITY_LOD_DISTANCE.sub(lambda match: Ymap._replCalculateAndReplaceLodDistance(match, ytypItems, archetypes, forceHasParent), contentNoLod)
 
     @staticmethod
     def replaceDatetime(content: str, nowIso: str) -> str:
-        return re.sub(
-            '(?<=<block>)(' +
-            '(?:\\s*<[^/].*>)*?' +
-            '\\s*<exportedBy>)[^<]+(</exportedBy>'
-            '(?:\\s*<[^/].*>)*?' +
-            '\\s*<time>)[^<]+(</time>' +
-            '(?:\\s*<[^/].*>)*?' +
-            '\\s*)(?=</block>)',
+        return Patterns.BLOCK_DATETIME.sub(
             "\\g<1>Larcius\\g<2>" + nowIso + "\\g<3>", content
         )
 
     @staticmethod
     def replaceName(content: str, name: str) -> str:
-        result = re.sub('(?<=<CMapData>)(\\s*<name>)[^<]+(?=</name>)', "\\g<1>" + name, content)
-        result = re.sub('(?<=<block>)(' +
-                        '(?:\\s*<[^/].*>)*?' +
-                        '\\s*<name>)[^<]+(</name>' +
-                        '(?:\\s*<[^/].*>)*?' +
-                        '\\s*)(?=</block>)', "\\g<1>" + name + "\\g<2>", result)
+        result = Patterns.MAP_NAME.sub("\\g<1>" + name, content)
+        result = Patterns.BLOCK_NAME.sub("\\g<1>" + name + "\\g<2>", result)
         return result
 
     @staticmethod
@@ -81,7 +59,7 @@ class Ymap:
             newParent = "<parent/>"
         else:
             newParent = "<parent>" + parent + "</parent>"
-        return re.sub('<parent\\s*(?:/>|>[^<]*</parent>)', newParent, content, flags=re.M)
+        return Patterns.PARENT.sub(newParent, content)
 
     # adapt extents and set current datetime
     @staticmethod
@@ -94,3 +72,21 @@ class Ymap:
                 result = content
 
             return Ymap.replaceDatetime(result, Util.getNowInIsoFormat())
+
+    @staticmethod
+    def fixMapExtentsOfAll(maps: MapSet, ytypItems: dict[str, YtypItem], jobs: int, resetNameAndParent: bool = False):
+        # with resetNameAndParent the name of each map is set according to its filename and its parent is removed
+        filenames = maps.getYmapFilenames()
+        # maps not read yet are only passed by path, so each map is read when it is processed
+        tasks = [(filename, maps.getSubset([filename]), resetNameAndParent) for filename in filenames]
+        for filename, content in zip(filenames, Parallel.imap(Ymap._fixMapExtentsTask, ytypItems, tasks, jobs)):
+            maps.setContent(filename, content)
+
+    @staticmethod
+    def _fixMapExtentsTask(ytypItems: dict[str, YtypItem], filename: str, maps: MapSet, resetNameAndParent: bool) -> str:
+        content = maps.getContent(filename)
+        if resetNameAndParent:
+            content = Ymap.replaceName(content, filename.lower()[:-9])
+            content = Ymap.replaceParent(content, None)
+
+        return Ymap.fixMapExtents(content, ytypItems)
@@ -0,0 +1,144 @@
+import locale
+import mmap
+import os
+import re
+from typing import Optional
+
+from common.Util import Util
+
+from common.ymap.EntityItem import EntityItem
+from common.ymap.ParsedYmap import ParsedYmap
+from common.ymap.Patterns import Patterns
+
+
+class YmapParser:
+    # fast path for the element order written by CodeWalker and by the templates of this toolkit
+    _ENTITY_FIELDS_PATTERN = re.compile(
+        '\\s*<archetypeName>([^<]+)</archetypeName>' +
+        '\\s*<flags value="([^"]+)"\\s*/>' +
+        '\\s*<guid value="[^"]*"\\s*/>' +
+        '\\s*<position x="([^"]+)" y="([^"]+)" z="([^"]+)"\\s*/>' +
+        '\\s*<rotation x="([^"]+)" y="([^"]+)" z="([^"]+)" w="([^"]+)"\\s*/>' +
+        '\\s*<scaleXY value="([^"]+)"\\s*/>' +
+        '\\s*<scaleZ value="([^"]+)"\\s*/>' +
+        '\\s*<parentIndex value="([^"]+)"\\s*/>' +
+        '\\s*<lodDist value="([^"]+)"\\s*/>' +
+        '\\s*<childLodDist value="([^"]+)"\\s*/>' +
+        '\\s*<lodLevel>([^<]+)</lodLevel>' +
+        '\\s*<numChildren value="([^"]+)"\\s*/>' +
+        '\\s*<priorityLevel>([^<]+)</priorityLevel>'
+    )
+
+    # single element within an entity block, either <name attr="..."/> or <name>text</name>
+    _FIELD_PATTERN = re.compile(
+        '<extensions>[\\S\\s]*?</extensions>' +
+        '|<(\\w+)((?:\\s+\\w+="[^"]*")*)\\s*/>' +
+        '|<(\\w+)>([^<]*)</\\3>'
+    )
+
+    _ATTRIBUTE_PATTERN = re.compile('(\\w+)="([^"]*)"')
+
+    # encoding used when reading files in text mode (see Util.readFile)
+    ENCODING = locale.getpreferredencoding(False)
+
+    @staticmethod
+    def readYmapFile(ymapFile: str) -> ParsedYmap:
+        return YmapParser.readYmapContent(Util.readFile(ymapFile))
+
+    @staticmethod
+    def readYmapEntitiesFromFile(ymapFile: str) -> list[EntityItem]:
+        """
+        Parses only the entities of the given file. The file is memory-mapped and scanned as bytes,
+        so only the entity blocks are decoded instead of the whole content.
+        """
+        if os.path.getsize(ymapFile) == 0:
+            return []
+
+        entities = []
+        with open(ymapFile, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            for match in Patterns.ENTITY_BYTES.finditer(buffer):
+                entity = YmapParser.parseEntity(match.group(1).decode(YmapParser.ENCODING))
+                if entity is not None:
+                    entities.append(entity)
+
+        return entities
+
+    @staticmethod
+    def readYmapContent(content: str) -> ParsedYmap:
+        entities = []
+        spans = []
+        for match in Patterns.ENTITY.finditer(content):
+            entity = YmapParser.parseEntity(match.group(1))
+            if entity is None:
+                continue
+
+            entities.append(entity)
+            spans.append(match.span())
+
+        return ParsedYmap(content, entities, spans)
+
+    @staticmethod
+    def parseEntity(content: str) -> Optional[EntityItem]:
+        match = YmapParser._ENTITY_FIELDS_PATTERN.match(content)
+        if match is not None:
+            try:
+                return EntityItem(
+                    match.group(1),
+                    [float(match.group(3)), float(match.group(4)), float(match.group(5))],
+                    [float(match.group(10)), float(match.group(10)), float(match.group(11))],
+                    # order is w, -x, -y, -z
+                    [float(match.group(9)), -float(match.group(6)), -float(match.group(7)), -float(match.group(8))],
+                    float(match.group(13)),
+                    float(match.group(14)),
+                    int(match.group(12)),
+                    int(match.group(16)),
+                    match.group(15),
+                    int(match.group(2)),
+                    match.group(17)
+                )
+            except ValueError:
+                pass
+
+        return YmapParser._parseEntityFields(content)
+
+    @staticmethod
+    def _parseEntityFields(content: str) -> Optional[EntityItem]:
+        fields = {}
+        for match in YmapParser._FIELD_PATTERN.finditer(content):
+            if match.group(1) is not None:
+                fields[match.group(1)] = dict(YmapParser._ATTRIBUTE_PATTERN.findall(match.group(2)))
+            elif match.group(3) is not None:
+                fields[match.group(3)] = match.group(4)
+
+        archetypeName = fields.get("archetypeName")
+        position = fields.get("position")
+        rotation = fields.get("rotation")
+        scaleXY = fields.get("scaleXY")
+        scaleZ = fields.get("scaleZ")
+        if archetypeName is None or position is None or rotation is None or scaleXY is None or scaleZ is None:
+            return None
+
+        try:
+            return EntityItem(
+                archetypeName,
+                [float(position["x"]), float(position["y"]), float(position["z"])],
+                [float(scaleXY["value"]), float(scaleXY["value"]), float(scaleZ["value"])],
+                # order is w, -x, -y, -z
+                [float(rotation["w"]), -float(rotation["x"]), -float(rotation["y"]), -float(rotation["z"])],
+                YmapParser._getValue(fields, "lodDist", float),
+                YmapParser._getValue(fields, "childLodDist", float),
+                YmapParser._getValue(fields, "parentIndex", int),
+                YmapParser._getValue(fields, "numChildren", int),
+                fields.get("lodLevel"),
+                YmapParser._getValue(fields, "flags", int),
+                fields.get("priorityLevel")
+            )
+        except (KeyError, ValueError):
+            return None
+
+    @staticmethod
+    def _getValue(fields: dict, name: str, convert):
+        field = fields.get(name)
+        if field is None or "value" not in field:
+            return None
+        return convert(field["value"])
@@ -1,23 +1,23 @@
+import hashlib
+import json
 import os
-import re
+from typing import Optional
 
 from common.Box import Box
 from common.Sphere import Sphere
+from common.ymap.Patterns import Patterns
 from common.ytyp.YtypItem import YtypItem
 
 
 class YtypParser:
-    @staticmethod
-    def getExpressionYtypItem() -> str:
-        return '\\s*<Item type="CBaseArchetypeDef">' + \
-               '\\s*<lodDist value="([^"]+)"/>' + \
-               '(?:\\s*<[^/].*>)*?' + \
-               '\\s*<bbMin x="([^"]+)" y="([^"]+)" z="([^"]+)"/>' + \
-               '\\s*<bbMax x="([^"]+)" y="([^"]+)" z="([^"]+)"/>' + \
-               '\\s*<bsCentre x="([^"]+)" y="([^"]+)" z="([^"]+)"/>' + \
-               '\\s*<bsRadius value="([^"]+)"/>' + \
-               '(?:\\s*<[^/].*>)*?' + \
-               '\\s*<name>([^<]+)</name>'
+    # incremented whenever the format of the cache files or the parsing of the ytyp files changes
+    CACHE_VERSION = 2
+
+    # directory of the compiled caches of ytyp directories written by readYtypDirectoryCached or None to disable them
+    cacheDirectory: Optional[str] = os.path.join(os.path.dirname(__file__), "..", "..", ".ytypCache")
+
+    # ytyp directories already read by this process: path -> (signature, items)
+    _directoryCache: dict[str, tuple[list, dict[str, YtypItem]]] = {}
 
     @staticmethod
     def readYtypDirectory(path: str) -> dict[str, YtypItem]:
@@ -34,6 +34,91 @@ class YtypParser:
 
         return items
 
+    @staticmethod
+    def readYtypDirectoryCached(path: str) -> dict[str, YtypItem]:
+        """
+        Same as readYtypDirectory but parses the directory at most once per process and persists the result
+        as a JSON file in cacheDirectory. The cache is keyed by name, size and modification time of all
+        .ytyp.xml files, so adding, removing or changing any of them invalidates it.
+        Returns a new dict on each call so callers may extend it without affecting other callers.
+        """
+        if not os.path.exists(path):
+            return {}
+
+        path = os.path.abspath(path)
+        signature = YtypParser._getDirectorySignature(path)
+
+        cached = YtypParser._directoryCache.get(path)
+        if cached is None or cached[0] != signature:
+            items = YtypParser._readCacheFile(path, signature)
+            if items is None:
+                items = YtypParser.readYtypDirectory(path)
+                YtypParser._writeCacheFile(path, signature, items)
+            cached = (signature, items)
+            YtypParser._directoryCache[path] = cached
+
+        return dict(cached[1])
+
+    @staticmethod
+    def _getDirectorySignature(path: str) -> list:
+        signature = []
+        for filename in os.listdir(path):
+            if not filename.endswith(".ytyp.xml"):
+                continue
+
+            stat = os.stat(os.path.join(path, filename))
+            signature.append([filename, stat.st_size, stat.st_mtime_ns])
+
+        return sorted(signature)
+
+    @staticmethod
+    def _getCacheFile(path: str) -> str:
+        return os.path.join(YtypParser.cacheDirectory, hashlib.sha256(path.encode()).hexdigest() + ".json")
+
+    @staticmethod
+    def _readCacheFile(path: str, signature: list) -> Optional[dict[str, YtypItem]]:
+        if YtypParser.cacheDirectory is None:
+            return None
+
+        try:
+            with open(YtypParser._getCacheFile(path), "r") as f:
+                cache = json.load(f)
+
+            if cache["version"] != YtypParser.CACHE_VERSION or cache["path"] != path or cache["signature"] != signature:
+                return None
+
+            items = {}
+            for name, (lodDist, bbMin, bbMax, bsCenter, bsRadius, parent) in cache["items"].items():
+                items[name] = YtypItem(lodDist, Box(bbMin, bbMax), Sphere(bsCenter, bsRadius), parent)
+            return items
+        except Exception:
+            return None
+
+    @staticmethod
+    def _writeCacheFile(path: str, signature: list, items: dict[str, YtypItem]):
+        if YtypParser.cacheDirectory is None:
+            return
+
+        cacheFile = YtypParser._getCacheFile(path)
+        # several processes may read the same ytyp directory, hence the temporary file is unique per process
+        tmpFile = cacheFile + "." + str(os.getpid()) + ".tmp"
+        cache = {
+            "version": YtypParser.CACHE_VERSION,
+            "path": path,
+            "signature": signature,
+            "items": {
+                name: [item.lodDist, item.boundingBox.min, item.boundingBox.max, item.boundingSphere.center, item.boundingSphere.radius, item.parent]
+                for name, item in items.items()
+            },
+        }
+        try:
+            os.makedirs(YtypParser.cacheDirectory, exist_ok=True)
+            with open(tmpFile, "w") as f:
+                json.dump(cache, f)
+            os.replace(tmpFile, cacheFile)
+        except OSError as e:
+            print("\tWARNING: could not write ytyp cache " + cacheFile + ": " + str(e))
+
     @staticmethod
     def readYtypFile(ytypFile: str) -> dict[str, YtypItem]:
         f = open(ytypFile, 'r')
@@ -47,7 +132,7 @@ class YtypParser:
         parent = YtypParser.getYtypName(ytypContent)
 
         items = {}
-        for match in re.finditer(YtypParser.getExpressionYtypItem(), ytypContent):
+        for match in Patterns.YTYP_ITEM.finditer(ytypContent):
             lodDist = float(match.group(1))
             bbMin = [float(match.group(2)), float(match.group(3)), float(match.group(4))]
             bbMax = [float(match.group(5)), float(match.group(6)), float(match.group(7))]
@@ -60,9 +145,6 @@ class YtypParser:
 
     @staticmethod
     def getYtypName(ytypContent: str) -> str:
-        match = re.search('\\s*<name>([^<]+)</name>' +
-        '\\s*(?:<dependencies/>|<dependencies>[\\S\\s]*</dependencies>)' +
-        '\\s*(?:<compositeEntityTypes/>|<compositeEntityTypes>[\\S\\s]*</compositeEntityTypes>)' +
-        '\\s*</CMapTypes>', ytypContent, re.M)
+        match = Patterns.YTYP_NAME.search(ytypContent)
 
         return match.group(1)
@@ -8,6 +8,7 @@ import json
 
 from matplotlib import pyplot
 
+from common.ClusteringCache import ClusteringCache
 from worker.EntropyCreator import EntropyCreator
 from worker.reducer.Reducer import Reducer
 from worker.vegetation_creator.VegetationCreator import VegetationCreator
@@ -42,6 +43,7 @@ def main(argv):
     reducer = False
     reducerResolution = None
     reducerAdaptScaling = False
+    reducerBackend = None
     clusteringPrefix = None
     clusteringExcluded = None
     staticCol = False
@@ -56,6 +58,12 @@ def main(argv):
     statistics = False
     prefix = None
     useOriginalNames = False
+    inMemory = False
+    jobs = 1
+    incremental = False
+    lodCacheDir = None
+    clusteringCache = True
+    approximateSpheres = False
 
     # Custom LOD distance overrides per vegetation category.
     # These values are absolute lodDist values (game units; commonly treated as meters).
@@ -75,12 +83,13 @@ def main(argv):
 
     usageMsg = (
         "main.py --inputDir <input directory> --outputDir <output directory> --prefix=<PREFIX> "
-        "--reducer=<on|off> --reducerResolution=<float (default 30)> --reducerAdaptScaling=<on|off> "
+        "--reducer=<on|off> --reducerResolution=<float (default 30)> --reducerAdaptScaling=<on|off> --reducerBackend=<agglomerative|kdtree> "
         "--clustering=<on|off> --numClusters=<integer> --polygon=<list of x,y coordinates in CCW order> "
         "--clusteringPrefix=<CLUSTERING_PREFIX> --clusteringExcluded=<comma-separated list of ymaps to exclude> "
         "--entropy=<on|off> --sanitizer=<on|off> --staticCol=<on|off> "
-        "--clearLod=<on|off> --lodMap=<on|off> --customMeshesOnly=<on|off> --customSlods=<on|off> --reflection=<on|off> "
-        "--statistics=<on|off> "
+        "--clearLod=<on|off> --lodMap=<on|off> --customMeshesOnly=<on|off> --customSlods=<on|off> --reflection=<on|off> --approximateSpheres=<on|off> "
+        "--statistics=<on|off> --inMemory=<on|off> --jobs=<integer (default 1)> --incremental=<on|off> "
+        "--lodCacheDir=<directory (default: .lodMapCache/<PREFIX> in the directory of main.py)> --clusteringCache=<on|off> "
         "--lodDistanceCacti=<float> --lodDistanceTrees=<float> "
         "--lodDistanceBushes=<float> --lodDistancePalms=<float> "
         "[--lodMultiplierCacti=<float> --lodMultiplierTrees=<float> "
@@ -98,6 +107,7 @@ def main(argv):
                 "reducer=",
                 "reducerResolution=",
                 "reducerAdaptScaling=",
+                "reducerBackend=",
                 "clustering=",
                 "numClusters=",
                 "polygon=",
@@ -111,6 +121,7 @@ def main(argv):
                 "customSlods=",
                 "clearLod=",
                 "reflection=",
+                "approximateSpheres=",
                 "sanitizer=",
                 "entropy=",
                 "statistics=",
@@ -125,6 +136,11 @@ def main(argv):
                 "lodMultiplierBushes=",
                 "lodMultiplierPalms=",
                 "useOriginalNames=",
+                "inMemory=",
+                "jobs=",
+                "incremental=",
+                "lodCacheDir=",
+                "clusteringCache=",
             ],
         )
     except getopt.GetoptError:
@@ -153,6 +169,11 @@ def main(argv):
                 sys.exit(2)
         elif opt == "--reducerAdaptScaling":
             reducerAdaptScaling = bool(distutils.util.strtobool(arg))
+        elif opt == "--reducerBackend":
+            reducerBackend = arg
+            if reducerBackend not in Reducer.BACKENDS:
+                print("ERROR: reducerBackend must be one of " + ", ".join(Reducer.BACKENDS))
+                sys.exit(2)
         elif opt == "--clustering":
             clustering = bool(distutils.util.strtobool(arg))
         elif opt == "--clusteringPrefix":
@@ -179,6 +200,8 @@ def main(argv):
             customSlods = bool(distutils.util.strtobool(arg))
         elif opt == "--reflection":
             createReflection = bool(distutils.util.strtobool(arg))
+        elif opt == "--approximateSpheres":
+            approximateSpheres = bool(distutils.util.strtobool(arg))
         elif opt == "--sanitizer":
             sanitizer = bool(distutils.util.strtobool(arg))
         elif opt == "--entropy":
@@ -215,6 +238,19 @@ def main(argv):
             lodMultiplierPalms = float(arg)
         elif opt == "--useOriginalNames":
             useOriginalNames = bool(distutils.util.strtobool(arg))
+        elif opt == "--inMemory":
+            inMemory = bool(distutils.util.strtobool(arg))
+        elif opt == "--jobs":
+            jobs = int(arg)
+            if jobs <= 0:
+                print("ERROR: jobs must be positive")
+                sys.exit(2)
+        elif opt == "--incremental":
+            incremental = bool(distutils.util.strtobool(arg))
+        elif opt == "--lodCacheDir":
+            lodCacheDir = arg
+        elif opt == "--clusteringCache":
+            clusteringCache = bool(distutils.util.strtobool(arg))
 
     if not clustering and numClusters:
         print("ERROR: --numClusters requires --clustering=on")
@@ -262,6 +298,14 @@ def main(argv):
         print("ERROR: --reflection=on requires --lodMap=on")
         sys.exit(2)
 
+    if not incremental and lodCacheDir:
+        print("ERROR: --lodCacheDir requires --incremental=on")
+        sys.exit(2)
+
+    if not lodMap and approximateSpheres:
+        print("ERROR: --approximateSpheres=on requires --lodMap=on")
+        sys.exit(2)
+
     if not reducer and reducerResolution:
         print("ERROR: --reducerResolution requires --reducer=on")
         sys.exit(2)
@@ -270,6 +314,10 @@ def main(argv):
         print("ERROR: --reducerAdaptScaling=on requires --reducer=on")
         sys.exit(2)
 
+    if not reducer and reducerBackend:
+        print("ERROR: --reducerBackend requires --reducer=on")
+        sys.exit(2)
+
     # NEW: Added customSlods to the goal check
     if not (vegetationCreator or reducer or clustering or staticCol or clearLod or lodMap or customMeshesOnly or customSlods or sanitizer or entropy or statistics):
         print("ERROR: No goal specified, nothing to do.")
@@ -308,7 +356,12 @@ def main(argv):
         else:
             sys.exit(0)
 
+    if not clusteringCache:
+        ClusteringCache.directory = None
+
     nextInputDir = inputDir
+    # with --inMemory=on the maps are handed from one stage to the next without writing them to tempOutputDir
+    nextInputMaps = None
 
     os.makedirs(outputDir)
 
@@ -316,35 +369,40 @@ def main(argv):
     os.makedirs(tempOutputDir)
 
     if vegetationCreator:
-        vegetationCreatorWorker = VegetationCreator(nextInputDir, os.path.join(tempOutputDir, "vegetationCreator"), prefix)
+        vegetationCreatorWorker = VegetationCreator(nextInputDir, os.path.join(tempOutputDir, "vegetationCreator"), prefix, nextInputMaps, inMemory)
         vegetationCreatorWorker.run()
 
         nextInputDir = vegetationCreatorWorker.outputDir
+        nextInputMaps = vegetationCreatorWorker.outputMaps if inMemory else None
 
     if entropy:
-        entropyCreator = EntropyCreator(nextInputDir, os.path.join(tempOutputDir, "entropy"), False, True, False, True)
+        entropyCreator = EntropyCreator(nextInputDir, os.path.join(tempOutputDir, "entropy"), False, True, False, True, nextInputMaps, inMemory, jobs)
         entropyCreator.run()
 
         nextInputDir = entropyCreator.outputDir
+        nextInputMaps = entropyCreator.outputMaps if inMemory else None
 
     if reducer:
-        reducerWorker = Reducer(nextInputDir, os.path.join(tempOutputDir, "reducer"), prefix, reducerResolution, reducerAdaptScaling)
+        reducerWorker = Reducer(nextInputDir, os.path.join(tempOutputDir, "reducer"), prefix, reducerResolution, reducerAdaptScaling, nextInputMaps, inMemory, reducerBackend)
         reducerWorker.run()
 
         nextInputDir = reducerWorker.outputDir
+        nextInputMaps = reducerWorker.outputMaps if inMemory else None
 
     if clustering:
         clusteringWorker = Clustering(nextInputDir, os.path.join(tempOutputDir, "clustering"), prefix,
-            numClusters, polygon, clusteringPrefix, clusteringExcluded)
+            numClusters, polygon, clusteringPrefix, clusteringExcluded, nextInputMaps, inMemory, jobs)
         clusteringWorker.run()
 
         nextInputDir = clusteringWorker.outputDir
+        nextInputMaps = clusteringWorker.outputMaps if inMemory else None
 
     if sanitizer:
-        sanitizerWorker = Sanitizer(nextInputDir, os.path.join(tempOutputDir, "sanitizer"))
+        sanitizerWorker = Sanitizer(nextInputDir, os.path.join(tempOutputDir, "sanitizer"), nextInputMaps, inMemory, jobs)
         sanitizerWorker.run()
 
         nextInputDir = sanitizerWorker.outputDir
+        nextInputMaps = sanitizerWorker.outputMaps if inMemory else None
 
     if customMeshesOnly and not lodMap:
         lodMapCreator = LodMapCreator(nextInputDir, os.path.join(tempOutputDir, "lod_map"), prefix, False, False, lodMultipliers=lodMultipliers, lodDistanceOverrides=lodDistanceOverrides)
@@ -370,13 +428,22 @@ def main(argv):
             print("WARNING: runCustomSlodsOnly() not found in LodMapCreator. Skipping Custom Slods generation.")
 
     if clearLod:
-        lodMapCleaner = LodMapCreator(nextInputDir, os.path.join(tempOutputDir, "clear_lod"), prefix, True, False, lodMultipliers=lodMultipliers, lodDistanceOverrides=lodDistanceOverrides)
+        lodMapCleaner = LodMapCreator(nextInputDir, os.path.join(tempOutputDir, "clear_lod"), prefix, True, False, lodMultipliers=lodMultipliers, lodDistanceOverrides=lodDistanceOverrides,
+                                      inputMaps=nextInputMaps, inMemory=inMemory, jobs=jobs)
         lodMapCleaner.run()
 
         nextInputDir = lodMapCleaner.getOutputDirMaps(False)
+        nextInputMaps = lodMapCleaner.outputMaps if inMemory else None
 
     if lodMap:
-        lodMapCreator = LodMapCreator(nextInputDir, os.path.join(tempOutputDir, "lod_map"), prefix, False, createReflection, lodMultipliers=lodMultipliers, lodDistanceOverrides=lodDistanceOverrides)
+        # with --incremental=on the results of unchanged prefix bundles are kept in lodCacheDir (by default one
+        # directory per project prefix within the directory of this script) and reused by the next run
+        if incremental and not lodCacheDir:
+            lodCacheDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".lodMapCache", prefix)
+        lodMapCacheDir = os.path.abspath(lodCacheDir) if incremental else None
+        lodMapCreator = LodMapCreator(nextInputDir, os.path.join(tempOutputDir, "lod_map"), prefix, False, createReflection, lodMultipliers=lodMultipliers, lodDistanceOverrides=lodDistanceOverrides,
+                                      inputMaps=nextInputMaps, inMemory=inMemory, jobs=jobs, cacheDir=lodMapCacheDir,
+                                      approximateBoundingSpheres=approximateSpheres)
         lodMapCreator.run()
 
         outputMetadataDir = os.path.join(outputDir, prefix + "_metadata")
@@ -417,9 +484,10 @@ def main(argv):
             moveDirectory(lodMapCreator.getOutputDirMetadata(True), outputReflMetadataDir)
 
         nextInputDir = lodMapCreator.getOutputDirMaps(False)
+        nextInputMaps = lodMapCreator.outputMaps if inMemory else None
 
     if staticCol:
-        staticCollisionCreator = StaticCollisionCreator(nextInputDir, os.path.join(tempOutputDir, "static_col"))
+        staticCollisionCreator = StaticCollisionCreator(nextInputDir, os.path.join(tempOutputDir, "static_col"), nextInputMaps, inMemory)
         staticCollisionCreator.run()
 
         outputStaticColsDir = os.path.join(outputDir, prefix + "_col")
@@ -427,14 +495,17 @@ def main(argv):
         moveDirectory(staticCollisionCreator.getOutputDirCollisionModels(), outputStaticColsDir)
 
         nextInputDir = staticCollisionCreator.getOutputDirMaps()
+        nextInputMaps = staticCollisionCreator.outputMaps if inMemory else None
 
     if statistics:
-        statisticsPrinter = StatisticsPrinter(nextInputDir)
+        statisticsPrinter = StatisticsPrinter(nextInputDir, nextInputMaps)
         statisticsPrinter.run()
 
     outputMetadataDir = os.path.join(outputDir, prefix + "_metadata")
     os.makedirs(outputMetadataDir, exist_ok=True)
-    if not os.path.samefile(nextInputDir, inputDir):
+    if nextInputMaps is not None:
+        nextInputMaps.writeDirectory(outputMetadataDir)
+    elif not os.path.samefile(nextInputDir, inputDir):
         moveDirectory(nextInputDir, outputMetadataDir)
 
     shutil.rmtree(tempOutputDir)
@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from common.ymap.MapSet import MapSet
+from worker.lod_map_creator.BundleCache import BundleCache
+
+
+class TestBundleCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cacheDirectory = os.path.join(self.directory, "cache")
+        self.path = os.path.join(self.directory, "a.ymap.xml")
+        with open(self.path, "w") as f:
+            f.write("content a")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_fileHashIsReusedWhileSizeAndModificationTimeAreUnchanged(self):
+        cache = BundleCache(self.cacheDirectory)
+        fileHash = cache.getFileHash(self.path)
+        cache.writeManifest()
+
+        # same size and modification time but different content, hence the hash of the previous run is kept
+        stat = os.stat(self.path)
+        with open(self.path, "w") as f:
+            f.write("content b")
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual(fileHash, BundleCache(self.cacheDirectory).getFileHash(self.path))
+
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        self.assertNotEqual(fileHash, BundleCache(self.cacheDirectory).getFileHash(self.path))
+
+    def test_mapsAreRestored(self):
+        bundleOutputDir = os.path.join(self.directory, "bundle")
+        os.makedirs(os.path.join(bundleOutputDir, "maps"))
+        writtenMaps = MapSet(os.path.join(bundleOutputDir, "maps"))
+        writtenMaps.setContent("b.ymap.xml", "content b")
+        inMemoryMaps = MapSet()
+        inMemoryMaps.setContent("c.ymap.xml", "content c")
+        inMemoryMaps.ymaps["a.ymap.xml"] = None
+        inMemoryMaps.paths["a.ymap.xml"] = self.path
+
+        cache = BundleCache(self.cacheDirectory)
+        cache.store("written_", "key", bundleOutputDir, writtenMaps, {"foundLod": True})
+        cache.store("memory_", "key", bundleOutputDir, inMemoryMaps, {"lodCoords": [[0.1, 2.0, -3.5]]})
+
+        outputDir = os.path.join(self.directory, "out")
+        maps, values = cache.restore("written_", "key", outputDir)
+        self.assertEqual({"foundLod": True}, values)
+        self.assertTrue(maps.isWritten("b.ymap.xml"))
+        self.assertEqual("content b", maps.getContent("b.ymap.xml"))
+        self.assertEqual(os.path.join(outputDir, "maps", "b.ymap.xml"), maps.getPath("b.ymap.xml"))
+
+        maps, values = cache.restore("memory_", "key", outputDir)
+        self.assertEqual({"lodCoords": [[0.1, 2.0, -3.5]]}, values)
+        self.assertIsNone(maps.directory)
+        self.assertEqual(["c.ymap.xml", "a.ymap.xml"], list(maps.ymaps))
+        self.assertEqual("content c", maps.ymaps["c.ymap.xml"])
+        self.assertEqual(self.path, maps.getPath("a.ymap.xml"))
+
+    def test_pruneRemovesUnusedBundlesAndFiles(self):
+        cache = BundleCache(self.cacheDirectory)
+        cache.getFileHash(self.path)
+        for mapPrefix in ["a_", "b_"]:
+            bundleOutputDir = os.path.join(self.directory, "out_" + mapPrefix)
+            os.makedirs(bundleOutputDir)
+            cache.store(mapPrefix, "key " + mapPrefix, bundleOutputDir, MapSet(), {"value": mapPrefix})
+        cache.writeManifest()
+
+        # directories not created by the cache are kept, even if their name is the one of a bundle
+        os.makedirs(os.path.join(self.cacheDirectory, "c_", "data"))
+        os.makedirs(os.path.join(self.cacheDirectory, "unrelated"))
+
+        cache = BundleCache(self.cacheDirectory)
+        self.assertEqual({"value": "a_"}, cache.restore("a_", "key a_", os.path.join(self.directory, "restored"))[1])
+        cache.store("c_", "key c_", os.path.join(self.directory, "out_a_"), MapSet(), {"value": "c_"})
+        cache.prune(["a_", "c_"])
+        cache.writeManifest()
+
+        cache = BundleCache(self.cacheDirectory)
+        self.assertEqual({"a_": "key a_"}, cache.manifest)
+        self.assertEqual({}, cache.fileHashes)
+        self.assertEqual(["a_", "c_", BundleCache.MANIFEST_FILENAME, "unrelated"], sorted(os.listdir(self.cacheDirectory)))
+        self.assertEqual(["data"], os.listdir(os.path.join(self.cacheDirectory, "c_")))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from common.ClusteringCache import ClusteringCache
+
+
+class TestClusteringCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cacheDirectory = ClusteringCache.directory
+        ClusteringCache.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(ClusteringCache.directory)
+        ClusteringCache.directory = self.cacheDirectory
+
+    def test_resultsAreRestored(self):
+        X = np.array([[0.0, 1.0], [2.0, 3.0], [4.0, 5.5]])
+        results = [
+            np.array([0, 1, 1]),
+            (np.array([0, 0, 1]), 2, [2.8284271247461903, 0.0]),
+        ]
+        for i, result in enumerate(results):
+            ClusteringCache.getOrCompute("function", X, (i,), lambda: result)
+            cached = ClusteringCache.getOrCompute("function", X, (i,), lambda: self.fail("result was not cached"))
+
+            if isinstance(result, tuple):
+                self.assertIsInstance(cached, tuple)
+                np.testing.assert_array_equal(result[0], cached[0])
+                self.assertEqual(result[1:], cached[1:])
+                self.assertIsInstance(cached[2], list)
+            else:
+                np.testing.assert_array_equal(result, cached)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from common.ymap.MapSet import MapSet
+
+
+class TestMapSet(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_contentIsKeptInMemoryWithoutDirectory(self):
+        mapSet = MapSet()
+        mapSet.setContent("a.ymap.xml", "content a")
+
+        self.assertEqual("content a", mapSet.ymaps["a.ymap.xml"])
+        self.assertEqual([], os.listdir(self.directory))
+
+    def test_contentIsWrittenThroughToDirectory(self):
+        mapSet = MapSet(self.directory)
+        mapSet.setContent("a.ymap.xml", "content a")
+
+        path = os.path.join(self.directory, "a.ymap.xml")
+        self.assertIsNone(mapSet.ymaps["a.ymap.xml"])
+        with open(path) as f:
+            self.assertEqual("content a", f.read())
+        self.assertEqual("content a", mapSet.getContent("a.ymap.xml"))
+
+        mapSet.removeYmap("a.ymap.xml")
+        self.assertFalse(mapSet.containsYmap("a.ymap.xml"))
+        self.assertFalse(os.path.exists(path))
+
+    def test_relocateAndUpdate(self):
+        bundleDirectory = os.path.join(self.directory, "bundle")
+        mapsDirectory = os.path.join(self.directory, "maps")
+        os.mkdir(bundleDirectory)
+        os.mkdir(mapsDirectory)
+
+        bundleMaps = MapSet(bundleDirectory)
+        bundleMaps.setContent("a.ymap.xml", "content a")
+        shutil.move(os.path.join(bundleDirectory, "a.ymap.xml"), mapsDirectory)
+        bundleMaps.relocate(mapsDirectory)
+
+        mapSet = MapSet(mapsDirectory)
+        mapSet.update(bundleMaps)
+        inMemoryMaps = MapSet()
+        inMemoryMaps.setContent("b.ymap.xml", "content b")
+        mapSet.update(inMemoryMaps)
+
+        self.assertEqual(["a.ymap.xml", "b.ymap.xml"], sorted(os.listdir(mapsDirectory)))
+        self.assertEqual("content a", mapSet.getContent("a.ymap.xml"))
+        self.assertEqual("content b", mapSet.getContent("b.ymap.xml"))
+
+
+if __name__ == '__main__':
+    unittest.main()
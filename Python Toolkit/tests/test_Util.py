@@ -0,0 +1,43 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from common.ClusteringCache import ClusteringCache
+from common.Util import Util
+
+
+class TestPerformClustering(unittest.TestCase):
+
+    def setUp(self):
+        self.cacheDirectory = ClusteringCache.directory
+        ClusteringCache.directory = None
+        rng = np.random.default_rng(seed=1)
+        # a few groups of different size and spread, similar to the entities of a map
+        self.points = np.concatenate([rng.normal(center, scale, (size, 3)) for center, scale, size in
+                                      [([0, 0, 0], 5, 40), ([60, 10, 0], 15, 25), ([20, 80, 5], 3, 10), ([-50, 40, 0], 20, 30)]])
+
+    def tearDown(self):
+        ClusteringCache.directory = self.cacheDirectory
+
+    def assertWithinLimits(self, clusters, furthestDistances, maxPoints: int, maxFurthestDistance: float):
+        self.assertFalse(Util._exceedsClusteringLimits(clusters, np.bincount(clusters).max(), furthestDistances, maxPoints, maxFurthestDistance))
+
+    def test_noMoreClustersThanSearch(self):
+        for maxPoints, maxFurthestDistance in [(20, 1000), (0, 30), (15, 40)]:
+            clusters, furthestDistances = Util.performClustering(self.points.tolist(), maxPoints, maxFurthestDistance)
+            clustersBySearch, unused = Util._performClusteringWithLimitsBySearch(self.points, maxPoints, maxFurthestDistance, False)
+
+            self.assertWithinLimits(clusters, furthestDistances, maxPoints, maxFurthestDistance)
+            self.assertLessEqual(len(np.unique(clusters)), len(np.unique(clustersBySearch)))
+
+    def test_searchIfHierarchyExceedsLimits(self):
+        # a hierarchy which stopped splitting early is no valid upper bound
+        with mock.patch.object(Util, "_calculateBisectionHierarchy", return_value=[]):
+            clusters, furthestDistances = Util.performClustering(self.points.tolist(), 20, 30)
+
+        self.assertWithinLimits(clusters, furthestDistances, 20, 30)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+import os
+import tempfile
+import time
+import unittest
+
+from common.ymap.Patterns import Patterns
+from common.ymap.YmapParser import YmapParser
+
+ENTITY_PLAIN = """    <Item type="CEntityDef">
+      <archetypeName>prop_rock_4_c</archetypeName>
+      <flags value="1572896"/>
+      <guid value="0"/>
+      <position x="-303.28803216" y="-133.84385171" z="36.07422038"/>
+      <rotation x="0.00000000" y="0.00000000" z="0.38268343" w="0.92387953"/>
+      <scaleXY value="0.9"/>
+      <scaleZ value="1.3"/>
+      <parentIndex value="-1"/>
+      <lodDist value="250.00000000"/>
+      <childLodDist value="0"/>
+      <lodLevel>LODTYPES_DEPTH_HD</lodLevel>
+      <numChildren value="0"/>
+      <priorityLevel>PRI_REQUIRED</priorityLevel>
+      <extensions/>
+      <ambientOcclusionMultiplier value="255"/>
+      <artificialAmbientOcclusion value="255"/>
+      <tintValue value="0"/>
+    </Item>
+"""
+
+# the extensions contain elements with the same names as entity fields (name, flags) and nested <Item> blocks
+ENTITY_WITH_EXTENSIONS = """    <Item type="CEntityDef">
+      <archetypeName>prop_tree_pine_01</archetypeName>
+      <flags value="32"/>
+      <guid value="123"/>
+      <position x="70.06448491" y="305.98320067" z="42.30987092"/>
+      <rotation x="0.00000000" y="0.00000000" z="0.00000000" w="1.00000000"/>
+      <scaleXY value="1.2"/>
+      <scaleZ value="1.1"/>
+      <parentIndex value="3"/>
+      <lodDist value="180.00000000"/>
+      <childLodDist value="0"/>
+      <lodLevel>LODTYPES_DEPTH_ORPHANHD</lodLevel>
+      <numChildren value="0"/>
+      <priorityLevel>PRI_OPTIONAL_HIGH</priorityLevel>
+      <extensions>
+        <Item type="CExtensionDefParticleEffect">
+          <name>fx_leaves</name>
+          <offsetPosition x="0.00000000" y="0.00000000" z="4.00000000"/>
+          <offsetRotation x="0.00000000" y="0.00000000" z="0.00000000" w="1.00000000"/>
+          <fxName>ent_amb_leaves</fxName>
+          <fxType value="2"/>
+          <boneTag value="0"/>
+          <scale value="1.00000000"/>
+          <probability value="100"/>
+          <flags value="0"/>
+          <color value="0xFFFFFFFF"/>
+        </Item>
+        <Item type="CExtensionDefLightEffect">
+          <name>light</name>
+          <offsetPosition x="0.00000000" y="0.00000000" z="0.00000000"/>
+          <instances>
+            <Item>
+              <posn x="0.00000000" y="0.00000000" z="1.00000000"/>
+              <flags value="64"/>
+            </Item>
+          </instances>
+        </Item>
+      </extensions>
+      <ambientOcclusionMultiplier value="255"/>
+      <artificialAmbientOcclusion value="255"/>
+      <tintValue value="0"/>
+    </Item>
+"""
+
+CONTENT = """<?xml version="1.0" encoding="UTF-8"?>
+<CMapData>
+  <name>test</name>
+  <entities>
+""" + ENTITY_PLAIN + ENTITY_WITH_EXTENSIONS + """  </entities>
+  <carGenerators>
+    <Item>
+      <position x="1.00000000" y="2.00000000" z="3.00000000"/>
+      <carModel>blista</carModel>
+    </Item>
+  </carGenerators>
+</CMapData>
+"""
+
+
+class TestYmapParser(unittest.TestCase):
+
+    def test_entitiesWithNestedExtensionsAreKeptWhole(self):
+        parsedYmap = YmapParser.readYmapContent(CONTENT)
+
+        self.assertEqual(["prop_rock_4_c", "prop_tree_pine_01"], [entity.archetypeName for entity in parsedYmap.entities])
+        self.assertEqual(ENTITY_PLAIN, parsedYmap.getEntityContent(0))
+        self.assertEqual(ENTITY_WITH_EXTENSIONS, parsedYmap.getEntityContent(1))
+
+        entity = parsedYmap.entities[1]
+        self.assertEqual(32, entity.flags)
+        self.assertEqual(3, entity.parentIndex)
+        self.assertEqual("PRI_OPTIONAL_HIGH", entity.priorityLevel)
+
+    def test_reemittingEntitiesReproducesContent(self):
+        parsedYmap = YmapParser.readYmapContent(CONTENT)
+
+        self.assertEqual(CONTENT, parsedYmap.replaceEntities(lambda i, entityContent: entityContent))
+        self.assertEqual(CONTENT, parsedYmap.createIndex().replaceEntities(lambda i, entityContent: entityContent))
+
+    def test_fastPathAndFallbackAgree(self):
+        for entityContent in [ENTITY_PLAIN, ENTITY_WITH_EXTENSIONS]:
+            inner = Patterns.ENTITY.fullmatch(entityContent).group(1)
+            self.assertIsNotNone(YmapParser._ENTITY_FIELDS_PATTERN.match(inner))
+            self.assertEqual(vars(YmapParser._parseEntityFields(inner)), vars(YmapParser.parseEntity(inner)))
+
+    def test_fallbackHandlesOtherElementOrder(self):
+        # moving guid behind position prevents the fast path
+        reordered = ENTITY_WITH_EXTENSIONS.replace('      <guid value="123"/>\n', '').replace('</archetypeName>\n', '</archetypeName>\n      <guid value="123"/>\n', 1)
+        reordered = reordered.replace('      <flags value="32"/>\n', '').replace('<scaleZ value="1.1"/>\n', '<scaleZ value="1.1"/>\n      <flags value="32"/>\n', 1)
+        inner = Patterns.ENTITY.fullmatch(reordered).group(1)
+        self.assertIsNone(YmapParser._ENTITY_FIELDS_PATTERN.match(inner))
+
+        expected = YmapParser.readYmapContent(CONTENT).entities[1]
+        self.assertEqual(vars(expected), vars(YmapParser.parseEntity(inner)))
+
+    def test_singleLineContent(self):
+        content = CONTENT.replace("\n", "")
+        parsedYmap = YmapParser.readYmapContent(content)
+
+        self.assertEqual(["prop_rock_4_c", "prop_tree_pine_01"], [entity.archetypeName for entity in parsedYmap.entities])
+        self.assertEqual(content, parsedYmap.replaceEntities(lambda i, entityContent: entityContent))
+
+    def test_truncatedEntityDoesNotHang(self):
+        entityContent = '    <Item type="CEntityDef">' + '<a v="1"/>' * 200 + "\n"
+
+        start = time.time()
+        self.assertIsNone(Patterns.ENTITY.search(entityContent))
+        self.assertIsNone(Patterns.ENTITY.search(ENTITY_PLAIN.replace("</Item>", "") * 200))
+        self.assertLess(time.time() - start, 1)
+
+    def test_memoryMappedFileAgreesWithContent(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "test.ymap.xml")
+            with open(path, "w", encoding=YmapParser.ENCODING) as f:
+                f.write(CONTENT)
+
+            entities = YmapParser.readYmapEntitiesFromFile(path)
+
+        expected = YmapParser.readYmapContent(CONTENT).entities
+        self.assertEqual([vars(entity) for entity in expected], [vars(entity) for entity in entities])
+
+    def test_indexReadsContentFromPath(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "test.ymap.xml")
+            with open(path, "w") as f:
+                f.write(CONTENT)
+
+            index = YmapParser.readYmapFile(path).createIndex(path=path)
+
+            self.assertIsNone(index.content)
+            self.assertEqual([ENTITY_PLAIN, ENTITY_WITH_EXTENSIONS], index.getEntityContents())
+            self.assertEqual(CONTENT, index.replaceEntities(lambda i, entityContent: entityContent))
+
+
+if __name__ == '__main__':
+    unittest.main()
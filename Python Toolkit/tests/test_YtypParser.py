@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from common.ytyp.YtypParser import YtypParser
+
+YTYP = """<CMapTypes>
+  <archetypes>
+    <Item type="CBaseArchetypeDef">
+      <lodDist value="{lodDist}"/>
+      <bbMin x="-1.5" y="-2.0" z="0.1"/>
+      <bbMax x="1.5" y="2.0" z="3.3"/>
+      <bsCentre x="0.0" y="0.0" z="1.7"/>
+      <bsRadius value="2.9"/>
+      <name>Prop_A</name>
+    </Item>
+  </archetypes>
+  <name>test_ytyp</name>
+  <dependencies/>
+  <compositeEntityTypes/>
+</CMapTypes>
+"""
+
+
+class TestYtypParser(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.ytypDirectory = os.path.join(self.directory, "ytyp")
+        os.makedirs(self.ytypDirectory)
+        self.cacheDirectory = YtypParser.cacheDirectory
+        YtypParser.cacheDirectory = os.path.join(self.directory, "cache")
+        self.writeYtyp(100)
+
+    def tearDown(self):
+        YtypParser.cacheDirectory = self.cacheDirectory
+        YtypParser._directoryCache.clear()
+        shutil.rmtree(self.directory)
+
+    def writeYtyp(self, lodDist: float):
+        with open(os.path.join(self.ytypDirectory, "test.ytyp.xml"), "w") as f:
+            f.write(YTYP.format(lodDist=lodDist))
+
+    def test_itemsAreRestoredFromCacheFile(self):
+        items = YtypParser.readYtypDirectoryCached(self.ytypDirectory)
+        self.assertEqual(1, len(os.listdir(YtypParser.cacheDirectory)))
+        # nothing is written into the ytyp directory itself
+        self.assertEqual(["test.ytyp.xml"], os.listdir(self.ytypDirectory))
+
+        YtypParser._directoryCache.clear()
+        cachedItems = YtypParser.readYtypDirectoryCached(self.ytypDirectory)
+        self.assertEqual(["prop_a"], list(cachedItems))
+        self.assertEqual(vars(items["prop_a"].boundingBox), vars(cachedItems["prop_a"].boundingBox))
+        self.assertEqual(vars(items["prop_a"].boundingSphere), vars(cachedItems["prop_a"].boundingSphere))
+        self.assertEqual((100.0, "test_ytyp"), (cachedItems["prop_a"].lodDist, cachedItems["prop_a"].parent))
+
+    def test_cacheFileIsInvalidatedByChangedYtyp(self):
+        YtypParser.readYtypDirectoryCached(self.ytypDirectory)
+        YtypParser._directoryCache.clear()
+
+        self.writeYtyp(250.5)
+        self.assertEqual(250.5, YtypParser.readYtypDirectoryCached(self.ytypDirectory)["prop_a"].lodDist)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,13 +2,16 @@ import transforms3d
 import os
 import math
 import random
-import re
-from re import Match
-
-from natsort import natsorted
+import zlib
+from typing import Optional
 
+from common.Parallel import Parallel
 from common.Util import Util
+from common.ymap.EntityItem import EntityItem
+from common.ymap.MapSet import MapSet
+from common.ymap.ParsedYmap import ParsedYmap
 from common.ymap.Ymap import Ymap
+from common.ymap.YmapParser import YmapParser
 from common.ytyp.YtypItem import YtypItem
 from common.ytyp.YtypParser import YtypParser
 
@@ -83,34 +86,61 @@ class EntropyCreator:
     adaptRotationIfIdentity: bool
     limitScale: bool
     adaptScaleIfIdentity: bool
-
-    def __init__(self, inputDir: str, outputDir: str, limitTilt: bool, adaptRotationIfIdentity: bool, limitScale: bool, adaptScaleIfIdentity: bool):
+    inputMaps: Optional[MapSet]
+    outputMaps: MapSet
+    inMemory: bool
+    jobs: int
+    random: random.Random
+
+    def __init__(self, inputDir: str, outputDir: str, limitTilt: bool, adaptRotationIfIdentity: bool, limitScale: bool, adaptScaleIfIdentity: bool,
+                 inputMaps: Optional[MapSet] = None, inMemory: bool = False, jobs: int = 1):
         self.inputDir = inputDir
         self.outputDir = outputDir
+        self.inputMaps = inputMaps
+        self.inMemory = inMemory
+        self.outputMaps = MapSet(None if inMemory else outputDir)
+        self.jobs = jobs
         self.limitTilt = limitTilt
         self.adaptRotationIfIdentity = adaptRotationIfIdentity
         self.limitScale = limitScale
         self.adaptScaleIfIdentity = adaptScaleIfIdentity
 
-        # using a specific seed to be able to get reproducible results
-        random.seed(a=0)
+    def __getstate__(self):
+        # the maps are passed to the worker processes file by file
+        state = self.__dict__.copy()
+        state["inputMaps"] = None
+        state["outputMaps"] = None
+        return state
 
     def run(self):
         print("running entropy creator...")
         self.createOutputDir()
+        self.readInputMaps()
         self.readYtypItems()
         self.processFiles()
         self.copyOthers()
+        self.writeOutputMaps()
         print("entropy creator DONE")
 
     def createOutputDir(self):
+        if self.inMemory:
+            return
+
         if os.path.exists(self.outputDir):
             raise ValueError("Output dir " + self.outputDir + " must not exist")
 
         os.makedirs(self.outputDir)
 
+    def readInputMaps(self):
+        if self.inputMaps is None:
+            self.inputMaps = MapSet.readDirectory(self.inputDir)
+
+    def writeOutputMaps(self):
+        if not self.inMemory:
+            self.outputMaps.writeDirectory(self.outputDir)
+
     def readYtypItems(self):
-        self.ytypItems = YtypParser.readYtypDirectory(os.path.join(os.path.dirname(__file__), "..", "resources", "ytyp"))
+        self.ytypItems = YtypParser.readYtypDirectoryCached(os.path.join(os.path.dirname(__file__), "..", "resources", "ytyp"))
 
     def isScaleCandidate(self, entity: str) -> bool:
         return entity in self.ytypItems and entity.startswith(EntropyCreator.CANDIDATES_SCALE)
@@ -118,22 +148,21 @@ class EntropyCreator:
     def isRotationCandidate(self, entity: str) -> bool:
         return entity in self.ytypItems and entity.startswith(EntropyCreator.CANDIDATES_ROTATION)
 
-    def repl(self, match: Match) -> str:
-        entity = match.group(2).lower()
+    def repl(self, entity: EntityItem, entityContent: str) -> str:
+        archetypeName = entity.archetypeName.lower()
 
-        origScale = [float(match.group(8)), float(match.group(10))]
-        scale = self.adaptScale(entity, origScale)
+        origScale = [entity.scale[0], entity.scale[2]]
+        scale = self.adaptScale(archetypeName, origScale)
 
-        origQuat = [float(match.group(6)), -float(match.group(3)), -float(match.group(4)), -float(match.group(5))]  # order is w, -x, -y, -z
-        rotationQuaternion = self.adaptRotation(entity, origQuat, scale[1])
+        origQuat = entity.rotation  # order is w, -x, -y, -z
+        rotationQuaternion = self.adaptRotation(archetypeName, origQuat, scale[1])
 
         if scale == origScale and rotationQuaternion == origQuat:
-            return match.group(0)
+            return entityContent
 
-        return match.group(1) + \
-               'x="' + Util.floatToStr(-rotationQuaternion[1]) + '" y="' + Util.floatToStr(-rotationQuaternion[2]) + \
-               '" z="' + Util.floatToStr(-rotationQuaternion[3]) + '" w="' + Util.floatToStr(rotationQuaternion[0]) + '"' + \
-               match.group(7) + Util.floatToStr(scale[0]) + match.group(9) + Util.floatToStr(scale[1]) + match.group(11)
+        entityContent = ParsedYmap.replaceRotation(entityContent, rotationQuaternion)
+        entityContent = ParsedYmap.replaceValue(entityContent, "scaleXY", Util.floatToStr(scale[0]))
+        return ParsedYmap.replaceValue(entityContent, "scaleZ", Util.floatToStr(scale[1]))
 
     def adaptScale(self, entity: str, origScale: list[float]) -> list[float]:
         if not self.isScaleCandidate(entity):
@@ -141,7 +170,7 @@ class EntropyCreator:
 
         maxScaleZ = 1.1
         if self.adaptScaleIfIdentity and origScale == [1, 1]:
-            scaleXY = scaleZ = random.uniform(1 / maxScaleZ, maxScaleZ)
+            scaleXY = scaleZ = self.random.uniform(1 / maxScaleZ, maxScaleZ)
         elif self.limitScale and origScale[1] > maxScaleZ:
             ratio = maxScaleZ / origScale[1]
             scaleZ = maxScaleZ
@@ -160,9 +189,9 @@ class EntropyCreator:
 
         if self.adaptRotationIfIdentity and origQuat == [1, 0, 0, 0]:
             maxTilt = self.calculateMaxTilt(entity, scaleZ)
-            rotZBefore = random.uniform(-math.pi, math.pi)
-            tilt = random.uniform(0, maxTilt)
-            rotZAfter = random.uniform(-math.pi, math.pi)
+            rotZBefore = self.random.uniform(-math.pi, math.pi)
+            tilt = self.random.uniform(0, maxTilt)
+            rotZAfter = self.random.uniform(-math.pi, math.pi)
 
             rotationQuaternion = transforms3d.euler.euler2quat(rotZBefore, tilt, rotZAfter, axes='rzyz')
         elif self.limitTilt:
@@ -194,32 +223,26 @@ class EntropyCreator:
         return Util.calculateMaxTilt(treeHeight)
 
     def processFiles(self):
-        for filename in natsorted(os.listdir(self.inputDir)):
-            if filename.endswith(".ymap.xml"):
-                self.processFile(filename)
+        filenames = self.inputMaps.getYmapFilenames()
+        # maps not read yet are only passed by path, so each map is read when it is processed
+        tasks = [(filename, self.inputMaps.getSubset([filename])) for filename in filenames]
+        results = Parallel.imap(EntropyCreator.processFile, self, tasks, self.jobs)
+
+        for filename, content_new in zip(filenames, results):
+            self.outputMaps.setContent(filename.lower(), content_new)
 
-    def processFile(self, filename: str):
+    def processFile(self, filename: str, inputMaps: MapSet) -> str:
         print("\tprocessing " + filename)
 
-        f = open(os.path.join(self.inputDir, filename), 'r')
-        content = f.read()
-        f.close()
+        # using a specific seed per file to get reproducible results independent of the order in which files are processed
+        self.random = random.Random(zlib.crc32(filename.lower().encode()))
 
-        content_new = re.sub('(<Item type="CEntityDef">' +
-                             '\\s*<archetypeName>([^<]+)</archetypeName>' +
-                             '(?:\\s*<[^/].*>)*?' +
-                             '\\s*<rotation )x="([^"]+)" y="([^"]+)" z="([^"]+)" w="([^"]+)"(/>' +
-                             '\\s*<scaleXY value=")([^"]+)("/>' +
-                             '\\s*<scaleZ value=")([^"]+)("/>' +
-                             '(?:\\s*<[^/].*>)*?' +
-                             '\\s*</Item>)', self.repl, content, flags=re.M)
+        ymap = YmapParser.readYmapContent(inputMaps.getContent(filename))
 
-        content_new = Ymap.fixMapExtents(content_new, self.ytypItems)
+        content_new = ymap.replaceEntities(lambda i, entityContent: self.repl(ymap.entities[i], entityContent))
 
-        f = open(os.path.join(self.outputDir, filename.lower()), 'w')
-        f.write(content_new)
-        f.close()
+        return Ymap.fixMapExtents(content_new, self.ytypItems)
 
     def copyOthers(self):
         # copy other files
-        Util.copyFiles(self.inputDir, self.outputDir, lambda filename: not filename.endswith(".ymap.xml"))
+        self.outputMaps.copyOthers(self.inputMaps)
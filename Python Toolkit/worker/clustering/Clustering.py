@@ -6,7 +6,6 @@ import warnings
 from typing import Dict, List, Optional
 
 import numpy as np
-from natsort import natsorted
 from PIL import Image
 from matplotlib import pyplot
 import matplotlib.patheffects as PathEffects
@@ -15,6 +14,9 @@ from sklearn.exceptions import ConvergenceWarning
 
 from common.Util import Util
 from common.PlotManager import PlotManager
+from common.Template import Template
+from common.ymap.MapSet import MapSet
+from common.ymap.EntityIndex import EntityIndex
 from common.ymap.Ymap import Ymap
 from common.ytyp.YtypItem import YtypItem
 from common.ytyp.YtypParser import YtypParser
@@ -36,8 +38,12 @@ class Clustering:
     # Type hints (for readability only)
     inputDir: str
     outputDir: str
+    inputMaps: Optional[MapSet]
+    outputMaps: MapSet
+    inMemory: bool
+    jobs: int
     defaultYmapPart: Optional[str]
-    ymapTemplate: str
+    ymapTemplate: Template
     ytypItems: Dict[str, YtypItem]
     prefix: str
     numCluster: Optional[int]
@@ -49,16 +55,6 @@ class Clustering:
     GROUP_MAX_EXTEND = 1800
     MAX_EXTEND = 600
 
-    # Regex that captures complete <Item> blocks with <position .../> info.
-    # group(0) -> whole entity block
-    # group(1..3) -> x, y, z as strings
-    _PATTERN = re.compile(
-        r"[\t ]*<Item.*?>.*?"
-        r"<position\s+[^>]*x=\"([^\"]+)\"\s+[^>]*y=\"([^\"]+)\"\s+[^>]*z=\"([^\"]+)\"[^>]*/>.*?"
-        r"</Item>\s*",
-        re.DOTALL,
-    )
-
     def __init__(
         self,
         inputDir: str,
@@ -68,9 +64,16 @@ class Clustering:
         polygon: Optional[List[List[float]]],
         clusteringPrefix: Optional[str],
         clusteringExcluded: Optional[List[str]],
+        inputMaps: Optional[MapSet] = None,
+        inMemory: bool = False,
+        jobs: int = 1,
     ):
         self.inputDir = inputDir
         self.outputDir = outputDir
+        self.inputMaps = inputMaps
+        self.inMemory = inMemory
+        self.outputMaps = MapSet(None if inMemory else outputDir)
+        self.jobs = jobs
         self.prefix = prefix
         self.numCluster = numCluster
         self.polygon = polygon
@@ -85,33 +88,46 @@ class Clustering:
         self.readYtyps()
         self.readYmapTemplate()
         self.createOutputDir()
+        self.readInputMaps()
         self.processFiles()
         self.fixMapExtents()
         self.copyOthers()
+        self.writeOutputMaps()
         print("clustering DONE")
 
     # ------------------------------------------------------------------
     # Setup / IO helpers
     # ------------------------------------------------------------------
     def readYtyps(self):
-        self.ytypItems = YtypParser.readYtypDirectory(
+        self.ytypItems = YtypParser.readYtypDirectoryCached(
             os.path.join(os.path.dirname(__file__), "../..", "resources", "ytyp")
         )
 
     def createOutputDir(self):
+        if self.inMemory:
+            return
         if os.path.exists(self.outputDir):
             raise ValueError("Output dir " + self.outputDir + " must not exist")
         os.makedirs(self.outputDir)
 
+    def readInputMaps(self):
+        """Reads the input directory unless the maps were handed over by the previous stage."""
+        if self.inputMaps is None:
+            self.inputMaps = MapSet.readDirectory(self.inputDir)
+
+    def writeOutputMaps(self):
+        """Writes the output maps unless they are kept in memory for the next stage."""
+        if not self.inMemory:
+            self.outputMaps.writeDirectory(self.outputDir)
+
     def readYmapTemplate(self):
         template_path = os.path.join(
             os.path.dirname(__file__), "templates", "template.ymap.xml"
         )
-        with open(template_path, "r") as f:
-            self.ymapTemplate = f.read()
+        self.ymapTemplate = Template.readFile(template_path)
 
         self.defaultYmapPart = self.getYmapPartAfterEntitiesAndBeforeBlock(
-            self.ymapTemplate
+            self.ymapTemplate.content
         )
         if self.defaultYmapPart is None or not self.defaultYmapPart:
             # If the entities block cannot be parsed reliably, just disable the
@@ -222,12 +238,10 @@ class Clustering:
         mapsHavingNotOnlyEntities: List[str] = []
         mapsNeededToCopy: List[str] = []
         mapNames: List[str] = []
+        ymaps: Dict[str, EntityIndex] = {}
 
         # Read all input maps and collect entity coordinates
-        for filename in natsorted(os.listdir(self.inputDir)):
-            if not filename.endswith(".ymap.xml"):
-                continue
-
+        for filename in self.inputMaps.getYmapFilenames():
             mapName = Util.getMapnameFromFilename(filename)
             if mapName in self.clusteringExcluded:
                 mapsNeededToCopy.append(mapName)
@@ -236,10 +250,10 @@ class Clustering:
             mapNames.append(mapName)
 
             print("\treading " + filename)
-            with open(os.path.join(self.inputDir, filename), "r") as f:
-                content = f.read()
+            ymap = self.inputMaps.getYmap(filename, False)
+            ymaps[mapName] = ymap.createIndex(path=self.inputMaps.getPath(filename))
 
-            part = self.getYmapPartAfterEntitiesAndBeforeBlock(content)
+            part = self.getYmapPartAfterEntitiesAndBeforeBlock(ymap.content)
             if (
                 self.defaultYmapPart is not None
                 and part is not None
@@ -247,14 +261,8 @@ class Clustering:
             ):
                 mapsHavingNotOnlyEntities.append(mapName)
 
-            for match in re.finditer(Clustering._PATTERN, content):
-                coords.append(
-                    [
-                        float(match.group(1)),
-                        float(match.group(2)),
-                        float(match.group(3)),
-                    ]
-                )
+            for entity in ymap.entities:
+                coords.append(entity.position)
 
         if not coords:
             return
@@ -293,8 +301,8 @@ class Clustering:
         else:
             hierarchy = self.calculateMapHierarchy(coords)
 
-        # Build grouped entity buffers
-        outputFiles: Dict[int, Dict[int, str]] = {}
+        # Build grouped entity buffers (list of entity blocks per cluster, joined once when writing)
+        outputFiles: Dict[int, Dict[int, List[str]]] = {}
         mapPrefix = self.getMapPrefix(mapNames)
 
         for h in hierarchy:
@@ -303,54 +311,41 @@ class Clustering:
             if group not in outputFiles:
                 outputFiles[group] = {}
             if cluster not in outputFiles[group]:
-                outputFiles[group][cluster] = ""
+                outputFiles[group][cluster] = []
 
         i = 0
-        for filename in natsorted(os.listdir(self.inputDir)):
-            if not filename.endswith(".ymap.xml"):
-                continue
-
-            mapName = Util.getMapnameFromFilename(filename)
-            if mapName in mapsNeededToCopy:
-                continue
-
-            with open(os.path.join(self.inputDir, filename), "r") as f:
-                content = f.read()
-
-            for match in re.finditer(Clustering._PATTERN, content):
+        for index in ymaps.values():
+            for entityContent in index.getEntityContents():
                 cluster = hierarchy[i][0]
                 group = hierarchy[i][1]
-                outputFiles[group][cluster] += match.group(0)
+                outputFiles[group][cluster].append(entityContent)
                 i += 1
 
         self.writeClusteredYmap(mapPrefix, outputFiles)
 
         # Copy excluded maps as-is with an "_excluded" suffix
         for mapName in mapsNeededToCopy:
-            newMapName = Util.findAvailableMapName(
-                self.outputDir, mapName, "_excluded", False
-            )
-            Util.copyFile(
-                self.inputDir,
-                self.outputDir,
-                Util.getFilenameFromMapname(mapName),
-                Util.getFilenameFromMapname(newMapName),
+            newMapName = self.outputMaps.findAvailableMapName(
+                mapName, "_excluded", False
             )
+            newFilename = Util.getFilenameFromMapname(newMapName)
+            if not self.outputMaps.containsYmap(newFilename):
+                self.outputMaps.setContent(
+                    newFilename,
+                    self.inputMaps.getContent(Util.getFilenameFromMapname(mapName)),
+                )
 
         # For maps with additional content, emit *_no_entities variants
         for mapName in mapsHavingNotOnlyEntities:
-            content = Util.readFile(
-                os.path.join(self.inputDir, Util.getFilenameFromMapname(mapName))
-            )
-            newMapName = Util.findAvailableMapName(
-                self.outputDir, mapName, "_no_entities", False
+            content = ymaps[mapName].getContent()
+            newMapName = self.outputMaps.findAvailableMapName(
+                mapName, "_no_entities", False
             )
             content = Ymap.replaceParent(content, None)
             content = Ymap.replaceName(content, newMapName)
             content = re.sub("[\S\s]*", "", content)
-            Util.writeFile(
-                os.path.join(self.outputDir, Util.getFilenameFromMapname(newMapName)),
-                content,
+            self.outputMaps.setContent(
+                Util.getFilenameFromMapname(newMapName), content
             )
 
         # Feed the overview plot
@@ -362,7 +357,7 @@ class Clustering:
     def writeClusteredYmap(
         self,
         mapPrefix: str,
-        clusteredEntities: Dict[int, Dict[int, str]],
+        clusteredEntities: Dict[int, Dict[int, List[str]]],
     ):
         numGroups = len(clusteredEntities)
         for group, clusters_in_group in clusteredEntities.items():
@@ -375,17 +370,17 @@ class Clustering:
                     "_" if clusterName else ""
                 ) + clusterName
                 ymapContent = self.createYmapContent(mapName, entities)
-                with open(
-                    os.path.join(self.outputDir, Util.getFilenameFromMapname(mapName)),
-                    "w",
-                ) as file:
-                    file.write(ymapContent)
-
-    def createYmapContent(self, mapName: str, entities: str) -> str:
-        return (
-            self.ymapTemplate.replace("${NAME}", mapName)
-            .replace("${TIMESTAMP}", Util.getNowInIsoFormat())
-            .replace("${ENTITIES}\n", entities)
+                self.outputMaps.setContent(
+                    Util.getFilenameFromMapname(mapName), ymapContent
+                )
+
+    def createYmapContent(self, mapName: str, entities: List[str]) -> str:
+        return self.ymapTemplate.render(
+            {
+                "NAME": mapName,
+                "TIMESTAMP": Util.getNowInIsoFormat(),
+                "ENTITIES": entities,
+            }
         )
 
     # ------------------------------------------------------------------
@@ -483,24 +478,8 @@ class Clustering:
     def fixMapExtents(self):
         """Adapt extents and parent/name of the output maps."""
         print("\tfixing map extents")
-        for filename in natsorted(os.listdir(self.outputDir)):
-            if not filename.endswith(".ymap.xml"):
-                continue
-
-            with open(os.path.join(self.outputDir, filename), "r") as file:
-                content = file.read()
-
-            content = Ymap.replaceName(content, filename.lower()[:-9])
-            content = Ymap.replaceParent(content, None)
-            content = Ymap.fixMapExtents(content, self.ytypItems)
-
-            with open(os.path.join(self.outputDir, filename), "w") as file:
-                file.write(content)
+        Ymap.fixMapExtentsOfAll(self.outputMaps, self.ytypItems, self.jobs, True)
 
     def copyOthers(self):
-        """Copy non-ymap files from input directory to output directory."""
-        Util.copyFiles(
-            self.inputDir,
-            self.outputDir,
-            lambda filename: not filename.endswith(".ymap.xml"),
-        )
+        """Pass non-ymap files of the input through to the output."""
+        self.outputMaps.copyOthers(self.inputMaps)
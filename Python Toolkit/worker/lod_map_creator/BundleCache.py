@@ -0,0 +1,203 @@
+import hashlib
+import json
+import os
+import shutil
+from typing import Any, Optional
+
+from common.ymap.MapSet import MapSet
+
+
+class BundleCache:
+    """
+    Results of prefix bundles from previous runs of the lod map creator, so that unchanged bundles are copied
+    instead of recomputed. The directory contains a manifest with the content hash of each bundle and per bundle
+    the result of processing it as JSON together with the files that were written meanwhile and the maps held in
+    memory. Nothing is unpickled, so a cache directory can not execute code when it is read. The manifest also holds
+    the content hashes of the input files by size and modification time, so unchanged files are not read again.
+    Bundles and files which are not used by a run are removed from the cache at the end of that run.
+    """
+
+    MANIFEST_FILENAME = "manifest.json"
+    RESULT_FILENAME = "result.json"
+    FILES_DIRECTORY = "files"
+    MAPS_DIRECTORY = "maps"
+    CACHE_VERSION = 3
+
+    directory: str
+    # content hash by lower case prefix of the bundle
+    manifest: dict[str, str]
+    # size, modification time and content hash by path of the input files of previous runs
+    fileHashes: dict[str, list]
+    # entries of fileHashes used by this run
+    _usedFileHashes: dict[str, list]
+    # lower case prefixes of the bundle directories created by this cache (according to the manifest or in this run),
+    # only these directories are ever removed since the cache directory may contain other files of the user as well
+    _bundleDirectories: set[str]
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.manifest, self.fileHashes = self._readManifest()
+        self._usedFileHashes = {}
+        self._bundleDirectories = set(self.manifest)
+
+    @staticmethod
+    def updateHashWithFile(hasher: Any, path: str, name: Optional[str] = None):
+        # the file is identified by name (by default its filename) rather than by path so that the hash does not change
+        # when moving the directories. A missing file results in a different hash than an empty one.
+        hasher.update((os.path.basename(path) if name is None else name).encode() + b"\0")
+        if not os.path.isfile(path):
+            hasher.update(b"\1")
+            return
+
+        hasher.update(b"\0")
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                hasher.update(chunk)
+
+    @staticmethod
+    def updateHashWithDirectory(hasher: Any, path: str, extension: str):
+        if not os.path.isdir(path):
+            return
+
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if filename.endswith(extension):
+                    filePath = os.path.join(dirpath, filename)
+                    BundleCache.updateHashWithFile(hasher, filePath, os.path.relpath(filePath, path))
+
+    @staticmethod
+    def createHash(*values: Any) -> Any:
+        hasher = hashlib.sha256(str(BundleCache.CACHE_VERSION).encode())
+        for value in values:
+            hasher.update(repr(value).encode() + b"\0")
+        return hasher
+
+    def getFileHash(self, path: str) -> str:
+        # the content hash of the previous run is reused as long as size and modification time did not change
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        signature = [stat.st_size, stat.st_mtime_ns]
+        entry = self.fileHashes.get(path)
+        if entry is None or entry[:2] != signature:
+            hasher = hashlib.sha256()
+            BundleCache.updateHashWithFile(hasher, path)
+            entry = signature + [hasher.hexdigest()]
+            self.fileHashes[path] = entry
+
+        self._usedFileHashes[path] = entry
+        return entry[2]
+
+    def restore(self, mapPrefix: str, key: str, outputDir: str) -> Optional[tuple[MapSet, dict[str, Any]]]:
+        """
+        Returns the output maps and the values of the given bundle if it was stored with the same key and copies the
+        files written while processing it to outputDir. Otherwise returns None.
+        """
+        if self.manifest.get(mapPrefix.lower()) != key:
+            return None
+
+        bundleDir = self._getBundleDirectory(mapPrefix)
+        try:
+            with open(os.path.join(bundleDir, BundleCache.RESULT_FILENAME), "r") as f:
+                cached = json.load(f)
+        except Exception:
+            return None
+
+        # the key is stored alongside the result as well in case a previous run was aborted while storing the bundle
+        if not isinstance(cached, dict) or cached.get("key") != key:
+            return None
+
+        shutil.copytree(os.path.join(bundleDir, BundleCache.FILES_DIRECTORY), outputDir, dirs_exist_ok=True)
+
+        mapsDirectory = cached["mapsDirectory"]
+        maps = MapSet(None if mapsDirectory is None else os.path.join(outputDir, mapsDirectory))
+        for filename, kind, path in cached["maps"]:
+            if kind == "written":
+                maps.ymaps[filename] = None
+                maps.paths[filename] = os.path.join(maps.directory, filename)
+            elif kind == "memory":
+                with open(os.path.join(bundleDir, BundleCache.MAPS_DIRECTORY, filename), "r") as f:
+                    maps.ymaps[filename] = f.read()
+            else:
+                maps.ymaps[filename] = None
+                maps.paths[filename] = path
+        maps.others = cached["others"]
+
+        return maps, cached["values"]
+
+    def store(self, mapPrefix: str, key: str, bundleOutputDir: str, maps: MapSet, values: dict[str, Any]):
+        """
+        Stores the files in bundleOutputDir together with the output maps (which are written to bundleOutputDir or
+        held in memory) and the given JSON serializable values of the bundle.
+        """
+        bundleDir = self._getBundleDirectory(mapPrefix)
+        self.manifest.pop(mapPrefix.lower(), None)
+        if os.path.exists(bundleDir) and mapPrefix.lower() not in self._bundleDirectories:
+            print("\tWARNING: could not store bundle " + mapPrefix + " in lod map cache " + self.directory + ": " + bundleDir + " already exists")
+            return
+
+        self._bundleDirectories.add(mapPrefix.lower())
+        try:
+            if os.path.exists(bundleDir):
+                shutil.rmtree(bundleDir)
+            shutil.copytree(bundleOutputDir, os.path.join(bundleDir, BundleCache.FILES_DIRECTORY))
+            os.makedirs(os.path.join(bundleDir, BundleCache.MAPS_DIRECTORY))
+
+            # the maps in order of the map set, each either written to its directory, held in memory or referenced by path
+            entries = []
+            for filename in maps.ymaps:
+                if maps.isWritten(filename):
+                    entries.append([filename, "written", None])
+                elif maps.ymaps[filename] is not None:
+                    with open(os.path.join(bundleDir, BundleCache.MAPS_DIRECTORY, filename), "w") as f:
+                        f.write(maps.ymaps[filename])
+                    entries.append([filename, "memory", None])
+                else:
+                    entries.append([filename, "path", maps.paths[filename]])
+
+            mapsDirectory = None if maps.directory is None else os.path.relpath(maps.directory, bundleOutputDir)
+            with open(os.path.join(bundleDir, BundleCache.RESULT_FILENAME), "w") as f:
+                json.dump({"key": key, "mapsDirectory": mapsDirectory, "maps": entries, "others": maps.others, "values": values}, f)
+        except OSError as e:
+            print("\tWARNING: could not store bundle " + mapPrefix + " in lod map cache " + self.directory + ": " + str(e))
+            return
+
+        self.manifest[mapPrefix.lower()] = key
+
+    def prune(self, mapPrefixes: list[str]):
+        """
+        Removes all bundles except the given ones as well as the hashes of all files not used by this run.
+        """
+        keep = set(mapPrefix.lower() for mapPrefix in mapPrefixes)
+        for mapPrefix in sorted(self._bundleDirectories - keep):
+            self.manifest.pop(mapPrefix, None)
+            shutil.rmtree(self._getBundleDirectory(mapPrefix), ignore_errors=True)
+        self._bundleDirectories &= keep
+
+        self.fileHashes = self._usedFileHashes
+
+    def writeManifest(self):
+        manifestFile = os.path.join(self.directory, BundleCache.MANIFEST_FILENAME)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(manifestFile + ".tmp", "w") as f:
+                json.dump({"version": BundleCache.CACHE_VERSION, "bundles": self.manifest, "files": self.fileHashes}, f, indent=2, sort_keys=True)
+            os.replace(manifestFile + ".tmp", manifestFile)
+        except OSError as e:
+            print("\tWARNING: could not write lod map cache manifest " + manifestFile + ": " + str(e))
+
+    def _readManifest(self) -> tuple[dict[str, str], dict[str, list]]:
+        try:
+            with open(os.path.join(self.directory, BundleCache.MANIFEST_FILENAME), "r") as f:
+                manifest = json.load(f)
+        except Exception:
+            return {}, {}
+
+        if not isinstance(manifest, dict) or manifest.get("version") != BundleCache.CACHE_VERSION or not isinstance(manifest.get("bundles"), dict) \
+                or not isinstance(manifest.get("files"), dict):
+            return {}, {}
+
+        return manifest["bundles"], manifest["files"]
+
+    def _getBundleDirectory(self, mapPrefix: str) -> str:
+        return os.path.join(self.directory, mapPrefix.lower())
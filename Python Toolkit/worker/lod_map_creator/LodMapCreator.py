@@ -1,21 +1,22 @@
+import copy
 import math
 import shutil
 import os
-import re
 import json
 import numpy as np
 import transforms3d
 from matplotlib import pyplot
 from numpy.linalg import norm
-from re import Match
-from typing import IO, Optional, Tuple, Dict, Any
-from natsort import natsorted
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple, Dict, Any
 from dataclasses import dataclass
 
 from common.BoundingGeometry import BoundingGeometry
+from common.Parallel import Parallel
 from common.Box import Box
 from common.PlotManager import PlotManager
 from common.Sphere import Sphere
+from common.Template import Template
 from common.Util import Util
 from common.texture.UV import UV
 from common.texture.UVMap import UVMap
@@ -23,10 +24,15 @@ from common.ymap.ContentFlag import ContentFlag
 from common.ymap.EntityItem import EntityItem
 from common.ymap.Flag import Flag
 from common.ymap.LodLevel import LodLevel
+from common.ymap.MapSet import MapSet
+from common.ymap.Patterns import Patterns
+from common.ymap.ParsedYmap import ParsedYmap
 from common.ymap.PriorityLevel import PriorityLevel
 from common.ymap.Ymap import Ymap
+from common.ymap.YmapParser import YmapParser
 from common.ytyp.YtypItem import YtypItem
 from common.ytyp.YtypParser import YtypParser
+from worker.lod_map_creator.BundleCache import BundleCache
 from worker.lod_map_creator.LodCandidate import LodCandidate
 from worker.lod_map_creator.Manifest import Manifest
 
@@ -34,11 +40,19 @@ from worker.lod_map_creator.Manifest import Manifest
 class LodMapCreator:
     inputDir: str
     outputDir: str
+    inputMaps: Optional[MapSet]
+    outputMaps: MapSet
+    inMemory: bool
+    jobs: int
+    # worker processes creating the LOD/SLOD models of all prefix bundles processed by this creator (if jobs > 1)
+    _modelPool: Optional[ProcessPoolExecutor]
 
     prefix: str
     bundlePrefixes: list[str]
     clearLod: bool
     createReflection: bool
+    # use approximate (slightly larger but much faster to compute) bounding spheres for the LOD and SLOD models
+    approximateBoundingSpheres: bool
 
     contentTemplateYtypItem: str
     contentTemplateMesh: str
@@ -48,12 +62,13 @@ class LodMapCreator:
     contentTemplateOdrShaderTreeLod: str
     contentTemplateOdrShaderTreeLod2: str
     contentTemplateOdrShaderAlpha: str
-    contentTemplateEntitySlod: str
-    contentTemplateSlod2Map: str
+    contentTemplateEntitySlod: Template
+    contentTemplateSlod2Map: Template
 
     ytypItems: dict[str, YtypItem]
-    reflYtypItems: dict[str, IO]
-    slodYtypItems: dict[str, IO]
+    # ytyp items by ytyp name, written to the metadata dirs once all prefix bundles are processed
+    reflYtypItems: dict[str, list[str]]
+    slodYtypItems: dict[str, list[str]]
     slodCandidates: dict[str, UVMap]
     foundLod: bool
     foundSlod: bool
@@ -303,12 +318,23 @@ class LodMapCreator:
     MIN_HD_LOD_DISTANCE_FOR_SLOD4 = Util.calculateLodDistance(unitBox, unitSphere, [20] * 3, True)
 
     def __init__(self, inputDir: str, outputDir: str, prefix: str,
-                 clearLod: bool, createReflection: bool, lodMultipliers=None, lodDistanceOverrides=None):
+                 clearLod: bool, createReflection: bool, lodMultipliers=None, lodDistanceOverrides=None,
+                 inputMaps: Optional[MapSet] = None, inMemory: bool = False, jobs: int = 1, cacheDir: Optional[str] = None,
+                 approximateBoundingSpheres: bool = False):
         self.inputDir = inputDir
         self.outputDir = outputDir
+        self.inputMaps = inputMaps
+        self.inMemory = inMemory
+        # non-reflection maps; reflection maps are final outputs and therefore written directly
+        self.outputMaps = MapSet(None if inMemory else self.getOutputDirMaps(False))
+        self.jobs = jobs
+        self._modelPool = None
+        # results of prefix bundles from previous runs, which are reused for bundles whose inputs did not change
+        self.bundleCache = None if cacheDir is None else BundleCache(cacheDir)
         self.prefix = prefix
         self.clearLod = clearLod
         self.createReflection = createReflection
+        self.approximateBoundingSpheres = approximateBoundingSpheres
         # Optional per-category absolute LOD distance overrides coming from the CLI / UI.
         # Expected keys: 'cacti', 'trees', 'bushes', 'palms'.
         # Values are absolute lodDist values; a value <= 0 is ignored.
@@ -344,6 +370,14 @@ class LodMapCreator:
         self._builtinLodKeysLower = set()
         self._builtinSlodKeysLower = set()
 
+    def __getstate__(self):
+        # the maps are passed to the worker processes bundle by bundle
+        state = self.__dict__.copy()
+        state["inputMaps"] = None
+        state["outputMaps"] = None
+        state["_modelPool"] = None
+        return state
+
     def _load_custom_slod_candidates(self) -> dict[str, UVMap]:
         """Load optional additional SLOD candidates from slod_custom_candidates.json.
 
@@ -996,10 +1030,12 @@ class LodMapCreator:
         mesh = self._get_obj_mesh_cached(name, obj_path)
         base_offset = len(groupToVertices[key])
 
-        for v, n, uv in zip(mesh.vertices, mesh.normals, mesh.uvs):
-            groupToVertices[key].append(entity.applyTransformationTo(v))
-            groupToNormals[key].append(Util.applyRotation(n, entity.rotation))
-            groupToTextureUVs[key].append(uv)
+        if len(mesh.vertices) > 0:
+            rotation = np.array(entity.rotation, dtype=float)
+            vertices = np.array(mesh.vertices, dtype=float)
+            groupToVertices[key] += Util.applyTransformations(vertices, rotation, np.array(entity.scale, dtype=float), np.array(entity.position, dtype=float)).tolist()
+            groupToNormals[key] += list(Util.applyRotations(np.array(mesh.normals, dtype=float), rotation))
+            groupToTextureUVs[key] += mesh.uvs
 
         groupToIndices[key].extend([i + base_offset for i in mesh.indices])
         return True
@@ -1077,6 +1113,7 @@ class LodMapCreator:
         else:
             print("running lod map creator...")
 
+        self.readInputMaps()
         self.determinePrefixBundles()
         self.readTemplates()
 
@@ -1103,6 +1140,7 @@ class LodMapCreator:
             self.createManifest(True)
 
         self.copyOthers()
+        self.writeOutputMaps()
         self.copyTextureDictionaries()
 
         if self.clearLod:
@@ -1146,7 +1184,8 @@ class LodMapCreator:
             raise ValueError("Output dir " + self.outputDir + " must not exist")
 
         os.makedirs(self.outputDir)
-        os.mkdir(self.getOutputDirMaps(False))
+        if not self.inMemory:
+            os.mkdir(self.getOutputDirMaps(False))
         os.mkdir(self.getOutputDirMeshes(False))
         os.mkdir(self.getOutputDirModels(False))
         os.mkdir(self.getOutputDirMetadata(False))
@@ -1157,6 +1196,25 @@ class LodMapCreator:
             os.mkdir(self.getOutputDirModels(True))
             os.mkdir(self.getOutputDirMetadata(True))
 
+    def createOutputDirOfBundle(self):
+        # only the directories of files written while processing a prefix bundle
+        os.makedirs(self.getOutputDirMeshes(False))
+        os.mkdir(self.getOutputDirModels(False))
+        if not self.inMemory:
+            os.mkdir(self.getOutputDirMaps(False))
+        if self.createReflection:
+            os.mkdir(self.getOutputDirMaps(True))
+            os.mkdir(self.getOutputDirMeshes(True))
+            os.mkdir(self.getOutputDirModels(True))
+
+    def readInputMaps(self):
+        if self.inputMaps is None:
+            self.inputMaps = MapSet.readDirectory(self.inputDir)
+
+    def writeOutputMaps(self):
+        if not self.inMemory:
+            self.outputMaps.writeDirectory(self.getOutputDirMaps(False))
+
     def getOutputDirMaps(self, reflection: bool) -> str:
         directory = ("refl_" if reflection else "") + "maps"
         return os.path.join(self.outputDir, directory)
@@ -1174,6 +1232,9 @@ class LodMapCreator:
         return os.path.join(self.outputDir, directory)
 
 
+    def getOutputDirBundle(self, mapPrefix: str) -> str:
+        return os.path.join(self.outputDir, "_bundle_" + mapPrefix.lower())
+
     def getOutputDirCustomMeshes(self) -> str:
         """Dedicated folder for helper meshes (not part of LOD/SLOD)."""
         return os.path.join(self.outputDir, "custom_meshes")
@@ -1185,13 +1246,8 @@ class LodMapCreator:
         self.contentTemplateYtypItem = f.read()
         f.close()
 
-        f = open(os.path.join(templatesDir, "template_slod_entity.ymap.xml"), 'r')
-        self.contentTemplateEntitySlod = f.read()
-        f.close()
-
-        f = open(os.path.join(templatesDir, "template_slod2.ymap.xml"), 'r')
-        self.contentTemplateSlod2Map = f.read()
-        f.close()
+        self.contentTemplateEntitySlod = Template.readFile(os.path.join(templatesDir, "template_slod_entity.ymap.xml"))
+        self.contentTemplateSlod2Map = Template.readFile(os.path.join(templatesDir, "template_slod2.ymap.xml"))
 
         f = open(os.path.join(templatesDir, "template_slod.mesh"), 'r')
         self.contentTemplateMesh = f.read()
@@ -1222,29 +1278,30 @@ class LodMapCreator:
         f.close()
 
     def readYtypItems(self):
-        self.ytypItems = YtypParser.readYtypDirectory(os.path.join(os.path.dirname(__file__), "..", "..", "resources", "ytyp"))
+        self.ytypItems = YtypParser.readYtypDirectoryCached(os.path.join(os.path.dirname(__file__), "..", "..", "resources", "ytyp"))
 
     def replaceFlagsAndContentFlags(self, content: str, flags: int, contentFlags: int) -> str:
         # TODO deal with existing flags, e.g. "Scripted (1)"
-        return re.sub(
-            '(<flags\\s+value=")[^"]*("\\s*/>\\s*<contentFlags\\s+value=")[^"]*("\\s*/>)',
+        return Patterns.FLAGS_AND_CONTENT_FLAGS.sub(
             "\\g<1>" + str(flags) + "\\g<2>" + str(contentFlags) + "\\g<3>", content
         )
 
-    def replParentIndexAndLodDistance(self, matchobj: Match, entities: list[EntityItem], mutableIndex: list[int], hdToLod: dict[int, int], offsetParentIndex: int) -> str:
-        archetypeName = matchobj.group(2).lower()
+    def replParentIndexAndLodDistance(self, hdEntity: EntityItem, entityContent: str, entities: list[EntityItem], mutableIndex: list[int], hdToLod: dict[int, int], offsetParentIndex: int) -> str:
+        if hdEntity.parentIndex is None or hdEntity.lodDistance is None:
+            return entityContent
+
+        archetypeName = hdEntity.archetypeName.lower()
         if (self.USE_SLOD_TEMPLATE_FOR_LEVEL_AND_ABOVE > 0 and archetypeName in self.lodCandidates) or \
                 (self.USE_SLOD_TEMPLATE_FOR_LEVEL_AND_ABOVE <= 0 and archetypeName in self.slodCandidates):
             index = mutableIndex[0]
             parentIndex = hdToLod[index] + offsetParentIndex
             entity = entities[index]
-            lodDistance = Util.floatToStr(entity.lodDistance)
+            entityContent = ParsedYmap.replaceValue(entityContent, "lodDist", Util.floatToStr(entity.lodDistance))
             mutableIndex[0] += 1
         else:
             parentIndex = -1
-            lodDistance = matchobj.group(4)
 
-        return matchobj.group(1) + str(parentIndex) + matchobj.group(3) + lodDistance + matchobj.group(5)
+        return ParsedYmap.replaceValue(entityContent, "parentIndex", str(parentIndex))
 
     def replacePlaceholders(self, template: str, name: str, textureDictionary: str, drawableDictionary: str, bbox: Box, bsphere: Sphere, hdDistance: float, lodDistance: float) -> str:
         return template \
@@ -1291,25 +1348,9 @@ class LodMapCreator:
         argmin = np.abs(np.asarray(options) - ratioInput).argmin()
         return options[argmin], argmin
 
-    @staticmethod
-    def createLodModelVertexNormalTextureUVStr(vertex: list[float], normal: list[float], uv: list[float]):
-        colors = "255 0 255 255"
-        return "				" + Util.vectorToStr(vertex) + " / " + Util.vectorToStr(Util.normalize(normal)) + " / " + colors + " / " + Util.vectorToStr(uv) + "\n"
-
     def createIndicesStr(self, indices: list[int]) -> str:
-        indicesStr = ""
-        i = 0
-        for index in indices:
-            if i % 15 == 0:
-                if i > 0:
-                    indicesStr += "\n"
-                indicesStr += "				"
-            else:
-                indicesStr += " "
-            indicesStr += str(index)
-            i += 1
-
-        return indicesStr
+        # 15 indices per line
+        return "\n".join(["				" + " ".join(map(str, indices[i:i + 15])) for i in range(0, len(indices), 15)])
 
     @staticmethod
     def appendFrontPlaneIndicesForLod(indices: list[int], offset: int):
@@ -1358,25 +1399,25 @@ class LodMapCreator:
         minZ = bbox.min[2] + height * max(0.0, sideOffsetZ)
         maxZ = bbox.max[2] - height * min(0.0, sideOffsetZ)
 
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [bbox.min[0], planeIntersection[1], bbox.min[2]], [-1, -0.1, 0], [uvFrontMin.u, uvFrontMax.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [bbox.max[0], planeIntersection[1], bbox.min[2]], [1, -0.1, 0], [uvFrontMax.u, uvFrontMax.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [bbox.max[0], planeIntersection[1], bbox.max[2]], [1, 0, 1], [uvFrontMax.u, uvFrontMin.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [bbox.min[0], planeIntersection[1], bbox.max[2]], [-1, 0, 1], [uvFrontMin.u, uvFrontMin.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [bbox.min[0], planeIntersection[1], bbox.min[2]], [-1, -0.1, 0], [uvFrontMin.u, uvFrontMax.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [bbox.max[0], planeIntersection[1], bbox.min[2]], [1, -0.1, 0], [uvFrontMax.u, uvFrontMax.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [bbox.max[0], planeIntersection[1], bbox.max[2]], [1, 0, 1], [uvFrontMax.u, uvFrontMin.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [bbox.min[0], planeIntersection[1], bbox.max[2]], [-1, 0, 1], [uvFrontMin.u, uvFrontMin.v])
 
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0], bbox.min[1], minZ], [0.1, -1, 0], [uvSideMin.u, uvSideMax.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0], bbox.max[1], minZ], [0.1, 1, 0], [uvSideMax.u, uvSideMax.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0], bbox.max[1], maxZ], [0, 1, 1], [uvSideMax.u, uvSideMin.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0], bbox.min[1], maxZ], [0, -1, 1], [uvSideMin.u, uvSideMin.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0], bbox.min[1], minZ], [0.1, -1, 0], [uvSideMin.u, uvSideMax.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0], bbox.max[1], minZ], [0.1, 1, 0], [uvSideMax.u, uvSideMax.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0], bbox.max[1], maxZ], [0, 1, 1], [uvSideMax.u, uvSideMin.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0], bbox.min[1], maxZ], [0, -1, 1], [uvSideMin.u, uvSideMin.v])
 
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [bbox.min[0], planeIntersection[1], bbox.min[2]], [-1, 0.1, 0], [uvFrontMin.u, uvFrontMax.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [bbox.max[0], planeIntersection[1], bbox.min[2]], [1, 0.1, 0], [uvFrontMax.u, uvFrontMax.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [bbox.max[0], planeIntersection[1], bbox.max[2]], [1, 0, 1], [uvFrontMax.u, uvFrontMin.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [bbox.min[0], planeIntersection[1], bbox.max[2]], [-1, 0, 1], [uvFrontMin.u, uvFrontMin.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [bbox.min[0], planeIntersection[1], bbox.min[2]], [-1, 0.1, 0], [uvFrontMin.u, uvFrontMax.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [bbox.max[0], planeIntersection[1], bbox.min[2]], [1, 0.1, 0], [uvFrontMax.u, uvFrontMax.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [bbox.max[0], planeIntersection[1], bbox.max[2]], [1, 0, 1], [uvFrontMax.u, uvFrontMin.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [bbox.min[0], planeIntersection[1], bbox.max[2]], [-1, 0, 1], [uvFrontMin.u, uvFrontMin.v])
 
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0], bbox.min[1], minZ], [-0.1, -1, 0], [uvSideMin.u, uvSideMax.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0], bbox.max[1], minZ], [-0.1, 1, 0], [uvSideMax.u, uvSideMax.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0], bbox.max[1], maxZ], [0, 1, 1], [uvSideMax.u, uvSideMin.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0], bbox.min[1], maxZ], [0, -1, 1], [uvSideMin.u, uvSideMin.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0], bbox.min[1], minZ], [-0.1, -1, 0], [uvSideMin.u, uvSideMax.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0], bbox.max[1], minZ], [-0.1, 1, 0], [uvSideMax.u, uvSideMax.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0], bbox.max[1], maxZ], [0, 1, 1], [uvSideMax.u, uvSideMin.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0], bbox.min[1], maxZ], [0, -1, 1], [uvSideMin.u, uvSideMin.v])
 
     def appendDiagonalPlaneVerticesForLod(self, vertices: list[list[float]], normals: list[list[float]], textureUVs: list[list[float]], entity: EntityItem, planeIntersection: list[float]):
         bbox = self.ytypItems[entity.archetypeName].boundingBox
@@ -1423,25 +1464,25 @@ class LodMapCreator:
             adapt = (1 - desiredRatio) / desiredRatio * lengthVectorRightBottom / lengthVectorLeftTop
             vectorLeftTop = [vectorLeftTop[0] * adapt, vectorLeftTop[1] * adapt]
 
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0] + vectorRightTop[0], planeIntersection[1] + vectorRightTop[1], bbox.min[2]], [0.9, 1, 0], [uvDiagonal1Min.u, uvDiagonal1Max.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0] + vectorLeftBottom[0], planeIntersection[1] + vectorLeftBottom[1], bbox.min[2]], [-1, -0.9, 0], [uvDiagonal1Max.u, uvDiagonal1Max.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0] + vectorLeftBottom[0], planeIntersection[1] + vectorLeftBottom[1], bbox.max[2]], [-1, -1, 1], [uvDiagonal1Max.u, uvDiagonal1Min.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0] + vectorRightTop[0], planeIntersection[1] + vectorRightTop[1], bbox.max[2]], [1, 1, 1], [uvDiagonal1Min.u, uvDiagonal1Min.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0] + vectorRightTop[0], planeIntersection[1] + vectorRightTop[1], bbox.min[2]], [0.9, 1, 0], [uvDiagonal1Min.u, uvDiagonal1Max.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0] + vectorLeftBottom[0], planeIntersection[1] + vectorLeftBottom[1], bbox.min[2]], [-1, -0.9, 0], [uvDiagonal1Max.u, uvDiagonal1Max.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0] + vectorLeftBottom[0], planeIntersection[1] + vectorLeftBottom[1], bbox.max[2]], [-1, -1, 1], [uvDiagonal1Max.u, uvDiagonal1Min.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0] + vectorRightTop[0], planeIntersection[1] + vectorRightTop[1], bbox.max[2]], [1, 1, 1], [uvDiagonal1Min.u, uvDiagonal1Min.v])
 
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0] + vectorRightBottom[0], planeIntersection[1] + vectorRightBottom[1], bbox.min[2]], [1, 0.9, 0], [uvDiagonal2Min.u, uvDiagonal2Max.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0] + vectorLeftTop[0], planeIntersection[1] + vectorLeftTop[1], bbox.min[2]], [-0.9, 1, 0], [uvDiagonal2Max.u, uvDiagonal2Max.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0] + vectorLeftTop[0], planeIntersection[1] + vectorLeftTop[1], bbox.max[2]], [-1, 1, 1], [uvDiagonal2Max.u, uvDiagonal2Min.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0] + vectorRightBottom[0], planeIntersection[1] + vectorRightBottom[1], bbox.max[2]], [1, 1, 1], [uvDiagonal2Min.u, uvDiagonal2Min.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0] + vectorRightBottom[0], planeIntersection[1] + vectorRightBottom[1], bbox.min[2]], [1, 0.9, 0], [uvDiagonal2Min.u, uvDiagonal2Max.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0] + vectorLeftTop[0], planeIntersection[1] + vectorLeftTop[1], bbox.min[2]], [-0.9, 1, 0], [uvDiagonal2Max.u, uvDiagonal2Max.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0] + vectorLeftTop[0], planeIntersection[1] + vectorLeftTop[1], bbox.max[2]], [-1, 1, 1], [uvDiagonal2Max.u, uvDiagonal2Min.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0] + vectorRightBottom[0], planeIntersection[1] + vectorRightBottom[1], bbox.max[2]], [1, 1, 1], [uvDiagonal2Min.u, uvDiagonal2Min.v])
 
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0] + vectorRightTop[0], planeIntersection[1] + vectorRightTop[1], bbox.min[2]], [1, 0.9, 0], [uvDiagonal1Min.u, uvDiagonal1Max.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0] + vectorLeftBottom[0], planeIntersection[1] + vectorLeftBottom[1], bbox.min[2]], [-0.9, -1, 0], [uvDiagonal1Max.u, uvDiagonal1Max.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0] + vectorLeftBottom[0], planeIntersection[1] + vectorLeftBottom[1], bbox.max[2]], [-1, -1, 1], [uvDiagonal1Max.u, uvDiagonal1Min.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0] + vectorRightTop[0], planeIntersection[1] + vectorRightTop[1], bbox.max[2]], [1, 1, 1], [uvDiagonal1Min.u, uvDiagonal1Min.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0] + vectorRightTop[0], planeIntersection[1] + vectorRightTop[1], bbox.min[2]], [1, 0.9, 0], [uvDiagonal1Min.u, uvDiagonal1Max.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0] + vectorLeftBottom[0], planeIntersection[1] + vectorLeftBottom[1], bbox.min[2]], [-0.9, -1, 0], [uvDiagonal1Max.u, uvDiagonal1Max.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0] + vectorLeftBottom[0], planeIntersection[1] + vectorLeftBottom[1], bbox.max[2]], [-1, -1, 1], [uvDiagonal1Max.u, uvDiagonal1Min.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0] + vectorRightTop[0], planeIntersection[1] + vectorRightTop[1], bbox.max[2]], [1, 1, 1], [uvDiagonal1Min.u, uvDiagonal1Min.v])
 
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0] + vectorRightBottom[0], planeIntersection[1] + vectorRightBottom[1], bbox.min[2]], [0.9, -1, 0], [uvDiagonal2Min.u, uvDiagonal2Max.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0] + vectorLeftTop[0], planeIntersection[1] + vectorLeftTop[1], bbox.min[2]], [-1, 0.9, 0], [uvDiagonal2Max.u, uvDiagonal2Max.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0] + vectorLeftTop[0], planeIntersection[1] + vectorLeftTop[1], bbox.max[2]], [-1, 1, 1], [uvDiagonal2Max.u, uvDiagonal2Min.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0] + vectorRightBottom[0], planeIntersection[1] + vectorRightBottom[1], bbox.max[2]], [1, -1, 1], [uvDiagonal2Min.u, uvDiagonal2Min.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0] + vectorRightBottom[0], planeIntersection[1] + vectorRightBottom[1], bbox.min[2]], [0.9, -1, 0], [uvDiagonal2Min.u, uvDiagonal2Max.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0] + vectorLeftTop[0], planeIntersection[1] + vectorLeftTop[1], bbox.min[2]], [-1, 0.9, 0], [uvDiagonal2Max.u, uvDiagonal2Max.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0] + vectorLeftTop[0], planeIntersection[1] + vectorLeftTop[1], bbox.max[2]], [-1, 1, 1], [uvDiagonal2Max.u, uvDiagonal2Min.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0] + vectorRightBottom[0], planeIntersection[1] + vectorRightBottom[1], bbox.max[2]], [1, -1, 1], [uvDiagonal2Min.u, uvDiagonal2Min.v])
 
     def appendTopPlaneVerticesForLod(self, vertices: list[list[float]], normals: list[list[float]], textureUVs: list[list[float]], entity: EntityItem, planeIntersection: list[float]):
         bbox = self.ytypItems[entity.archetypeName].boundingBox
@@ -1457,11 +1498,11 @@ class LodMapCreator:
         # planeTopMaxZ = min(bbox.max[2] - min(sizes) * 0.1, planeTopMinZ + min(sizes[0], sizes[1]) / 4)
         planeTopMaxZ = max(bbox.min[2] + min(sizes) * 0.2, planeTopMinZ - 0.15 * min(sizes[0], sizes[1]))
 
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [planeIntersection[0], planeIntersection[1], planeTopMaxZ], [0, 0, 1], [uvTopCenter.u, uvTopCenter.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [bbox.min[0], bbox.min[1], planeTopMinZ], [-1, -1, 0.1], [uvTopMin.u, uvTopMax.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [bbox.max[0], bbox.min[1], planeTopMinZ], [1, -1, 0.1], [uvTopMax.u, uvTopMax.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [bbox.max[0], bbox.max[1], planeTopMinZ], [1, 1, 0.1], [uvTopMax.u, uvTopMin.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [bbox.min[0], bbox.max[1], planeTopMinZ], [-1, 1, 0.1], [uvTopMin.u, uvTopMin.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [planeIntersection[0], planeIntersection[1], planeTopMaxZ], [0, 0, 1], [uvTopCenter.u, uvTopCenter.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [bbox.min[0], bbox.min[1], planeTopMinZ], [-1, -1, 0.1], [uvTopMin.u, uvTopMax.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [bbox.max[0], bbox.min[1], planeTopMinZ], [1, -1, 0.1], [uvTopMax.u, uvTopMax.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [bbox.max[0], bbox.max[1], planeTopMinZ], [1, 1, 0.1], [uvTopMax.u, uvTopMin.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [bbox.min[0], bbox.max[1], planeTopMinZ], [-1, 1, 0.1], [uvTopMin.u, uvTopMin.v])
 
     def appendTopPlaneVerticesForReflLod(self, vertices: list[list[float]], normals: list[list[float]], textureUVs: list[list[float]], entity: EntityItem):
         bbox = self.ytypItems[entity.archetypeName].boundingBox
@@ -1474,30 +1515,65 @@ class LodMapCreator:
 
         planeTopZ = bbox.min[2] + sizes[2] * (1 - lodCandidate.planeZ)
 
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [bbox.min[0], bbox.min[1], planeTopZ], [-1, -1, 0.1], [uvTopMin.u, uvTopMax.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [bbox.max[0], bbox.min[1], planeTopZ], [1, -1, 0.1], [uvTopMax.u, uvTopMax.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [bbox.max[0], bbox.max[1], planeTopZ], [1, 1, 0.1], [uvTopMax.u, uvTopMin.v])
-        self.appendVertexForLod(vertices, normals, textureUVs, entity, [bbox.min[0], bbox.max[1], planeTopZ], [-1, 1, 0.1], [uvTopMin.u, uvTopMin.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [bbox.min[0], bbox.min[1], planeTopZ], [-1, -1, 0.1], [uvTopMin.u, uvTopMax.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [bbox.max[0], bbox.min[1], planeTopZ], [1, -1, 0.1], [uvTopMax.u, uvTopMax.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [bbox.max[0], bbox.max[1], planeTopZ], [1, 1, 0.1], [uvTopMax.u, uvTopMin.v])
+        LodMapCreator.appendVertexForLod(vertices, normals, textureUVs, [bbox.min[0], bbox.max[1], planeTopZ], [-1, 1, 0.1], [uvTopMin.u, uvTopMin.v])
 
-    def appendVertexForLod(self, vertices: list[list[float]], normals: list[list[float]], textureUVs: list[list[float]], entity: EntityItem, vertex: list[float], normal: list[float], uv: list[float]):
-        vertices.append(entity.applyTransformationTo(vertex))
-        normals.append(Util.applyRotation(normal, entity.rotation))
+    @staticmethod
+    def appendVertexForLod(vertices: list[list[float]], normals: list[list[float]], textureUVs: list[list[float]], vertex: list[float], normal: list[float], uv: list[float]):
+        # vertex and normal are relative to the archetype, see transformVerticesForLod
+        vertices.append(vertex)
+        normals.append(normal)
         textureUVs.append(uv)
 
+    @staticmethod
+    def transformVerticesForLod(groupToVertices: dict, groupToNormals: dict, ranges: list[tuple[str, int, int, EntityItem]]):
+        """
+        Transforms the vertices and normals groupToVertices[key][start:end] (resp. groupToNormals) of each
+        (key, start, end, entity) in ranges from archetype to world coordinates of the entity, all in one vectorized pass.
+        """
+        if len(ranges) == 0:
+            return
+
+        counts = [end - start for key, start, end, entity in ranges]
+        vertices = np.array([vertex for key, start, end, entity in ranges for vertex in groupToVertices[key][start:end]], dtype=float)
+        normals = np.array([normal for key, start, end, entity in ranges for normal in groupToNormals[key][start:end]], dtype=float)
+        rotations = np.repeat(np.array([entity.rotation for key, start, end, entity in ranges], dtype=float), counts, axis=0)
+        scales = np.repeat(np.array([entity.scale for key, start, end, entity in ranges], dtype=float), counts, axis=0)
+        positions = np.repeat(np.array([entity.position for key, start, end, entity in ranges], dtype=float), counts, axis=0)
+
+        transformedVertices = Util.applyTransformations(vertices, rotations, scales, positions).tolist()
+        transformedNormals = list(Util.applyRotations(normals, rotations))
+
+        offset = 0
+        for (key, start, end, entity), count in zip(ranges, counts):
+            groupToVertices[key][start:end] = transformedVertices[offset:offset + count]
+            groupToNormals[key][start:end] = transformedNormals[offset:offset + count]
+            offset += count
+
     @staticmethod
     def convertVerticesNormalsTextureUVsAsStr(vertices: list[list[float]], normals: list[list[float]], textureUVs: list[list[float]], translation: list[float]) -> str:
-        result = ""
-        for i in range(len(vertices)):
-            translatedVertex = np.add(vertices[i], translation).tolist()
-            result += LodMapCreator.createLodModelVertexNormalTextureUVStr(translatedVertex, normals[i], textureUVs[i])
-        return result
+        # formats all vertices at once, one line per vertex: position / normal / colors / uv
+        if len(vertices) == 0:
+            return ""
+
+        translatedVertices = np.add(np.array(vertices, dtype=float), translation)
+        normalizedNormals = Util.normalizeAll(np.array(normals, dtype=float))
+        textureUVs = np.array(textureUVs, dtype=float)
+
+        rowFormat = "				" + Util.getVectorFormat(translatedVertices.shape[1]) + " / " + Util.getVectorFormat(normalizedNormals.shape[1]) + \
+            " / 255 0 255 255 / " + Util.getVectorFormat(textureUVs.shape[1]) + "\n"
+        return Util.formatRows(rowFormat, np.hstack([translatedVertices, normalizedNormals, textureUVs]))
 
     @staticmethod
     def convertVerticesTextureUVsAsStrForSlod(vertices: list[list[float]], sizes: list[list[float]], textureUVs: list[list[UV]], translation: list[float]) -> str:
-        result = ""
-        for i in range(len(vertices)):
-            translatedVertex = np.add(vertices[i], translation).tolist()
+        # formats all vertices at once, one line per corner: center / normal / colors / uv position / uv / size / scale
+        if len(vertices) == 0:
+            return ""
 
+        uvs = []
+        for i in range(len(vertices)):
             uvMin = textureUVs[i][0]
             uvMax = textureUVs[i][1]
 
@@ -1509,17 +1585,18 @@ class LodMapCreator:
                 uvMin = UV(uvMax.u, uvMin.v)
                 uvMax = UV(temp, uvMax.v)
 
-            result += LodMapCreator.createSlodModelVertexNormalTextureUVStr(translatedVertex, [-1, -0.1, 0], sizes[i], [0, 1], [uvMin.u, uvMax.v])
-            result += LodMapCreator.createSlodModelVertexNormalTextureUVStr(translatedVertex, [1, -0.1, 0], sizes[i], [1, 1], [uvMax.u, uvMax.v])
-            result += LodMapCreator.createSlodModelVertexNormalTextureUVStr(translatedVertex, [1, 0, 1], sizes[i], [1, 0], [uvMax.u, uvMin.v])
-            result += LodMapCreator.createSlodModelVertexNormalTextureUVStr(translatedVertex, [-1, 0, 1], sizes[i], [0, 0], [uvMin.u, uvMin.v])
+            uvs += [[uvMin.u, uvMax.v], [uvMax.u, uvMax.v], [uvMax.u, uvMin.v], [uvMin.u, uvMin.v]]
 
-        return result
+        # each vertex is emitted four times, once for each corner of the billboard
+        translatedVertices = np.repeat(np.add(np.array(vertices, dtype=float), translation), 4, axis=0)
+        normals = np.tile(Util.normalizeAll(np.array([[-1, -0.1, 0], [1, -0.1, 0], [1, 0, 1], [-1, 0, 1]], dtype=float)), (len(vertices), 1))
+        uvPositions = np.tile(np.array([[0, 1], [1, 1], [1, 0], [0, 0]], dtype=float), (len(vertices), 1))
+        uvs = np.array(uvs, dtype=float)
+        sizes = np.repeat(np.array(sizes, dtype=float), 4, axis=0)
 
-    @staticmethod
-    def createSlodModelVertexNormalTextureUVStr(center: list[float], normal: list[float], size: list[float], uvPosition: list[float], uv: list[float]):
-        colorsFront = "255 0 255 255 / 0 0 255 0"
-        return "				" + Util.vectorToStr(center) + " / " + Util.vectorToStr(Util.normalize(normal)) + " / " + colorsFront + " / " + Util.vectorToStr(uvPosition) + " / " + Util.vectorToStr(uv) + " / " + Util.vectorToStr(size) + " / " + Util.vectorToStr([1, 1]) + "\n"
+        rowFormat = "				" + Util.getVectorFormat(3) + " / " + Util.getVectorFormat(3) + " / 255 0 255 255 / 0 0 255 0 / " + Util.getVectorFormat(2) + \
+            " / " + Util.getVectorFormat(2) + " / " + Util.getVectorFormat(sizes.shape[1]) + " / " + Util.vectorToStr([1, 1]) + "\n"
+        return Util.formatRows(rowFormat, np.hstack([translatedVertices, normals, uvPositions, uvs, sizes]))
 
     def createLodOrSlodModel(self, nameWithoutSlodLevel: str, slodLevel: int, drawableDictionary: str, entities: list[EntityItem], parentIndex: int, numChildren: int, mapPrefix: str, reflection: bool) -> EntityItem:
         if reflection:
@@ -1565,6 +1642,8 @@ class LodMapCreator:
         groupToTextureUVs: dict = {}
         groupToIndices: dict = {}
         groupKeyToSampler: dict[str, str] = {}
+        # vertices of the billboards are created relative to the archetype and transformed for all entities at once
+        untransformedRanges = []
 
         for entity in entities:
             # Custom OBJ override path.
@@ -1600,6 +1679,7 @@ class LodMapCreator:
             distanceBottomToIntersection = sizes[1] * lodCandidate.textureOriginSide()
             planeIntersection = [bbox.min[0] + distanceLeftToIntersection, bbox.min[1] + distanceBottomToIntersection]
 
+            start = len(groupToVertices[key])
             LodMapCreator.appendFrontPlaneIndicesForLod(groupToIndices[key], len(groupToVertices[key]))
             self.appendFrontPlaneVerticesForLod(groupToVertices[key], groupToNormals[key], groupToTextureUVs[key], entity, planeIntersection)
 
@@ -1616,9 +1696,15 @@ class LodMapCreator:
                 LodMapCreator.appendTopPlaneIndicesForLod(groupToIndices[key], len(groupToVertices[key]))
                 self.appendTopPlaneVerticesForLod(groupToVertices[key], groupToNormals[key], groupToTextureUVs[key], entity, planeIntersection)
 
-        totalBoundingGeometry = BoundingGeometry()
+            untransformedRanges.append((key, start, len(groupToVertices[key]), entity))
+
+        LodMapCreator.transformVerticesForLod(groupToVertices, groupToNormals, untransformedRanges)
+
+        # the boxes of the groups are needed for the geometries below, the total is extended by their points
+        groupToBoundingGeometry = {key: BoundingGeometry(groupToVertices[key]) for key in groupToVertices}
+        totalBoundingGeometry = BoundingGeometry(approximate=self.approximateBoundingSpheres)
         for key in groupToVertices:
-            totalBoundingGeometry.extendByPoints(groupToVertices[key])
+            totalBoundingGeometry.extendByBoundingGeometry(groupToBoundingGeometry[key])
 
         totalBoundingSphere = totalBoundingGeometry.getSphere()
         center = totalBoundingSphere.center
@@ -1650,8 +1736,7 @@ class LodMapCreator:
 
             indices = groupToIndices[key]
 
-            boundingGeometry = BoundingGeometry(groupToVertices[key])
-            boundingBox = boundingGeometry.getBox().getTranslated(translation)
+            boundingBox = groupToBoundingGeometry[key].getBox().getTranslated(translation)
 
             verticesNormalsTextureUVsStr = LodMapCreator.convertVerticesNormalsTextureUVsAsStr(
                 groupToVertices[key], groupToNormals[key], groupToTextureUVs[key], translation
@@ -1793,7 +1878,7 @@ class LodMapCreator:
                 assert uvMap.topZ is not None
                 self.appendSlodTop(verticesTop[diffuseSampler], normalsTop[diffuseSampler], textureUVsTop[diffuseSampler], size2D, centerTransformed, entity.rotation, uvMap)
 
-        totalBoundingGeometry = BoundingGeometry()
+        totalBoundingGeometry = BoundingGeometry(approximate=self.approximateBoundingSpheres)
 
         for diffuseSampler in verticesTop:
             totalBoundingGeometry.extendByPoints(verticesTop[diffuseSampler])
@@ -2072,21 +2157,13 @@ class LodMapCreator:
             ytypItemsDict = self.slodYtypItems
 
         ytypName = self.getYtypName(mapPrefix, slodLevel, reflection)
-        if ytypName in ytypItemsDict:
-            ytypItems = ytypItemsDict[ytypName]
-        else:
-            ytypItems = open(os.path.join(self.getOutputDirMetadata(reflection), ytypName + ".ytyp.xml"), 'w')
-            ytypItems.write("""<?xml version="1.0" encoding="UTF-8" standalone="no"?>
-<CMapTypes>
-  <extensions/>
-  <archetypes>
-""")
-            ytypItemsDict[ytypName] = ytypItems
+        if ytypName not in ytypItemsDict:
+            ytypItemsDict[ytypName] = []
 
         item = self.replacePlaceholders(self.contentTemplateYtypItem, name, textureDictionary, drawableDictionary, totalBoundingBox, totalBoundingSphere,
             childLodDistance, itemLodDistance)
 
-        ytypItems.write(item)
+        ytypItemsDict[ytypName].append(item)
 
     def getLodDistance(self, slodLevel: int) -> int:
         if slodLevel == 0:
@@ -2146,27 +2223,21 @@ class LodMapCreator:
         return EntityItem(name, center, [1, 1, 1], [1, 0, 0, 0], itemLodDistance, childLodDistance, parentIndex, numChildren, lodLevel, flags)
 
     def fixHdOrOrphanHdLodLevelsAndSplitAccordingly(self, content: str) -> (str, Optional[str]):
-        matchEntities = re.search("<entities>\\n", content, re.M)
+        matchEntities = Patterns.ENTITIES_START.search(content)
         if matchEntities is None:
             return None, None, content, ""
 
         hdEntities = ""
         orphanHdEntities = ""
-        for match in re.finditer('([\\t ]*<Item type="CEntityDef">' +
-                                 '(?:\\s*<[^/].*>)*?' +
-                                 '\\s*<flags value=")([^"]+)("\\s*/>' +
-                                 '(?:\\s*<[^/].*>)*?' +
-                                 '\\s*<parentIndex value="([^"]+)"\\s*/>' +
-                                 '(?:\\s*<[^/].*>)*?' +
-                                 '\\s*<lodLevel>)[^<]+(</lodLevel>' +
-                                 '(?:\\s*<[^/].*>)*?' +
-                                 '\\s*<priorityLevel>)([^<]+)(</priorityLevel>' +
-                                 '(?:\\s*<[^/].*>)*?' +
-                                 '\\s*</Item>)', content):
-
-            isOrphanHd = (match.group(4) == "-1")
-
-            flags = int(match.group(2))
+        ymap = YmapParser.readYmapContent(content)
+        for i in range(len(ymap.entities)):
+            hdEntity = ymap.entities[i]
+            if hdEntity.flags is None or hdEntity.parentIndex is None or hdEntity.lodLevel is None or hdEntity.priorityLevel is None:
+                continue
+
+            isOrphanHd = (hdEntity.parentIndex == -1)
+
+            flags = hdEntity.flags
             if isOrphanHd:
                 # TODO pruefen ob korrekt
                 flags |= Flag.FLAGS_ORPHANHD_DEFAULT
@@ -2175,16 +2246,19 @@ class LodMapCreator:
                 flags |= Flag.FLAGS_HD_DEFAULT
                 flags &= ~Flag.FLAGS_HD_EXCLUDE_DEFAULT
 
-            entity = match.group(1) + str(flags) + match.group(3) + (LodLevel.ORPHAN_HD if isOrphanHd else LodLevel.HD) + match.group(5) + \
-                     (match.group(6) if isOrphanHd else PriorityLevel.REQUIRED) + match.group(7)
+            entity = ymap.getEntityContent(i)
+            entity = ParsedYmap.replaceValue(entity, "flags", str(flags))
+            entity = ParsedYmap.replaceText(entity, "lodLevel", LodLevel.ORPHAN_HD if isOrphanHd else LodLevel.HD)
+            if not isOrphanHd:
+                entity = ParsedYmap.replaceText(entity, "priorityLevel", PriorityLevel.REQUIRED)
 
             if isOrphanHd:
-                orphanHdEntities += entity + "\n"
+                orphanHdEntities += entity
             else:
-                hdEntities += entity + "\n"
+                hdEntities += entity
 
         start = matchEntities.end()
-        end = re.search("[\\t ]+</entities>[\\S\\s]*?\\Z", content, re.M).start()
+        end = Patterns.ENTITIES_END.search(content).start()
 
         orphanHdEntities = None if orphanHdEntities == "" else orphanHdEntities
         hdEntities = None if hdEntities == "" else hdEntities
@@ -2192,26 +2266,167 @@ class LodMapCreator:
         return orphanHdEntities, hdEntities, content[:start], content[end:]
 
     def resetParentIndexAndNumChildren(self, content: str) -> str:
-        result = re.sub('(<parentIndex value=")[^"]+("/>)', '\\g<1>-1\\g<2>', content)
-        result = re.sub('(<numChildren value=")[^"]+("/>)', '\\g<1>0\\g<2>', result)
+        result = Patterns.PARENT_INDEX.sub('\\g<1>-1\\g<2>', content)
+        result = Patterns.NUM_CHILDREN.sub('\\g<1>0\\g<2>', result)
         return result
 
     def determinePrefixBundles(self):
         mapNames = []
-        for filename in natsorted(os.listdir(self.inputDir)):
-            if filename.endswith(".ymap.xml") and not filename.endswith("_lod.ymap.xml") and not filename.endswith("_slod2.ymap.xml"):
+        for filename in self.inputMaps.getYmapFilenames():
+            if not filename.endswith("_lod.ymap.xml") and not filename.endswith("_slod2.ymap.xml"):
                 mapNames.append(Util.getMapnameFromFilename(filename))
 
         self.bundlePrefixes = Util.determinePrefixBundles(mapNames)
 
+    def getFilenamesWithPrefix(self, mapPrefix: str) -> list[str]:
+        return [filename for filename in self.inputMaps.getYmapFilenames() if filename.startswith(mapPrefix.lower())]
+
+    def arePrefixBundlesIndependent(self) -> bool:
+        # maps created for a bundle are named after its prefix (e.g. <prefix>_lod or <mapname>_strm), so bundles
+        # only affect each other if the prefix of one bundle starts with the (stripped) prefix of another one
+        prefixes = [mapPrefix.lower() for mapPrefix in self.bundlePrefixes]
+        for prefix in prefixes:
+            for otherPrefix in prefixes:
+                if prefix != otherPrefix and prefix.startswith(otherPrefix.rstrip("_")):
+                    return False
+
+        return True
+
     def processFiles(self):
-        for mapPrefix in self.bundlePrefixes:
-            self.processFilesWithPrefix(mapPrefix)
+        independent = self.arePrefixBundlesIndependent()
+        if self.bundleCache is not None and not independent:
+            print("\twarning: prefix bundles depend on each other, hence the results of previous runs are not reused")
+
+        if independent and (self.bundleCache is not None or (self.jobs > 1 and len(self.bundlePrefixes) > 1)):
+            self.processPrefixBundlesIndependently()
+        else:
+            # the pool is created once for all bundles so the worker processes are started (and receive this creator)
+            # only once. The models only depend on state which does not change while processing the bundles.
+            self._modelPool = Parallel.createPool(self, self.jobs) if self.jobs > 1 else None
+            try:
+                for mapPrefix in self.bundlePrefixes:
+                    lodCoords, lodDistances = self.processFilesWithPrefix(mapPrefix)
+                    self.plotHdEntitiesWithLod(lodCoords, lodDistances)
+            finally:
+                if self._modelPool is not None:
+                    self._modelPool.shutdown()
+                    self._modelPool = None
 
         self.finalizeYtypItems(False)
         if self.createReflection:
             self.finalizeYtypItems(True)
 
+    def processPrefixBundlesIndependently(self):
+        settingsHash = None if self.bundleCache is None else self.calculateSettingsHash()
+        bundleKeys = {}
+        results = {}
+        tasks = []
+        for mapPrefix in self.bundlePrefixes:
+            filenames = self.getFilenamesWithPrefix(mapPrefix)
+            if self.bundleCache is not None:
+                bundleKeys[mapPrefix] = self.calculateBundleHash(settingsHash, mapPrefix, filenames)
+                restored = self.bundleCache.restore(mapPrefix, bundleKeys[mapPrefix], self.outputDir)
+                if restored is not None:
+                    print("\treusing unchanged bundle " + mapPrefix + " from previous run")
+                    outputMaps, values = restored
+                    results[mapPrefix] = (outputMaps, values["slodYtypItems"], values["reflYtypItems"], values["foundLod"], values["foundSlod"],
+                                          values["lodCoords"], values["lodDistances"])
+                    continue
+
+            tasks.append((mapPrefix, self.inputMaps.getSubset(filenames), self.getOutputDirBundle(mapPrefix)))
+
+        # the worker method resets the creator it is called on, hence it gets a copy also when running serially
+        computedResults = Parallel.map(LodMapCreator.processFilesWithPrefixInWorker, copy.copy(self), tasks, self.jobs)
+        for (mapPrefix, inputMaps, bundleOutputDir), result in zip(tasks, computedResults):
+            if self.bundleCache is not None:
+                outputMaps, slodYtypItems, reflYtypItems, foundLod, foundSlod, lodCoords, lodDistances = result
+                self.bundleCache.store(mapPrefix, bundleKeys[mapPrefix], bundleOutputDir, outputMaps, {
+                    "slodYtypItems": slodYtypItems, "reflYtypItems": reflYtypItems, "foundLod": foundLod, "foundSlod": foundSlod,
+                    "lodCoords": lodCoords, "lodDistances": lodDistances
+                })
+            shutil.copytree(bundleOutputDir, self.outputDir, copy_function=shutil.move, dirs_exist_ok=True)
+            shutil.rmtree(bundleOutputDir)
+            results[mapPrefix] = result
+
+        if self.bundleCache is not None:
+            self.bundleCache.prune(self.bundlePrefixes)
+            self.bundleCache.writeManifest()
+
+        # merge in order of the bundles so that the result is the same as when processing them one after another
+        for mapPrefix in self.bundlePrefixes:
+            outputMaps, slodYtypItems, reflYtypItems, foundLod, foundSlod, lodCoords, lodDistances = results[mapPrefix]
+            if not self.inMemory:
+                # the maps written by the bundle were moved (or restored) from its own directory to the one of this creator
+                outputMaps.relocate(self.getOutputDirMaps(False))
+            self.outputMaps.update(outputMaps)
+            self.mergeYtypItems(self.slodYtypItems, slodYtypItems)
+            self.mergeYtypItems(self.reflYtypItems, reflYtypItems)
+            self.foundLod |= foundLod
+            self.foundSlod |= foundSlod
+            self.plotHdEntitiesWithLod(lodCoords, lodDistances)
+
+    def calculateSettingsHash(self):
+        """
+        Hash of everything besides the input maps that affects the result of a prefix bundle: the options, the source
+        code, the templates, the ytyp set as well as the candidate JSONs and the OBJ files of custom mesh overrides.
+        """
+        rootDir = self._resolve_tool_root()
+        hasher = BundleCache.createHash(self.prefix, self.clearLod, self.createReflection, self.inMemory, self.approximateBoundingSpheres,
+                                        sorted(self.lodMultipliers.items()), sorted(self.lodDistanceOverrides.items()))
+
+        BundleCache.updateHashWithDirectory(hasher, os.path.join(rootDir, "common"), ".py")
+        BundleCache.updateHashWithDirectory(hasher, os.path.dirname(__file__), ".py")
+        BundleCache.updateHashWithDirectory(hasher, os.path.join(os.path.dirname(__file__), "templates"), "")
+        BundleCache.updateHashWithDirectory(hasher, os.path.join(rootDir, "resources", "ytyp"), ".ytyp.xml")
+        for filename in ["custom_meshes.json", "custom_mesh_overrides.json", "slod_custom_candidates.json", "lod_custom_candidates.json"]:
+            BundleCache.updateHashWithFile(hasher, os.path.join(rootDir, filename))
+
+        for name, entry in sorted(self.customMeshOverrides.items()):
+            objPath = entry["obj"]
+            if not os.path.isabs(objPath):
+                objPath = os.path.join(rootDir, objPath)
+            BundleCache.updateHashWithFile(hasher, objPath, name)
+
+        return hasher.hexdigest()
+
+    def calculateBundleHash(self, settingsHash: str, mapPrefix: str, filenames: list[str]) -> str:
+        hasher = BundleCache.createHash(settingsHash, mapPrefix)
+        for filename in filenames:
+            hasher.update(filename.encode() + b"\0")
+            path = self.inputMaps.getPath(filename)
+            if path is None:
+                hasher.update(self.inputMaps.getContent(filename).encode() + b"\0")
+            else:
+                # hash of the content of the file which is only read again if it changed since the previous run
+                hasher.update(self.bundleCache.getFileHash(path).encode() + b"\1")
+
+        return hasher.hexdigest()
+
+    def processFilesWithPrefixInWorker(self, mapPrefix: str, inputMaps: MapSet, bundleOutputDir: str) -> tuple[MapSet, dict[str, list[str]], dict[str, list[str]], bool, bool, list[list[float]], list[float]]:
+        # self is a copy of this creator (in the worker process), hence it can be reset for each bundle
+        self.inputMaps = inputMaps
+        # the files of the bundle are written to a directory of its own, so that they can be stored in the cache
+        self.outputDir = bundleOutputDir
+        self.outputMaps = MapSet(None if self.inMemory else self.getOutputDirMaps(False))
+        self.createOutputDirOfBundle()
+        # the bundles already occupy the worker processes, so the models are created within this process
+        self.jobs = 1
+        self.slodYtypItems = {}
+        self.reflYtypItems = {}
+        self.foundLod = False
+        self.foundSlod = False
+
+        lodCoords, lodDistances = self.processFilesWithPrefix(mapPrefix)
+
+        return self.outputMaps, self.slodYtypItems, self.reflYtypItems, self.foundLod, self.foundSlod, lodCoords, lodDistances
+
+    @staticmethod
+    def mergeYtypItems(ytypItemsDict: dict[str, list[str]], otherYtypItemsDict: dict[str, list[str]]):
+        for ytypName, ytypItems in otherYtypItemsDict.items():
+            if ytypName not in ytypItemsDict:
+                ytypItemsDict[ytypName] = []
+            ytypItemsDict[ytypName] += ytypItems
+
     def finalizeYtypItems(self, reflection: bool):
         if reflection:
             ytypItemsDict = self.reflYtypItems
@@ -2219,67 +2434,76 @@ class LodMapCreator:
             ytypItemsDict = self.slodYtypItems
 
         for ytypName, ytypItems in ytypItemsDict.items():
-            self.finalizeSpecificYtypItems(ytypItems, ytypName)
+            self.finalizeSpecificYtypItems(ytypItems, ytypName, reflection)
 
-    def finalizeSpecificYtypItems(self, ytypItems: IO, ytypName: str):
-        ytypItems.write("""  </archetypes>
+    def finalizeSpecificYtypItems(self, ytypItems: list[str], ytypName: str, reflection: bool):
+        file = open(os.path.join(self.getOutputDirMetadata(reflection), ytypName + ".ytyp.xml"), 'w')
+        file.write("""<?xml version="1.0" encoding="UTF-8" standalone="no"?>
+<CMapTypes>
+  <extensions/>
+  <archetypes>
+""")
+        file.writelines(ytypItems)
+        file.write("""  </archetypes>
   <name>""" + ytypName + """</name>
   <dependencies/>
   <compositeEntityTypes/>
 </CMapTypes>""")
 
-        ytypItems.close()
+        file.close()
 
-    def processFilesWithPrefix(self, mapPrefix: str):
+    def plotHdEntitiesWithLod(self, lodCoords: list[list[float]], lodDistances: list[float]):
+        # Visualization: show where HD entities with LOD are located for this prefix.
+        if not lodCoords:
+            return
+
+        ax = PlotManager.get_axes("lod_map", "LOD map / reflection")
+        pyplot.sca(ax)
+        PlotManager.setup_world_background(ax)
+
+        coords_np = np.array(lodCoords)[:, :2]
+        distances_np = np.array(lodDistances)
+        sc = pyplot.scatter(coords_np[:, 0], coords_np[:, 1], c=distances_np, s=10, edgecolors='none')
+        PlotManager.autoscale_to_points(ax, coords_np)
+        # Attach a per-tab colorbar that is only visible on the LOD map tab
+        PlotManager.set_colorbar("lod_map", sc, "LOD distance")
+
+    def processFilesWithPrefix(self, mapPrefix: str) -> tuple[list[list[float]], list[float]]:
         hdEntitiesWithLod = []
         lodCoords = []
         lodDistances = []
-        for filename in natsorted(os.listdir(self.inputDir)):
-            if not filename.endswith(".ymap.xml") or not filename.startswith(mapPrefix.lower()):
+        for filename in self.inputMaps.getYmapFilenames():
+            if not filename.startswith(mapPrefix.lower()):
                 continue
 
             mapName = Util.getMapnameFromFilename(filename)
 
-            if os.path.exists(os.path.join(self.getOutputDirMaps(False), Util.getFilenameFromMapname(mapName))):
+            if self.outputMaps.containsYmap(Util.getFilenameFromMapname(mapName)):
                 print("\twarning: skipping " + filename + " since such a map was created by this script")
                 continue
 
             print("\tprocessing " + filename)
 
-            fileNoLod = open(os.path.join(self.inputDir, filename), 'r')
-            contentNoLod = fileNoLod.read()
-            fileNoLod.close()
+            contentNoLod = self.inputMaps.getContent(filename)
 
             contentNoLod = self.resetParentIndexAndNumChildren(contentNoLod)
             contentNoLod = Ymap.replaceName(contentNoLod, mapName)
 
-            fileNoLod = open(os.path.join(self.getOutputDirMaps(False), filename), 'w')
-            fileNoLod.write(contentNoLod)
-            fileNoLod.close()
-
-            pattern = re.compile('[\t ]*<Item type="CEntityDef">' +
-                                 '\\s*<archetypeName>([^<]+)</archetypeName>' +
-                                 '(?:\\s*<[^/].*>)*?' +
-                                 '\\s*<position x="([^"]+)" y="([^"]+)" z="([^"]+)"\\s*/>' +
-                                 '\\s*<rotation x="([^"]+)" y="([^"]+)" z="([^"]+)" w="([^"]+)"\\s*/>' +
-                                 '\\s*<scaleXY value="([^"]+)"\\s*/>' +
-                                 '\\s*<scaleZ value="([^"]+)"\\s*/>' +
-                                 '(?:\\s*<[^/].*>)*?' +
-                                 '\\s*<lodDist value="([^"]+)"\\s*/>' +
-                                 '(?:\\s*<[^/].*>)*?' +
-                                 '\\s*</Item>[\r\n]+')
-
-            for matchobj in re.finditer(pattern, contentNoLod):
-                archetypeName = matchobj.group(1).lower()
+            self.outputMaps.setContent(filename, contentNoLod)
+
+            ymap = YmapParser.readYmapContent(contentNoLod)
+
+            for hdEntity in ymap.entities:
+                archetypeName = hdEntity.archetypeName.lower()
                 if archetypeName not in self.ytypItems or \
                         (self.USE_SLOD_TEMPLATE_FOR_LEVEL_AND_ABOVE > 0 and archetypeName not in self.lodCandidates) or \
                         (self.USE_SLOD_TEMPLATE_FOR_LEVEL_AND_ABOVE <= 0 and archetypeName not in self.slodCandidates):
                     continue
 
                 archetype = self.ytypItems[archetypeName]
-                position = [float(matchobj.group(2)), float(matchobj.group(3)), float(matchobj.group(4))]
-                rotation = [float(matchobj.group(8)), -float(matchobj.group(5)), -float(matchobj.group(6)), -float(matchobj.group(7))]  # order is w, -x, -y, -z
-                scale = [float(matchobj.group(9)), float(matchobj.group(9)), float(matchobj.group(10))]
+                position = hdEntity.position
+                rotation = hdEntity.rotation  # order is w, -x, -y, -z
+                scale = hdEntity.scale
                 lodDistance = Util.calculateLodDistance(archetype.boundingBox, archetype.boundingSphere, scale, True)
                 # Apply an absolute category-specific lodDist override (if provided).
                 lodOverride = self._get_lod_distance_override(archetypeName)
@@ -2298,20 +2522,6 @@ class LodMapCreator:
 
         hierarchy = self.calculateLodHierarchy(lodCoords, lodDistances)
 
-        # Visualization: show where HD entities with LOD are located for this prefix.
-        if lodCoords:
-            ax = PlotManager.get_axes("lod_map", "LOD map / reflection")
-            pyplot.sca(ax)
-            PlotManager.setup_world_background(ax)
-
-            coords_np = np.array(lodCoords)[:, :2]
-            distances_np = np.array(lodDistances)
-            sc = pyplot.scatter(coords_np[:, 0], coords_np[:, 1], c=distances_np, s=10, edgecolors='none')
-            PlotManager.autoscale_to_points(ax, coords_np)
-            # Attach a per-tab colorbar that is only visible on the LOD map tab
-            PlotManager.set_colorbar("lod_map", sc, "LOD distance")
-
-
         minLodDistances = [
             0,
             LodMapCreator.MIN_HD_LOD_DISTANCE_FOR_SLOD1,
@@ -2380,34 +2590,28 @@ class LodMapCreator:
 
         self.adaptHdMapsForPrefix(mapPrefix, hdEntitiesWithLod, hierarchyMappingFromPreviousLevel[0], numSlod1Entities)
 
+        return lodCoords, lodDistances
+
     def createReflLodMapsModels(self, entitiesForReflLodModels: dict[int, list[EntityItem]], prefix: str):
         reflDrawableDictionary = prefix + "_refl_children"
-        drawableDictionariesReflEntities = [[]]
 
-        index = 0
-        for key in sorted(entitiesForReflLodModels):
+        models = []
+        for index, key in enumerate(sorted(entitiesForReflLodModels)):
             reflName = prefix + "_refl_" + str(index)
-
-            if len(drawableDictionariesReflEntities[-1]) >= LodMapCreator.MAX_NUM_CHILDREN_IN_DRAWABLE_DICTIONARY:
-                drawableDictionariesReflEntities.append([])
-
-            drawableDictionariesReflEntities[-1].append(self.createLodOrSlodModel(
+            models.append((
                 reflName, 1,
-                reflDrawableDictionary + "_" + str(len(drawableDictionariesReflEntities) - 1),
+                reflDrawableDictionary + "_" + str(index // LodMapCreator.MAX_NUM_CHILDREN_IN_DRAWABLE_DICTIONARY),
                 entitiesForReflLodModels[key],
                 -1, 0,
                 prefix, True
             ))
 
-            index += 1
+        reflEntities = self.createLodOrSlodModels(models)
+        drawableDictionariesReflEntities = LodMapCreator.splitIntoDrawableDictionaries(reflEntities)
 
         for reflEntitiesIndex in range(len(drawableDictionariesReflEntities)):
             self.createDrawableDictionary(reflDrawableDictionary + "_" + str(reflEntitiesIndex), drawableDictionariesReflEntities[reflEntitiesIndex], True)
 
-        reflEntities = []
-        for drawableDictionaryReflEntities in drawableDictionariesReflEntities:
-            reflEntities += drawableDictionaryReflEntities
-
         if len(reflEntities) > 0:
             mapName = prefix + "_refl"
             self.writeLodOrSlodMap(mapName, None, ContentFlag.SLOD | ContentFlag.SLOD2, reflEntities, True)
@@ -2419,17 +2623,13 @@ class LodMapCreator:
         slod3DrawableDictionary = prefix + "_slod3_children"
         slod4DrawableDictionary = prefix + "_slod4_children"
 
-        lodEntities = [[]]
-        slod1Entities = [[]]
-        slod2Entities = []
-        slod3Entities = []
-        slod4Entities = []
+        # the parent indices only depend on the hierarchy, hence all models are determined first and then created at once
+        models = []
 
-        index = 0
         slod4KeyToIndex = {}
-        for key in sorted(entitiesForLodModels[4]):
+        for index, key in enumerate(sorted(entitiesForLodModels[4])):
             slodName = prefix + "_" + str(index)
-            slod4Entities.append(self.createLodOrSlodModel(
+            models.append((
                 slodName, 4,
                 slod4DrawableDictionary,
                 entitiesForLodModels[4][key],
@@ -2437,14 +2637,12 @@ class LodMapCreator:
                 prefix, False
             ))
             slod4KeyToIndex[key] = index
-            index += 1
 
-        index = 0
         slod3KeyToIndex = {}
-        for key in sorted(entitiesForLodModels[3]):
+        for index, key in enumerate(sorted(entitiesForLodModels[3])):
             slodName = prefix + "_" + str(index)
             parentIndex = self.getParentIndexForKey(key, hierarchyMappingFromPreviousLevel[4], slod4KeyToIndex, 0)
-            slod3Entities.append(self.createLodOrSlodModel(
+            models.append((
                 slodName, 3,
                 slod3DrawableDictionary,
                 entitiesForLodModels[3][key],
@@ -2452,14 +2650,12 @@ class LodMapCreator:
                 prefix, False
             ))
             slod3KeyToIndex[key] = index
-            index += 1
 
-        index = 0
         slod2KeyToIndex = {}
-        for key in sorted(entitiesForLodModels[2]):
+        for index, key in enumerate(sorted(entitiesForLodModels[2])):
             slodName = prefix + "_" + str(index)
             parentIndex = self.getParentIndexForKey(key, hierarchyMappingFromPreviousLevel[3], slod3KeyToIndex, 0)
-            slod2Entities.append(self.createLodOrSlodModel(
+            models.append((
                 slodName, 2,
                 slod2DrawableDictionary,
                 entitiesForLodModels[2][key],
@@ -2467,44 +2663,44 @@ class LodMapCreator:
                 prefix, False
             ))
             slod2KeyToIndex[key] = index
-            index += 1
 
-        index = 0
         slod1KeyToIndex = {}
-        parentIndexOffset = len(slod3Entities)
-        for key in sorted(entitiesForLodModels[1]):
+        parentIndexOffset = len(slod3KeyToIndex)
+        for index, key in enumerate(sorted(entitiesForLodModels[1])):
             slodName = prefix + "_" + str(index)
             parentIndex = self.getParentIndexForKey(key, hierarchyMappingFromPreviousLevel[2], slod2KeyToIndex, parentIndexOffset)
-
-            if len(slod1Entities[-1]) >= LodMapCreator.MAX_NUM_CHILDREN_IN_DRAWABLE_DICTIONARY:
-                slod1Entities.append([])
-
-            slod1Entities[-1].append(self.createLodOrSlodModel(
+            models.append((
                 slodName, 1,
-                slod1DrawableDictionary + "_" + str(len(slod1Entities) - 1),
+                slod1DrawableDictionary + "_" + str(index // LodMapCreator.MAX_NUM_CHILDREN_IN_DRAWABLE_DICTIONARY),
                 entitiesForLodModels[1][key],
                 parentIndex, lodNumChildren[1][key],
                 prefix, False
             ))
-
             slod1KeyToIndex[key] = index
-            index += 1
 
-        for key in sorted(entitiesForLodModels[0]):
+        for index, key in enumerate(sorted(entitiesForLodModels[0])):
             lodName = prefix + "_" + str(key)
             parentIndex = self.getParentIndexForKey(key, hierarchyMappingFromPreviousLevel[1], slod1KeyToIndex, 0)
-
-            if len(lodEntities[-1]) >= LodMapCreator.MAX_NUM_CHILDREN_IN_DRAWABLE_DICTIONARY:
-                lodEntities.append([])
-
-            lodEntities[-1].append(self.createLodOrSlodModel(
+            models.append((
                 lodName, 0,
-                lodDrawableDictionary + "_" + str(len(lodEntities) - 1),
+                lodDrawableDictionary + "_" + str(index // LodMapCreator.MAX_NUM_CHILDREN_IN_DRAWABLE_DICTIONARY),
                 entitiesForLodModels[0][key],
                 parentIndex, lodNumChildren[0][key],
                 prefix, False
             ))
 
+        entities = self.createLodOrSlodModels(models)
+
+        end = len(slod4KeyToIndex)
+        slod4Entities = entities[:end]
+        start, end = end, end + len(slod3KeyToIndex)
+        slod3Entities = entities[start:end]
+        start, end = end, end + len(slod2KeyToIndex)
+        slod2Entities = entities[start:end]
+        start, end = end, end + len(slod1KeyToIndex)
+        slod1Entities = LodMapCreator.splitIntoDrawableDictionaries(entities[start:end])
+        lodEntities = LodMapCreator.splitIntoDrawableDictionaries(entities[end:])
+
         for lodEntitiesIndex in range(len(lodEntities)):
             self.createDrawableDictionary(lodDrawableDictionary + "_" + str(lodEntitiesIndex), lodEntities[lodEntitiesIndex], False)
 
@@ -2542,6 +2738,44 @@ class LodMapCreator:
 
         return numSlod1Entities
 
+    def createLodOrSlodModels(self, models: list[tuple]) -> list[EntityItem]:
+        """
+        Creates the models for the given arguments of createLodOrSlodModel and returns their entities in the same order.
+        The models are independent of each other, so with jobs > 1 they are created in the worker processes of the model
+        pool which write the .mesh and .odr files and return the entity and ytyp item of each model.
+        """
+        if self.jobs <= 1 or len(models) <= 1:
+            return [self.createLodOrSlodModel(*model) for model in models]
+
+        entities = []
+        for entity, slodYtypItems, reflYtypItems, foundLod, foundSlod in Parallel.map(LodMapCreator.createLodOrSlodModelInWorker, self, models, self.jobs, self._modelPool):
+            entities.append(entity)
+            self.mergeYtypItems(self.slodYtypItems, slodYtypItems)
+            self.mergeYtypItems(self.reflYtypItems, reflYtypItems)
+            self.foundLod |= foundLod
+            self.foundSlod |= foundSlod
+
+        return entities
+
+    def createLodOrSlodModelInWorker(self, nameWithoutSlodLevel: str, slodLevel: int, drawableDictionary: str, entities: list[EntityItem], parentIndex: int, numChildren: int, mapPrefix: str,
+            reflection: bool) -> tuple[EntityItem, dict[str, list[str]], dict[str, list[str]], bool, bool]:
+        # self is the copy of this creator in the worker process, hence it can be reset for each model
+        self.slodYtypItems = {}
+        self.reflYtypItems = {}
+        self.foundLod = False
+        self.foundSlod = False
+
+        entity = self.createLodOrSlodModel(nameWithoutSlodLevel, slodLevel, drawableDictionary, entities, parentIndex, numChildren, mapPrefix, reflection)
+
+        return entity, self.slodYtypItems, self.reflYtypItems, self.foundLod, self.foundSlod
+
+    @staticmethod
+    def splitIntoDrawableDictionaries(entities: list[EntityItem]) -> list[list[EntityItem]]:
+        if len(entities) == 0:
+            return [[]]
+
+        return [entities[i:i + LodMapCreator.MAX_NUM_CHILDREN_IN_DRAWABLE_DICTIONARY] for i in range(0, len(entities), LodMapCreator.MAX_NUM_CHILDREN_IN_DRAWABLE_DICTIONARY)]
+
     def getParentIndexForKey(self, key: int, keyToParentKey: dict[int, int], parentKeyToIndex: dict[int, int], parentIndexOffset: int):
         if key not in keyToParentKey:
             return -1
@@ -2550,53 +2784,38 @@ class LodMapCreator:
 
     def adaptHdMapsForPrefix(self, mapPrefix: str, hdEntities: list[EntityItem], hdToLod: dict[int, int], offsetParentIndex: int):
         mutableIndex = [0]
-        for filename in natsorted(os.listdir(self.inputDir)):
-            if not filename.endswith(".ymap.xml") or not filename.startswith(mapPrefix.lower()):
+        for filename in self.inputMaps.getYmapFilenames():
+            if not filename.startswith(mapPrefix.lower()):
                 continue
 
-            pathNoLod = os.path.join(self.getOutputDirMaps(False), filename)
-            fileNoLod = open(pathNoLod, 'r')
-            contentNoLod = fileNoLod.read()
-            fileNoLod.close()
-            os.remove(pathNoLod)
+            contentNoLod = self.outputMaps.getContent(filename)
+            self.outputMaps.removeYmap(filename)
 
             # fix parentIndex in hd map to match lod map
-            contentNoLod = re.sub('(\\s*<Item type="CEntityDef">' +
-                                  '\\s*<archetypeName>([^<]+)</archetypeName>' +
-                                  '(?:\\s*<[^/].*>)*?' +
-                                  '\\s*<parentIndex value=")[^"]+("\\s*/>' +
-                                  '(?:\\s*<[^/].*>)*?' +
-                                  '\\s*<lodDist value=")([^"]+)("\\s*/>' +
-                                  '(?:\\s*<[^/].*>)*?' +
-                                  '\\s*</Item>)', lambda match: self.replParentIndexAndLodDistance(match, hdEntities, mutableIndex, hdToLod, offsetParentIndex), contentNoLod, flags=re.M)
+            ymap = YmapParser.readYmapContent(contentNoLod)
+            contentNoLod = ymap.replaceEntities(lambda i, entityContent: self.replParentIndexAndLodDistance(ymap.entities[i], entityContent, hdEntities, mutableIndex, hdToLod, offsetParentIndex))
 
             orphanHdEntities, hdEntitiesContent, contentBeforeEntities, contentAfterEntities = self.fixHdOrOrphanHdLodLevelsAndSplitAccordingly(contentNoLod)
 
             if hdEntitiesContent is None and orphanHdEntities is None:
                 contentNoLod = Ymap.replaceParent(contentNoLod, None)
-                fileHd = open(pathNoLod, 'w')
-                fileHd.write(contentNoLod)
-                fileHd.close()
+                self.outputMaps.setContent(filename, contentNoLod)
                 return
 
             if hdEntitiesContent is not None:
                 mapNameLod = mapPrefix.lower().rstrip("_") + "_lod"
                 contentHd = contentBeforeEntities + hdEntitiesContent + contentAfterEntities
                 contentHd = Ymap.replaceParent(contentHd, mapNameLod)
-                fileHd = open(pathNoLod, 'w')
-                fileHd.write(contentHd)
-                fileHd.close()
+                self.outputMaps.setContent(filename, contentHd)
 
             if orphanHdEntities is not None:
                 mapName = Util.getMapnameFromFilename(filename)
-                mapNameStrm = Util.findAvailableMapName(self.getOutputDirMaps(False), mapName, "_strm", not self.clearLod)
+                mapNameStrm = self.outputMaps.findAvailableMapName(mapName, "_strm", not self.clearLod)
 
                 if hdEntitiesContent is None:
                     contentHd = contentBeforeEntities + orphanHdEntities + contentAfterEntities
                     contentHd = Ymap.replaceParent(contentHd, None)
-                    fileHd = open(os.path.join(self.getOutputDirMaps(False), Util.getFilenameFromMapname(mapNameStrm)), 'w')
-                    fileHd.write(contentHd)
-                    fileHd.close()
+                    self.outputMaps.setContent(Util.getFilenameFromMapname(mapNameStrm), contentHd)
                 else:
                     self.writeStrmMap(mapNameStrm, orphanHdEntities)
 
@@ -2608,36 +2827,40 @@ class LodMapCreator:
         self.writeMap(mapName, None, 0, ContentFlag.HD, contentEntities, False)
 
     def writeMap(self, mapName: str, parentMap: Optional[str], flags: int, contentFlags: int, contentEntities: str, reflection: bool):
-        content = self.contentTemplateSlod2Map \
-            .replace("${NAME}", mapName) \
-            .replace("${FLAGS}", str(flags)) \
-            .replace("${CONTENT_FLAGS}", str(contentFlags)) \
-            .replace("${TIMESTAMP}", Util.getNowInIsoFormat()) \
-            .replace("${ENTITIES}\n", contentEntities)
+        content = self.contentTemplateSlod2Map.render({
+            "NAME": mapName,
+            "FLAGS": str(flags),
+            "CONTENT_FLAGS": str(contentFlags),
+            "TIMESTAMP": Util.getNowInIsoFormat(),
+            "ENTITIES": contentEntities
+        })
 
         content = Ymap.replaceParent(content, parentMap)
 
-        mapsDir = self.getOutputDirMaps(reflection)
+        if not reflection:
+            self.outputMaps.setContent(Util.getFilenameFromMapname(mapName), content)
+            return
 
-        fileMap = open(os.path.join(mapsDir, Util.getFilenameFromMapname(mapName)), 'w')
+        fileMap = open(os.path.join(self.getOutputDirMaps(True), Util.getFilenameFromMapname(mapName)), 'w')
         fileMap.write(content)
         fileMap.close()
 
     def createEntitiesContent(self, entities: list[EntityItem]):
-        contentEntities = ""
+        parts = []
         for entity in entities:
-            contentEntities += self.contentTemplateEntitySlod \
-                .replace("${POSITION.X}", Util.floatToStr(entity.position[0])) \
-                .replace("${POSITION.Y}", Util.floatToStr(entity.position[1])) \
-                .replace("${POSITION.Z}", Util.floatToStr(entity.position[2])) \
-                .replace("${NAME}", entity.archetypeName) \
-                .replace("${NUM_CHILDREN}", str(entity.numChildren)) \
-                .replace("${PARENT_INDEX}", str(entity.parentIndex)) \
-                .replace("${LOD_LEVEL}", entity.lodLevel) \
-                .replace("${CHILD.LOD_DISTANCE}", Util.floatToStr(entity.childLodDist)) \
-                .replace("${LOD_DISTANCE}", Util.floatToStr(entity.lodDistance)) \
-                .replace("${FLAGS}", str(entity.flags))
-        return contentEntities
+            self.contentTemplateEntitySlod.renderTo(parts, {
+                "POSITION.X": Util.floatToStr(entity.position[0]),
+                "POSITION.Y": Util.floatToStr(entity.position[1]),
+                "POSITION.Z": Util.floatToStr(entity.position[2]),
+                "NAME": entity.archetypeName,
+                "NUM_CHILDREN": str(entity.numChildren),
+                "PARENT_INDEX": str(entity.parentIndex),
+                "LOD_LEVEL": entity.lodLevel,
+                "CHILD.LOD_DISTANCE": Util.floatToStr(entity.childLodDist),
+                "LOD_DISTANCE": Util.floatToStr(entity.lodDistance),
+                "FLAGS": str(entity.flags)
+            })
+        return "".join(parts)
 
     def calculateLodHierarchy(self, points: list[list[float]], lodDistances: list[float]) -> list[list[int]]:
         if len(points) == 0:
@@ -2700,35 +2923,31 @@ class LodMapCreator:
 
     def copyOthers(self):
         # copy other files
-        Util.copyFiles(self.inputDir, self.getOutputDirMaps(False),
-            lambda filename: not filename.endswith(".ymap.xml") or not filename.startswith(tuple(each.lower() for each in self.bundlePrefixes)))
+        for filename in self.inputMaps.getYmapFilenames():
+            if not filename.startswith(tuple(each.lower() for each in self.bundlePrefixes)) and not self.outputMaps.containsYmap(filename):
+                self.outputMaps.setContent(filename, self.inputMaps.getContent(filename))
+        self.outputMaps.copyOthers(self.inputMaps)
 
     # adapt extents and set current datetime
     def fixMapExtents(self, reflection: bool):
         print("\tfixing map extents")
 
-        mapsDir = self.getOutputDirMaps(reflection)
-
-        for filename in natsorted(os.listdir(mapsDir)):
-            if not filename.endswith(".ymap.xml"):
-                continue
-
-            file = open(os.path.join(mapsDir, filename), 'r')
-            content = file.read()
-            file.close()
-
-            content = Ymap.fixMapExtents(content, self.ytypItems)
+        if reflection:
+            maps = MapSet.readDirectory(self.getOutputDirMaps(True), True)
+        else:
+            maps = self.outputMaps
 
-            file = open(os.path.join(mapsDir, filename), 'w')
-            file.write(content)
-            file.close()
+        Ymap.fixMapExtentsOfAll(maps, self.ytypItems, self.jobs)
 
     def createManifest(self, reflection: bool) -> None:
         print("\tcreating manifest")
         mapsDir = self.getOutputDirMaps(reflection)
         metadataDir = self.getOutputDirMetadata(reflection)
         manifest = Manifest(self.ytypItems, mapsDir, metadataDir)
-        manifest.parseYmaps()
+        if reflection:
+            manifest.parseYmaps()
+        else:
+            manifest.parseMapSet(self.outputMaps)
         manifest.writeManifest()
 
     def addLodAndSlodModelsToYtypDict(self, reflection: bool) -> None:
@@ -1,9 +1,10 @@
 import os
-import re
 
 from natsort import natsorted
 
 from common.Util import Util
+from common.ymap.MapSet import MapSet
+from common.ymap.Patterns import Patterns
 from common.ytyp.YtypItem import YtypItem
 
 
@@ -30,10 +31,14 @@ class Manifest:
 
             self.parseYmapContent(Util.getMapnameFromFilename(filename), content)
 
+    def parseMapSet(self, mapSet: MapSet):
+        for filename in mapSet.getYmapFilenames():
+            self.parseYmapContent(Util.getMapnameFromFilename(filename), mapSet.getContent(filename))
+
     def parseYmapContent(self, mapName: str, content: str):
         ytyps = set()
 
-        for match in re.finditer('<Item type="CEntityDef">\\s*<archetypeName>([^<]+)</archetypeName>', content):
+        for match in Patterns.ENTITY_ARCHETYPE_NAME.finditer(content):
             archetypeName = match.group(1).lower()
 
             if archetypeName not in self.ytypItems:
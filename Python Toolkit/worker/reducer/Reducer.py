@@ -1,12 +1,13 @@
 import math
-from re import Match
-from natsort import natsorted
 from typing import Optional
 import numpy as np
 import os
-import re
 
 from common.Util import Util
+from common.ymap.EntityIndex import EntityIndex
+from common.ymap.EntityItem import EntityItem
+from common.ymap.MapSet import MapSet
+from common.ymap.ParsedYmap import ParsedYmap
 from common.ymap.Ymap import Ymap
 from common.ytyp.YtypItem import YtypItem
 from common.ytyp.YtypParser import YtypParser
@@ -15,26 +16,22 @@ from common.ytyp.YtypParser import YtypParser
 class Reducer:
     inputDir: str
     outputDir: str
+    inputMaps: Optional[MapSet]
+    outputMaps: MapSet
+    inMemory: bool
 
     defaultReducerResolution = 30.0
 
+    BACKEND_AGGLOMERATIVE = "agglomerative"
+    BACKEND_KDTREE = "kdtree"
+    BACKENDS = (BACKEND_AGGLOMERATIVE, BACKEND_KDTREE)
+
     defaultYmapPart: str
     ytypItems: dict[str, YtypItem]
     prefix: str
     reducerResolution: float
     adaptScaling: bool
-
-    _PATTERN = re.compile(
-        '([\t ]*<Item type="CEntityDef">' +
-        '\\s*<archetypeName>([^<]+)</archetypeName>' +
-        '(?:\\s*<[^/].*>)*?' +
-        '\\s*<position x="([^"]+)" y="([^"]+)" z="([^"]+)"\\s*/>' +
-        '(?:\\s*<[^/].*>)*?' +
-        '\\s*<scaleXY value=")([^"]+)("/>' +
-        '\\s*<scaleZ value=")([^"]+)("/>' +
-        '(?:\\s*<[^/].*>)*?' +
-        '\\s*</Item>[\r\n]+)'
-    )
+    backend: str
 
     groups = [
         ("prop_tree_pine_", "prop_tree_cedar_0", "prop_w_r_cedar_", "test_tree_cedar_trunk_001", "test_tree_forest_trunk_01", "prop_s_pine_dead_01", "prop_tree_fallen_pine_01", "prop_tree_birch_01", "prop_tree_birch_02", "prop_tree_birch_04", "prop_tree_jacada_", "prop_tree_lficus_", "prop_tree_oak_01", "prop_tree_olive_01", "prop_tree_eng_oak_01", "prop_tree_eucalip_01", "prop_bush_lrg_04"),
@@ -47,36 +44,57 @@ class Reducer:
         ("")  # everything else
     ]
 
-    def __init__(self, inputDir: str, outputDir: str, prefix: str, reducerResolution: Optional[float], adaptScaling: bool):
+    def __init__(self, inputDir: str, outputDir: str, prefix: str, reducerResolution: Optional[float], adaptScaling: bool,
+                 inputMaps: Optional[MapSet] = None, inMemory: bool = False, backend: Optional[str] = None):
         self.inputDir = inputDir
         self.outputDir = outputDir
+        self.inputMaps = inputMaps
+        self.inMemory = inMemory
+        self.outputMaps = MapSet(None if inMemory else outputDir)
         self.prefix = prefix
         self.reducerResolution = reducerResolution if reducerResolution else self.defaultReducerResolution
         self.adaptScaling = adaptScaling
+        self.backend = backend if backend else Reducer.BACKEND_AGGLOMERATIVE
 
     def run(self):
         print("running reducer...")
         self.readYtyps()
         self.createOutputDir()
+        self.readInputMaps()
         self.processFiles()
         self.copyOthers()
+        self.writeOutputMaps()
         print("reducer DONE")
 
     def readYtyps(self):
-        self.ytypItems = YtypParser.readYtypDirectory(os.path.join(os.path.dirname(__file__), "../..", "resources", "ytyp"))
+        self.ytypItems = YtypParser.readYtypDirectoryCached(os.path.join(os.path.dirname(__file__), "../..", "resources", "ytyp"))
 
     def createOutputDir(self):
+        if self.inMemory:
+            return
+
         if os.path.exists(self.outputDir):
             raise ValueError("Output dir " + self.outputDir + " must not exist")
 
         os.makedirs(self.outputDir)
 
+    def readInputMaps(self):
+        if self.inputMaps is None:
+            self.inputMaps = MapSet.readDirectory(self.inputDir)
+
+    def writeOutputMaps(self):
+        if not self.inMemory:
+            self.outputMaps.writeDirectory(self.outputDir)
+
     def calculatePointsToKeep(self, points: list[list[float]]) -> list[int]:
         numPoints = len(points)
         if numPoints == 0:
             return []
 
-        clustering, unused, unused = Util.performClusteringMaxFurthestDistance(points, self.reducerResolution)
+        if self.backend == Reducer.BACKEND_KDTREE:
+            clustering = Util.performGreedyClusteringMaxFurthestDistance(points, self.reducerResolution)
+        else:
+            clustering, unused, unused = Util.performClusteringMaxFurthestDistance(points, self.reducerResolution)
 
         clusterSizes = np.bincount(clustering)
 
@@ -128,68 +146,64 @@ class Reducer:
         for group in range(numGroups):
             coords.append([])
 
-        countMaps = 0
-        for filename in natsorted(os.listdir(self.inputDir)):
-            if not filename.endswith(".ymap.xml"):
-                continue
-
-            countMaps += 1
+        # first pass: collect coordinates and remember span and group of each entity so that the second pass only
+        # needs to slice the map content (read again unless held in memory) instead of parsing it again
+        ymaps: dict[str, EntityIndex] = {}
+        # entities of which the scaling is adapted in the second pass, by filename and entity index
+        entitiesToAdapt: dict[str, dict[int, EntityItem]] = {}
+        for filename in self.inputMaps.getYmapFilenames():
             print("\treading " + filename)
 
-            f = open(os.path.join(self.inputDir, filename), 'r')
-            content = f.read()
-            f.close()
+            ymap = self.inputMaps.getYmap(filename, False)
 
-            for matchobj in re.finditer(Reducer._PATTERN, content):
-                archetypeName = matchobj.group(2)
-                scaling = [float(matchobj.group(6)), float(matchobj.group(6)), float(matchobj.group(8))]
-                group = self.determineGroup(archetypeName, scaling)
+            groups = []
+            entitiesToAdapt[filename] = {}
+            for i, entity in enumerate(ymap.entities):
+                group = self.determineGroup(entity.archetypeName, entity.scale)
+                groups.append(group)
                 if group < 0:
                     continue
 
-                coords[group].append([float(matchobj.group(3)), float(matchobj.group(4)), float(matchobj.group(5))])
+                coords[group].append(entity.position)
+                if self.adaptScaling and group == 0:
+                    entitiesToAdapt[filename][i] = entity
+
+            ymaps[filename] = ymap.createIndex(groups, self.inputMaps.getPath(filename))
 
         if not coords:
             return
 
-        print("\treducing of " + str(countMaps) + " ymap files and in total " + str(len(coords)) + " entities")
+        print("\treducing of " + str(len(ymaps)) + " ymap files and in total " + str(len(coords)) + " entities")
 
         pointsToKeep = []
         for group in range(numGroups):
             pointsToKeep.append(self.calculatePointsToKeep(coords[group]))
 
         counter = [0] * numGroups
-        for filename in natsorted(os.listdir(self.inputDir)):
-            if not filename.endswith(".ymap.xml"):
-                continue
-
-            f = open(os.path.join(self.inputDir, filename), 'r')
-            content = f.read()
-            f.close()
-
-            content_new = re.sub(Reducer._PATTERN, lambda match: self.repl(match, pointsToKeep, counter), content)
+        for filename, index in ymaps.items():
+            groups = index.tags.tolist()
+            content_new = index.replaceEntities(
+                lambda i, entityContent: self.repl(groups[i], entitiesToAdapt[filename].get(i), entityContent, pointsToKeep, counter)
+            )
 
             content_new = Ymap.calculateAndReplaceLodDistance(content_new, self.ytypItems)
             content_new = Ymap.fixMapExtents(content_new, self.ytypItems)
 
-            f = open(os.path.join(self.outputDir, filename.lower()), 'w')
-            f.write(content_new)
-            f.close()
-
-    def repl(self, matchobj: Match, pointsToKeep: list[list[int]], counter: list[int]) -> str:
-        archetypeName = matchobj.group(2)
-        scaling = [float(matchobj.group(6)), float(matchobj.group(6)), float(matchobj.group(8))]
+            self.outputMaps.setContent(filename.lower(), content_new)
 
-        group = self.determineGroup(archetypeName, scaling)
+    def repl(self, group: int, entity: Optional[EntityItem], entityContent: str, pointsToKeep: list[list[int]], counter: list[int]) -> str:
         if group < 0:
-            return matchobj.group(0)
+            return entityContent
 
         i = counter[group]
         counter[group] += 1
         if pointsToKeep[group][i] == 0:
             return ""
         elif not self.adaptScaling or group != 0:
-            return matchobj.group(0)
+            return entityContent
+
+        archetypeName = entity.archetypeName
+        scaling = entity.scale
 
         # TODO consider scaleZ for position update (depending on rotation and offsetZ; see z-fixer)
         # TODO take into account the total area divided by the area of this entity
@@ -207,11 +221,12 @@ class Reducer:
         scaleXY = scaling[0] * max(scaleXY, 1)  # ensure scaling does not decrease
         scaleZ = scaling[2] * max(scaleZ, 1)  # ensure scaling does not decrease
 
-        return matchobj.group(1) + str(scaleXY) + matchobj.group(7) + str(scaleZ) + matchobj.group(9)
+        entityContent = ParsedYmap.replaceValue(entityContent, "scaleXY", str(scaleXY))
+        return ParsedYmap.replaceValue(entityContent, "scaleZ", str(scaleZ))
 
     def copyOthers(self):
         # copy other files
-        Util.copyFiles(self.inputDir, self.outputDir, lambda filename: not filename.endswith(".ymap.xml"))
+        self.outputMaps.copyOthers(self.inputMaps)
 
     def determineGroup(self, archetypeName: str, scaling: list[float]) -> int:
         for group in range(len(self.groups)):
@@ -1,16 +1,20 @@
-from re import Match
 from natsort import natsorted
 import numpy as np
 import transforms3d
 from matplotlib import pyplot
 import os
-import re
+from typing import Optional
 
+from common.Parallel import Parallel
 from common.PlotManager import PlotManager
 from common.Util import Util
+from common.ymap.EntityItem import EntityItem
 from common.ymap.Flag import Flag
 from common.ymap.LodLevel import LodLevel
+from common.ymap.MapSet import MapSet
+from common.ymap.ParsedYmap import ParsedYmap
 from common.ymap.Ymap import Ymap
+from common.ymap.YmapParser import YmapParser
 from common.ytyp.YtypItem import YtypItem
 from common.ytyp.YtypParser import YtypParser
 
@@ -20,37 +24,68 @@ class Sanitizer:
 
     inputDir: str
     outputDir: str
+    inputMaps: Optional[MapSet]
+    outputMaps: MapSet
+    inMemory: bool
+    jobs: int
     ytypItems: dict[str, YtypItem]
     lowercaseYtypItems: dict[str, str]
     fixedArchetypeNames: set[str]
 
-    def __init__(self, inputDir: str, outputDir: str):
+    def __init__(self, inputDir: str, outputDir: str, inputMaps: Optional[MapSet] = None, inMemory: bool = False, jobs: int = 1):
         self.inputDir = inputDir
         self.outputDir = outputDir
+        self.inputMaps = inputMaps
+        self.inMemory = inMemory
+        self.outputMaps = MapSet(None if inMemory else outputDir)
+        self.jobs = jobs
         # plotting state
         self._plot_file_labels = []
         self._plot_fix_counts = []
 
+    def __getstate__(self):
+        # the maps are passed to the worker processes file by file
+        state = self.__dict__.copy()
+        state["inputMaps"] = None
+        state["outputMaps"] = None
+        return state
+
     def run(self):
         print("running sanitizer...")
         self.createOutputDir()
+        self.readInputMaps()
         self.readYtypItems()
         self.processFiles()
         self.copyOthers()
+        self.writeOutputMaps()
         print("sanitizer DONE")
 
     def createOutputDir(self):
+        if self.inMemory:
+            return
+
         if os.path.exists(self.outputDir):
             raise ValueError("Output dir " + self.outputDir + " must not exist")
 
         os.makedirs(self.outputDir)
 
+    def readInputMaps(self):
+        if self.inputMaps is None:
+            self.inputMaps = MapSet.readDirectory(self.inputDir)
+
+    def writeOutputMaps(self):
+        if not self.inMemory:
+            self.outputMaps.writeDirectory(self.outputDir)
+
     def readYtypItems(self):
-        self.ytypItems = YtypParser.readYtypDirectory(os.path.join(os.path.dirname(__file__), "..", "..", "resources", "ytyp"))
+        self.ytypItems = YtypParser.readYtypDirectoryCached(os.path.join(os.path.dirname(__file__), "..", "..", "resources", "ytyp"))
         self.lowercaseYtypItems = dict((k.lower(), k) for k, v in self.ytypItems.items())
 
-    def repl(self, match: Match, fixedArchetypeNames: set[str]) -> str:
-        archetypeName = match.group(2).lower()
+    def repl(self, entity: EntityItem, entityContent: str, fixedArchetypeNames: set[str]) -> str:
+        if entity.flags is None or entity.childLodDist is None or entity.lodLevel is None or entity.numChildren is None:
+            return entityContent
+
+        archetypeName = entity.archetypeName.lower()
 
         if archetypeName.lower() in self.lowercaseYtypItems and archetypeName not in self.ytypItems:
             fixedArchetypeName = self.lowercaseYtypItems[archetypeName.lower()]
@@ -58,8 +93,8 @@ class Sanitizer:
         else:
             fixedArchetypeName = archetypeName
 
-        flags = int(match.group(4))
-        origQuat = [float(match.group(9)), -float(match.group(6)), -float(match.group(7)), -float(match.group(8))]
+        flags = entity.flags
+        origQuat = entity.rotation
 
         rotationQuaternion = np.divide(origQuat, [transforms3d.quaternions.qnorm(origQuat)])
 
@@ -79,28 +114,30 @@ class Sanitizer:
             # TODO when is it necessary to add this flag? looking at some original rockstar maps only some rotations need this flag
             flags |= Flag.ALLOW_FULL_ROTATION
 
-        lodLevel = match.group(12)
-        numChildren = int(match.group(14))
+        lodLevel = entity.lodLevel
+        numChildren = entity.numChildren
         if lodLevel == LodLevel.HD and numChildren == 0:
             lodLevel = LodLevel.ORPHAN_HD
             print("\t\tchanged lodLevel from " + LodLevel.HD + " to " + LodLevel.ORPHAN_HD)
 
-        return match.group(1) + \
-               fixedArchetypeName + \
-               match.group(3) + \
-               str(flags) + \
-               match.group(5) + \
-               'x="' + Util.floatToStr(-rotationQuaternion[1]) + \
-               '" y="' + Util.floatToStr(-rotationQuaternion[2]) + \
-               '" z="' + Util.floatToStr(-rotationQuaternion[3]) + \
-               '" w="' + Util.floatToStr(rotationQuaternion[0]) + '"' + \
-               match.group(10) + Util.floatToStr(0) + \
-               match.group(11) + lodLevel + match.group(13)
+        entityContent = ParsedYmap.replaceText(entityContent, "archetypeName", fixedArchetypeName)
+        entityContent = ParsedYmap.replaceValue(entityContent, "flags", str(flags))
+        entityContent = ParsedYmap.replaceRotation(entityContent, rotationQuaternion)
+        entityContent = ParsedYmap.replaceValue(entityContent, "childLodDist", Util.floatToStr(0))
+        return ParsedYmap.replaceText(entityContent, "lodLevel", lodLevel)
 
     def processFiles(self):
-        for filename in natsorted(os.listdir(self.inputDir)):
-            if filename.endswith(".ymap.xml"):
-                self.processFile(filename)
+        filenames = self.inputMaps.getYmapFilenames()
+        # maps not read yet are only passed by path, so each map is read when it is processed
+        tasks = [(filename, self.inputMaps.getSubset([filename])) for filename in filenames]
+        results = Parallel.imap(Sanitizer.processFile, self, tasks, self.jobs)
+
+        for filename, (content_new, numFixes) in zip(filenames, results):
+            # record how many archetype name fixes we performed in this file
+            self._plot_file_labels.append(filename.lower())
+            self._plot_fix_counts.append(numFixes)
+
+            self.outputMaps.setContent(filename.lower(), content_new)
 
         # After processing all files, create a small bar chart summarizing fixes per map.
         if self._plot_file_labels:
@@ -116,29 +153,13 @@ class Sanitizer:
             ax.set_ylabel("Number of fixes")
             ax.set_xlabel("Map")
 
-    def processFile(self, filename: str):
+    def processFile(self, filename: str, inputMaps: MapSet) -> tuple[str, int]:
         print("\tprocessing " + filename)
 
-        f = open(os.path.join(self.inputDir, filename), 'r')
-        content = f.read()
-        f.close()
+        ymap = YmapParser.readYmapContent(inputMaps.getContent(filename))
 
         fixedArchetypeNames = set()
-        content_new = re.sub('(<Item type="CEntityDef">' +
-                             '\\s*<archetypeName>)([^<]+)(</archetypeName>' +
-                             '\\s*<flags value=")([^"]+)("\\s*/>' +
-                             '(?:\\s*<[^/].*>)*?' +
-                             '\\s*<rotation )x="([^"]+)" y="([^"]+)" z="([^"]+)" w="([^"]+)"(/>' +
-                             '(?:\\s*<[^/].*>)*?' +
-                             '\\s*<childLodDist value=")[^"]+("/>' +
-                             '\\s*<lodLevel>)([^<]+)(</lodLevel>' +
-                             '\\s*<numChildren value="([^"]+)"/>' +
-                             '(?:\\s*<[^/].*>)*?' +
-                             '\\s*</Item>)', lambda match: self.repl(match, fixedArchetypeNames), content, flags=re.M)
-
-        # record how many archetype name fixes we performed in this file
-        self._plot_file_labels.append(filename.lower())
-        self._plot_fix_counts.append(len(fixedArchetypeNames))
+        content_new = ymap.replaceEntities(lambda i, entityContent: self.repl(ymap.entities[i], entityContent, fixedArchetypeNames))
 
         for fixed in natsorted(fixedArchetypeNames):
             print("\t\t" + fixed)
@@ -147,10 +168,8 @@ class Sanitizer:
         content_new = Ymap.calculateAndReplaceLodDistance(content_new, self.ytypItems)
         content_new = Ymap.fixMapExtents(content_new, self.ytypItems)
 
-        f = open(os.path.join(self.outputDir, filename.lower()), 'w')
-        f.write(content_new)
-        f.close()
+        return content_new, len(fixedArchetypeNames)
 
     def copyOthers(self):
         # copy other files
-        Util.copyFiles(self.inputDir, self.outputDir, lambda filename: not filename.endswith(".ymap.xml"))
+        self.outputMaps.copyOthers(self.inputMaps)
@@ -1,16 +1,12 @@
 import re
-from typing import IO, Optional, Union
+from typing import IO, Optional
 
 import numpy as np
 
 from common.BoundingGeometry import BoundingGeometry
 from common.Util import Util
 from worker.static_col_creator.Material import Material
-from worker.static_col_creator.Polygon.Box import Box
-from worker.static_col_creator.Polygon.Capsule import Capsule
-from worker.static_col_creator.Polygon.Cylinder import Cylinder
-from worker.static_col_creator.Polygon.Sphere import Sphere
-from worker.static_col_creator.Polygon.Tri import Tri
+from worker.static_col_creator.PolygonTable import PolygonTable
 
 
 class BoundBVH:
@@ -18,6 +14,22 @@ class BoundBVH:
     MAX_NUM_POLYGONS = 1 << 15
     MAX_NUM_VERTICES = 1 << 15
 
+    _PH_BOUND_PATTERN = re.compile(
+        '\t\tphBound\n\t\t\\{\n' +
+        '\t\t\tType (?:BoundBVH|BoundGeometry)\n' +
+        '\t\t\tRadius [+-]?\\d+\\.\\d+\n' +
+        '(?:\t\t\t(?:AABBMax|AABBMin|Centroid|CG) [+-]?\\d+\\.\\d+ [+-]?\\d+\\.\\d+ [+-]?\\d+\\.\\d+\n){4}' +
+        '\t\t\tPolygons \\d+\n\t\t\t\\{\n((?:\t\t\t\t[^\n]*\n)*)\t\t\t\\}\n' +
+        '\t\t\tGeometryCenter ([+-]?\\d+\\.\\d+) ([+-]?\\d+\\.\\d+) ([+-]?\\d+\\.\\d+) \\d+\\.\\d+\n' +
+        '\t\t\tVertices \\d+\n\t\t\t\\{\n((?:\t\t\t\t[+-]?\\d+\\.\\d+ [+-]?\\d+\\.\\d+ [+-]?\\d+\\.\\d+\n)*)\t\t\t\\}\n' +
+        '\t\t\tVertexColors null\n' +
+        '\t\t\tMaterials \\d+\n\t\t\t\\{\n((?:\t\t\t\t[^\n]*\n)*)\t\t\t\\}\n' +
+        '\t\t\tMaterialColors null\n' +
+        '\t\t\tMargin (\\d+\\.\\d+)\n' +
+        '(?:\t\t\tShrunk \\d+\n\t\t\t\\{\n(?:\t\t\t\t[+-]?\\d+\\.\\d+ [+-]?\\d+\\.\\d+ [+-]?\\d+\\.\\d+\n)*\t\t\t\\}\n)?' +
+        '\t\t\\}\n*'
+    )
+
     @staticmethod
     def parse(contentPhBound: str, contentMatrix: str, contentChildFlagsItem: str) -> "BoundBVH":
         matrix = BoundBVH.parseMatrix(contentMatrix)
@@ -26,225 +38,32 @@ class BoundBVH:
         return BoundBVH(polygons, materials, margin, vertices, shrunk, flags1, flags2)
 
     @staticmethod
-    def parsePhBound(contentPhBound: str, matrix: list[list[float]]) -> (list[Union[Box, Capsule, Cylinder, Sphere, Tri]], list[str], float, list[list[float]], Union[list[list[float]], None]):
-        # modes:
-        #  0: start of phBound (before Polygons)
-        #  1: start of Polygons
-        #  2: within Polygons
-        #  3: start of single polygon
-        #  4: within single polygon
-        #  5: after polygons expecting GeometryCenter
-        #  6: after GeometryCenter expecting Vertices
-        #  7: start of Vertices
-        #  8: within Vertices
-        #  9: after Vertices expecting VertexColors
-        # 10: after VertexColors expecting Materials
-        # 11: start of Materials
-        # 12: within Materials
-        # 13: start of single Material
-        # 14: within single Material
-        # 15: after Material expecting MaterialColors
-        # 16: after MaterialColors expecting Margin
-        # 17: after Margin expecting Shrunk or end of phBound
-        # 18: start of Shrunk
-        # 19: within Shrunk
-        # 20: after Shrunk expecting end of phBound
-        # 21: end of phBound expecting no more content (except empty line)
-        mode = 0
-
-        i = -1
-        polygon = ""
-        polygons = []
-        geometryCenter = None
-        vertices = []
-        material = ""
-        materials = []
-        margin = None
-        shrunk = None
-        for line in contentPhBound.splitlines():
-            i += 1
-            if i == 0 and line == "		phBound":
-                continue
-            elif i == 1 and line == "		{":
-                continue
-            elif i == 2:
-                m = re.match(r'			Type (?:BoundBVH|BoundGeometry)$', line)
-                if m is not None:
-                    continue
-            elif i == 3:
-                m = re.match(r'			Radius ([+-]?\d+\.\d+)$', line)
-                if m is not None:
-                    continue
-            elif 4 <= i <= 7:
-                m = re.match(r'			(?:AABBMax|AABBMin|Centroid|CG) ([+-]?\d+\.\d+) ([+-]?\d+\.\d+) ([+-]?\d+\.\d+)$', line)
-                if m is not None:
-                    continue
-
-            # Polygons
-            elif i == 8:
-                m = re.match(r'			Polygons \d+$', line)
-                if m is not None:
-                    mode = 1
-                    continue
-            elif mode == 1:
-                if line == "			{":
-                    mode = 2
-                    continue
-            elif mode == 2:
-                m = re.match(r'				[a-zA-Z]+ \d+$', line)
-                if m is not None:
-                    polygon = line + "\n"
-                    mode = 3
-                    continue
-                elif line == "			}":
-                    mode = 5
-                    continue
-            elif mode == 3:
-                if line == "				{":
-                    polygon += line + "\n"
-                    mode = 4
-                    continue
-            elif mode == 4:
-                if line.startswith("					"):
-                    polygon += line + "\n"
-                    continue
-                elif line == "				}":
-                    polygon += line + "\n"
-                    polygons.append(BoundBVH.parsePolygon(polygon))
-                    mode = 2
-                    continue
-
-            # GeometryCenter
-            elif mode == 5:
-                m = re.match(r'			GeometryCenter ([+-]?\d+\.\d+) ([+-]?\d+\.\d+) ([+-]?\d+\.\d+) \d+\.\d+$', line)
-                if m is not None:
-                    geometryCenter = [float(m.group(1)), float(m.group(2)), float(m.group(3))]
-                    mode = 6
-                    continue
-
-            # Vertices
-            elif mode == 6:
-                m = re.match(r'			Vertices \d+$', line)
-                if m is not None:
-                    mode = 7
-                    continue
-            elif mode == 7:
-                if line == "			{":
-                    mode = 8
-                    continue
-            elif mode == 8:
-                m = re.match(r'				([+-]?\d+\.\d+) ([+-]?\d+\.\d+) ([+-]?\d+\.\d+)$', line)
-                if m is not None:
-                    vertex = [float(m.group(1)), float(m.group(2)), float(m.group(3))]
-                    vertices.append(BoundBVH.transformVertex(vertex, geometryCenter, matrix))
-                    continue
-                if line == "			}":
-                    mode = 9
-                    continue
-
-            # VertexColors
-            elif mode == 9 and line == "			VertexColors null":
-                mode = 10
-                continue
-
-            # Materials
-            elif mode == 10:
-                m = re.match(r'			Materials \d+$', line)
-                if m is not None:
-                    mode = 11
-                    continue
-            elif mode == 11:
-                if line == "			{":
-                    mode = 12
-                    continue
-            elif mode == 12:
-                m = re.match(r'				Material \d+$', line)
-                if m is not None:
-                    material = line + "\n"
-                    mode = 13
-                    continue
-                elif line == "			}":
-                    mode = 15
-                    continue
-            elif mode == 13:
-                if line == "				{":
-                    material += line + "\n"
-                    mode = 14
-                    continue
-            elif mode == 14:
-                if line.startswith("					"):
-                    material += line + "\n"
-                    continue
-                elif line == "				}":
-                    material += line + "\n"
-                    materials.append(Material.parse(material))
-                    mode = 12
-                    continue
-
-            # MaterialColors
-            elif mode == 15 and line == "			MaterialColors null":
-                mode = 16
-                continue
-
-            # Margin
-            elif mode == 16:
-                m = re.match(r'			Margin (\d+\.\d+)$', line)
-                if m is not None:
-                    margin = float(m.group(1))
-                    mode = 17
-                    continue
-
-            # Shrunk
-            elif mode == 17:
-                m = re.match(r'			Shrunk \d+$', line)
-                if m is not None:
-                    shrunk = []
-                    mode = 18
-                    continue
-            elif mode == 18:
-                if line == "			{":
-                    mode = 19
-                    continue
-            elif mode == 19:
-                m = re.match(r'				([+-]?\d+\.\d+) ([+-]?\d+\.\d+) ([+-]?\d+\.\d+)$', line)
-                if m is not None:
-                    vertex = [float(m.group(1)), float(m.group(2)), float(m.group(3))]
-                    shrunk.append(BoundBVH.transformVertex(vertex, geometryCenter, matrix))
-                    continue
-                if line == "			}":
-                    mode = 20
-                    continue
-
-            # end of phBound
-            if mode == 17 or mode == 20:
-                if line == "		}":
-                    mode = 21
-                    continue
-            elif mode == 21 and line == "":
-                continue
-
-            raise Exception("Could not parse phBound. Error in line " + str(i + 1) + ":\n" + contentPhBound)
+    def parsePhBound(contentPhBound: str, matrix: list[list[float]]) -> (PolygonTable, list[Material], float, np.ndarray, Optional[np.ndarray]):
+        # the sections are captured in a single pass, polygons and materials are then parsed one after another
+        # directly from the content of their sections
+        m = BoundBVH._PH_BOUND_PATTERN.fullmatch(contentPhBound)
+        if m is None:
+            raise Exception("Could not parse phBound:\n" + contentPhBound)
+
+        polygons = PolygonTable.parsePolygons(m.group(1))
+        geometryCenter = [float(m.group(2)), float(m.group(3)), float(m.group(4))]
+        vertices = BoundBVH.transformVertices(BoundBVH.parseVertices(m.group(5)), geometryCenter, matrix)
+        materials = Material.parseMaterials(m.group(6))
+        margin = float(m.group(7))
 
         return polygons, materials, margin, vertices, None  # TODO bug with shrunk so always return None instead
 
     @staticmethod
-    def transformVertex(vertex: list[float], geometryCenter: list[float], matrix: list[list[float]]) -> list[float]:
-        vec4PreTranslation = [vertex[0], vertex[1], vertex[2], 1]
-        vector = np.dot(vec4PreTranslation, matrix)
-        return [vector[0] + geometryCenter[0], vector[1] + geometryCenter[1], vector[2] + geometryCenter[2]]
+    def parseVertices(contentVertices: str) -> np.ndarray:
+        # contentVertices is already validated by _PH_BOUND_PATTERN, hence it consists of three floats per line
+        return np.array(list(map(float, contentVertices.split())), dtype=float).reshape(-1, 3)
 
     @staticmethod
-    def parsePolygon(contentPolygon: str):
-        if contentPolygon.startswith("				Box "):
-            return Box.parse(contentPolygon)
-        elif contentPolygon.startswith("				Capsule "):
-            return Capsule.parse(contentPolygon)
-        elif contentPolygon.startswith("				Cylinder "):
-            return Cylinder.parse(contentPolygon)
-        elif contentPolygon.startswith("				Sphere "):
-            return Sphere.parse(contentPolygon)
-        elif contentPolygon.startswith("				Tri "):
-            return Tri.parse(contentPolygon)
+    def transformVertices(vertices: np.ndarray, geometryCenter: list[float], matrix: list[list[float]]) -> np.ndarray:
+        # vectorized version of transforming each vertex as row vector [x, y, z, 1] by the 4x3 matrix. In contrast to
+        # a plain matrix product, the batched product yields the same results as the per vertex product bit for bit.
+        vertices4 = np.hstack([vertices, np.ones((len(vertices), 1))])
+        return np.matmul(vertices4[:, np.newaxis, :], np.array(matrix, dtype=float))[:, 0, :] + geometryCenter
 
     @staticmethod
     def parseMatrix(contentMatrix: str) -> list[list[float]]:
@@ -302,37 +121,53 @@ class BoundBVH:
         return flags1, flags2
 
 
-    polygons: list[Union[Box, Capsule, Cylinder, Sphere, Tri]]
+    # polygons in chunks like the vertices, see getPolygons
+    _polygonChunks: list[PolygonTable]
+    numPolygons: int
     materials: list[Material]
+    # index of the first material with a given key, built when merging the first time
+    _materialIndices: Optional[dict[tuple[int, str], int]]
     margin: float
-    vertices: list[list[float]]
-    shrunk: Union[list[list[float]], None]
+    # vertices (and shrunk vertices) as (n, 3) arrays in chunks which are concatenated into a single array when needed,
+    # so that merging many bounds one after another does not copy the vertices merged so far each time
+    _vertexChunks: list[np.ndarray]
+    _shrunkChunks: Optional[list[np.ndarray]]
+    numVertices: int
     flags1: str
     flags2: str
     boundingGeometry: Optional[BoundingGeometry]
 
-    def __init__(self, polygons: list[Union[Box, Capsule, Cylinder, Sphere, Tri]], materials: list[Material], margin: float, vertices: list[list[float]], shrunk: Union[list[list[float]], None], flags1: str, flags2: str):
-        self.polygons = polygons
+    def __init__(self, polygons: PolygonTable, materials: list[Material], margin: float, vertices: np.ndarray, shrunk: Optional[np.ndarray], flags1: str, flags2: str):
+        self._polygonChunks = [polygons]
+        self.numPolygons = len(polygons)
         self.materials = materials
+        self._materialIndices = None
         self.margin = margin
-        self.vertices = vertices
-        self.shrunk = shrunk
+        self._vertexChunks = [vertices]
+        self._shrunkChunks = None if shrunk is None else [shrunk]
+        self.numVertices = len(vertices)
         self.flags1 = flags1
         self.flags2 = flags2
+        self.boundingGeometry = None
 
-    def transform(self, rotationQuaternion: list[float], scale: list[float], translation: list[float]) -> None:
-        minScale = min(scale)
-        for i in range(len(self.polygons)):
-            self.polygons[i].scale(minScale)
+    def transformed(self, rotationQuaternion: list[float], scale: list[float], translation: list[float]) -> "BoundBVH":
+        """
+        Returns a transformed instance of this bound. Polygon tables are immutable, hence the instance shares the
+        polygons (except for scaled radii) as well as the materials with this bound, so a parsed bound can serve as
+        template for any number of instances without being copied.
+        """
+        polygons = self.getPolygons().scaled(min(scale))
 
-        for i in range(len(self.vertices)):
-            self.vertices[i] = Util.applyTransformation(self.vertices[i], rotationQuaternion, scale, translation)
+        rotation = np.array(rotationQuaternion, dtype=float)
+        scaling = np.array(scale, dtype=float)
+        translation = np.array(translation, dtype=float)
+        vertices = Util.applyTransformations(self.getVertices(), rotation, scaling, translation)
 
-        if self.shrunk is not None:
-            for i in range(len(self.shrunk)):
-                self.shrunk[i] = Util.applyTransformation(self.shrunk[i], rotationQuaternion, scale, translation)
+        shrunk = None
+        if self._shrunkChunks is not None:
+            shrunk = Util.applyTransformations(self.getShrunk(), rotation, scaling, translation)
 
-        self.boundingGeometry = None
+        return BoundBVH(polygons, list(self.materials), self.margin, vertices, shrunk, self.flags1, self.flags2)
 
     def isMergable(self, bound: "BoundBVH") -> bool:
         if self.getType() != bound.getType():
@@ -343,9 +178,9 @@ class BoundBVH:
             return False
         elif self.flags2 != bound.flags2:
             return False
-        elif len(self.polygons) + len(bound.polygons) >= BoundBVH.MAX_NUM_POLYGONS:
+        elif self.numPolygons + bound.numPolygons >= BoundBVH.MAX_NUM_POLYGONS:
             return False
-        elif len(self.vertices) + len(bound.vertices) >= BoundBVH.MAX_NUM_VERTICES:
+        elif self.numVertices + bound.numVertices >= BoundBVH.MAX_NUM_VERTICES:
             return False
         else:
             return True
@@ -356,44 +191,41 @@ class BoundBVH:
 
         materialsMapping = self.mergeMaterials(bound)
 
-        vertexIndexOffset = len(self.vertices)
-        polygonIndexOffset = len(self.polygons)
-        for i in range(len(bound.polygons)):
-            polygon = bound.polygons[i]
-            polygon.offsetVertexIndex(vertexIndexOffset, polygonIndexOffset)
-            # fix MaterialIndex according to materialsMapping
-            polygon.materialIndex = materialsMapping[polygon.materialIndex]
-
-        self.polygons.extend(bound.polygons)
-        self.vertices.extend(bound.vertices)
-        if self.shrunk is not None:
-            self.shrunk.extend(bound.shrunk)
+        vertexIndexOffset = self.numVertices
+        polygonIndexOffset = self.numPolygons
+        # the polygons of bound may be shared with other bounds, hence offset copies of them are appended
+        self._polygonChunks += [polygons.offset(vertexIndexOffset, polygonIndexOffset, materialsMapping) for polygons in bound._polygonChunks]
+        self.numPolygons += bound.numPolygons
+        self._vertexChunks += bound._vertexChunks
+        if self._shrunkChunks is not None:
+            self._shrunkChunks += bound._shrunkChunks
+        self.numVertices += bound.numVertices
 
         self.boundingGeometry = None
 
     def mergeMaterials(self, bound: "BoundBVH") -> list[int]:
         # compute materialsMapping to avoid redundant materials
-        materialsMapping = []
-        for i in range(len(bound.materials)):
-            index = self.findIndexOfSameMaterial(bound.materials[i])
-            materialsMapping.append(index)
+        materialsMapping = [self.findIndexOfSameMaterial(material) for material in bound.materials]
 
         # append non-existing materials and update materialsMapping accordingly
         for i in range(len(materialsMapping)):
             if materialsMapping[i] < 0:
                 self.materials.append(bound.materials[i])
                 materialsMapping[i] = len(self.materials) - 1
+                self._materialIndices.setdefault(bound.materials[i].getKey(), materialsMapping[i])
 
         return materialsMapping
 
     def findIndexOfSameMaterial(self, material: Material):
-        for i in range(len(self.materials)):
-            if self.materials[i].equals(material):
-                return i
-        return -1
+        if self._materialIndices is None:
+            self._materialIndices = {}
+            for i in range(len(self.materials)):
+                self._materialIndices.setdefault(self.materials[i].getKey(), i)
+
+        return self._materialIndices.get(material.getKey(), -1)
 
     def getType(self) -> str:
-        if self.shrunk is None:
+        if self._shrunkChunks is None:
             return "BoundBVH"
         else:
             return "BoundGeometry"
@@ -448,37 +280,32 @@ class BoundBVH:
 """)
 
     def writePolygons(self, file: IO):
-        numPolygons = len(self.polygons)
-        file.write("			Polygons " + str(numPolygons) + """
+        file.write("			Polygons " + str(self.numPolygons) + """
 			{
 """)
-        for i in range(numPolygons):
-            file.write(self.polygons[i].asPolygonString(i))
+        file.write(self.getPolygons().asPolygonsString())
         file.write("			}\n")
 
     def writeVertices(self, file: IO, geometryCenter: list[float]):
-        numVertices = len(self.vertices)
-        file.write("			Vertices " + str(numVertices) + """
+        file.write("			Vertices " + str(self.numVertices) + """
 			{
 """)
-        self.writeVertexList(file, self.vertices, geometryCenter)
+        self.writeVertexList(file, self.getVertices(), geometryCenter)
         file.write("			}\n")
 
     def writeShrunk(self, file: IO, geometryCenter: list[float]):
-        if self.shrunk is None:
+        if self._shrunkChunks is None:
             return
 
-        numShrunk = len(self.shrunk)
-        file.write("			Shrunk " + str(numShrunk) + """
+        shrunk = self.getShrunk()
+        file.write("			Shrunk " + str(len(shrunk)) + """
 			{
 """)
-        self.writeVertexList(file, self.shrunk, geometryCenter)
+        self.writeVertexList(file, shrunk, geometryCenter)
         file.write("			}\n")
 
-    def writeVertexList(self, file: IO, vertices: list[list[float]], geometryCenter: list[float]):
-        for i in range(len(vertices)):
-            vertex = np.subtract(self.vertices[i], geometryCenter)
-            file.write("				" + Util.vectorToStr(vertex) + "\n")
+    def writeVertexList(self, file: IO, vertices: np.ndarray, geometryCenter: list[float]):
+        file.write(Util.formatRows("				" + Util.getVectorFormat(3) + "\n", vertices - geometryCenter))
 
     def writeMaterials(self, file: IO):
         numMaterials = len(self.materials)
@@ -489,6 +316,23 @@ class BoundBVH:
             file.write(self.materials[i].asMaterialString(i))
         file.write("			}\n")
 
+    def getPolygons(self) -> PolygonTable:
+        if len(self._polygonChunks) > 1:
+            self._polygonChunks = [PolygonTable.concatenate(self._polygonChunks)]
+        return self._polygonChunks[0]
+
+    def getVertices(self) -> np.ndarray:
+        if len(self._vertexChunks) > 1:
+            self._vertexChunks = [np.concatenate(self._vertexChunks)]
+        return self._vertexChunks[0]
+
+    def getShrunk(self) -> Optional[np.ndarray]:
+        if self._shrunkChunks is None:
+            return None
+        if len(self._shrunkChunks) > 1:
+            self._shrunkChunks = [np.concatenate(self._shrunkChunks)]
+        return self._shrunkChunks[0]
+
     def getBoundingGeometry(self) -> BoundingGeometry:
         if self.boundingGeometry is None:
             self._computeBoundingGeometry()
@@ -496,5 +340,5 @@ class BoundBVH:
 
     def _computeBoundingGeometry(self) -> None:
         self.boundingGeometry = BoundingGeometry()
-        for i in range(len(self.polygons)):
-            self.polygons[i].extendBoundingGeometry(self.boundingGeometry, self.vertices)
+        vertices = self.getVertices()
+        self.getPolygons().extendBoundingGeometry(self.boundingGeometry, vertices)
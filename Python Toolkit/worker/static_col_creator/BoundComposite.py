@@ -194,9 +194,8 @@ class BoundComposite:
     def __init__(self, children: list[BoundBVH]):
         self.children = children
 
-    def transform(self, rotationQuaternion: list[float], scale: list[float], translation: list[float]) -> None:
-        for i in range(len(self.children)):
-            self.children[i].transform(rotationQuaternion, scale, translation)
+    def transformed(self, rotationQuaternion: list[float], scale: list[float], translation: list[float]) -> "BoundComposite":
+        return BoundComposite([child.transformed(rotationQuaternion, scale, translation) for child in self.children])
 
     def merge(self, boundComposite: "BoundComposite") -> None:
         # TODO improve since this is O(n^2)
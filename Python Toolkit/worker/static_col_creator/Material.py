@@ -5,52 +5,40 @@ class Material:
     materialIndex: int
     polyFlags: str
 
+    _PATTERN = re.compile('\t\t\t\tMaterial \\d+\n\t\t\t\t\\{\n' +
+                          '\t\t\t\t\tMaterialIndex (\\d+)\n' +
+                          '\t\t\t\t\tProcId 0\n' +
+                          '\t\t\t\t\tRoomId 0\n' +
+                          '\t\t\t\t\tPedDensity 0\n' +
+                          '\t\t\t\t\tPolyFlags ([^\n]+)\n' +
+                          '\t\t\t\t\tMaterialColorIndex 0\n' +
+                          '\t\t\t\t\\}\n')
+
     @staticmethod
-    def parse(content: str) -> "Material":
-        materialIndex = -1
-        polyFlags = ""
-        i = -1
-        for line in content.splitlines():
-            i += 1
-            if i == 0:
-                m = re.match(r'				Material \d+$', line)
-                if m is not None:
-                    continue
-            elif i == 1 and line == "				{":
-                continue
-            elif i == 2:
-                m = re.match(r'					MaterialIndex (\d+)$', line)
-                if m is not None:
-                    materialIndex = int(m.group(1))
-                    continue
-            elif i == 3 and line == "					ProcId 0":
-                continue
-            elif i == 4 and line == "					RoomId 0":
-                continue
-            elif i == 5 and line == "					PedDensity 0":
-                continue
-            elif i == 6:
-                m = re.match(r'					PolyFlags (.+)$', line)
-                if m is not None:
-                    polyFlags = m.group(1)
-                    continue
-            elif i == 7 and line == "					MaterialColorIndex 0":
-                continue
-            elif i == 8 and line == "				}":
-                continue
-            elif i == 9 and line == "":
-                continue
+    def parseMaterials(contentMaterials: str) -> list["Material"]:
+        # contentMaterials consists of the materials one after another (i.e. the content between { and } of Materials)
+        materials = []
+        pos = 0
+        while pos < len(contentMaterials):
+            m = Material._PATTERN.match(contentMaterials, pos)
+            if m is None:
+                raise Exception("Could not parse Material:\n" + contentMaterials[pos:])
 
-            raise Exception("Could not parse Material. Error in line " + str(i + 1) + ":\n" + content)
+            materials.append(Material(int(m.group(1)), m.group(2)))
+            pos = m.end()
 
-        return Material(materialIndex, polyFlags)
+        return materials
 
     def __init__(self, materialIndex: int, polyFlags: str):
         self.materialIndex = materialIndex
         self.polyFlags = polyFlags
 
+    def getKey(self) -> tuple[int, str]:
+        # materials with the same key are equal
+        return self.materialIndex, self.polyFlags
+
     def equals(self, other: "Material") -> bool:
-        return self.materialIndex == other.materialIndex and self.polyFlags == other.polyFlags
+        return self.getKey() == other.getKey()
 
     def asMaterialString(self, materialIndex: int) -> str:
         return """				Material """ + str(materialIndex) + """
@@ -0,0 +1,193 @@
+import re
+
+import numpy as np
+
+from common.BoundingGeometry import BoundingGeometry
+
+
+class PolygonTable:
+    """
+    Polygons (collision primitives) of a BoundBVH as structure of arrays, one row per polygon. A table is immutable,
+    i.e. offsetting, scaling and concatenating return new tables which may share the unaffected arrays with this one.
+    """
+
+    BOX = 0
+    CAPSULE = 1
+    CYLINDER = 2
+    SPHERE = 3
+    TRI = 4
+
+    _PATTERNS = {
+        BOX: re.compile('\t\t\t\tBox \\d+\n\t\t\t\t\\{\n' +
+                        '\t\t\t\t\tVertices (\\d+) (\\d+) (\\d+) (\\d+)\n' +
+                        '\t\t\t\t\tMaterialIndex (\\d+)\n' +
+                        '\t\t\t\t\\}\n'),
+        CAPSULE: re.compile('\t\t\t\tCapsule \\d+\n\t\t\t\t\\{\n' +
+                            '\t\t\t\t\tCenterTop (\\d+)\n' +
+                            '\t\t\t\t\tCenterBottom (\\d+)\n' +
+                            '\t\t\t\t\tRadius (\\d+\\.\\d+)\n' +
+                            '\t\t\t\t\tMaterialIndex (\\d+)\n' +
+                            '\t\t\t\t\\}\n'),
+        CYLINDER: re.compile('\t\t\t\tCylinder \\d+\n\t\t\t\t\\{\n' +
+                             '\t\t\t\t\tCenterTop (\\d+)\n' +
+                             '\t\t\t\t\tCenterBottom (\\d+)\n' +
+                             '\t\t\t\t\tRadius (\\d+\\.\\d+)\n' +
+                             '\t\t\t\t\tMaterialIndex (\\d+)\n' +
+                             '\t\t\t\t\\}\n'),
+        SPHERE: re.compile('\t\t\t\tSphere \\d+\n\t\t\t\t\\{\n' +
+                           '\t\t\t\t\tCenter (\\d+)\n' +
+                           '\t\t\t\t\tRadius (\\d+\\.\\d+)\n' +
+                           '\t\t\t\t\tMaterialIndex (\\d+)\n' +
+                           '\t\t\t\t\\}\n'),
+        TRI: re.compile('\t\t\t\tTri \\d+\n\t\t\t\t\\{\n' +
+                        '\t\t\t\t\tVertices (\\d+) (\\d+) (\\d+)\n' +
+                        '\t\t\t\t\tSiblings (-?\\d+) (-?\\d+) (-?\\d+)\n' +
+                        '\t\t\t\t\tMaterialIndex (\\d+)\n' +
+                        '\t\t\t\t\\}\n'),
+    }
+
+    _TYPES_BY_NAME = {"Box": BOX, "Capsule": CAPSULE, "Cylinder": CYLINDER, "Sphere": SPHERE, "Tri": TRI}
+
+    # %-style formats of the polygons by type, taking the polygon index followed by the values of the type
+    _FORMATS = {
+        BOX: "\t\t\t\tBox %d\n\t\t\t\t{\n\t\t\t\t\tVertices %d %d %d %d\n\t\t\t\t\tMaterialIndex %d\n\t\t\t\t}\n",
+        CAPSULE: "\t\t\t\tCapsule %d\n\t\t\t\t{\n\t\t\t\t\tCenterTop %d\n\t\t\t\t\tCenterBottom %d\n\t\t\t\t\tRadius %.8f\n\t\t\t\t\tMaterialIndex %d\n\t\t\t\t}\n",
+        CYLINDER: "\t\t\t\tCylinder %d\n\t\t\t\t{\n\t\t\t\t\tCenterTop %d\n\t\t\t\t\tCenterBottom %d\n\t\t\t\t\tRadius %.8f\n\t\t\t\t\tMaterialIndex %d\n\t\t\t\t}\n",
+        SPHERE: "\t\t\t\tSphere %d\n\t\t\t\t{\n\t\t\t\t\tCenter %d\n\t\t\t\t\tRadius %.8f\n\t\t\t\t\tMaterialIndex %d\n\t\t\t\t}\n",
+        TRI: "\t\t\t\tTri %d\n\t\t\t\t{\n\t\t\t\t\tVertices %d %d %d\n\t\t\t\t\tSiblings %d %d %d\n\t\t\t\t\tMaterialIndex %d\n\t\t\t\t}\n",
+    }
+
+    # polygons whose vertices are centers of spheres with the radius of the polygon rather than corners
+    _SPHERE_TYPES = [CAPSULE, CYLINDER, SPHERE]
+
+    # type code of each polygon, shape (n,)
+    types: np.ndarray
+    # indices of the vertices (corners of Box and Tri, centers of the others), unused entries are -1, shape (n, 4)
+    vertices: np.ndarray
+    # indices of the adjacent polygons of Tri, -1 if there is none or unused, shape (n, 3)
+    siblings: np.ndarray
+    # radius of Capsule, Cylinder and Sphere, 0 otherwise, shape (n,)
+    radii: np.ndarray
+    materialIndices: np.ndarray
+
+    @staticmethod
+    def parsePolygons(contentPolygons: str) -> "PolygonTable":
+        # contentPolygons consists of the polygons one after another (i.e. the content between { and } of Polygons)
+        rows = []
+        pos = 0
+        while pos < len(contentPolygons):
+            row, pos = PolygonTable.parsePolygon(contentPolygons, pos)
+            rows.append(row)
+
+        return PolygonTable.fromRows(rows)
+
+    @staticmethod
+    def parsePolygon(contentPolygons: str, pos: int) -> (tuple[int, list[int], list[int], float, int], int):
+        # returns the polygon starting at pos and the position after it
+        name = contentPolygons[pos:contentPolygons.find(" ", pos)].lstrip("\t")
+        polygonType = PolygonTable._TYPES_BY_NAME.get(name)
+        m = None if polygonType is None else PolygonTable._PATTERNS[polygonType].match(contentPolygons, pos)
+        if m is None:
+            end = contentPolygons.find("\t\t\t\t}\n", pos)
+            raise Exception("Could not parse polygon:\n" + contentPolygons[pos:None if end < 0 else end + 6])
+
+        values = m.groups()
+        if polygonType == PolygonTable.BOX:
+            row = polygonType, [int(value) for value in values[0:4]], [-1] * 3, 0.0, int(values[4])
+        elif polygonType == PolygonTable.SPHERE:
+            # TODO apply matrix to radius
+            row = polygonType, [int(values[0]), -1, -1, -1], [-1] * 3, float(values[1]), int(values[2])
+        elif polygonType == PolygonTable.TRI:
+            row = polygonType, [int(value) for value in values[0:3]] + [-1], [int(value) for value in values[3:6]], 0.0, int(values[6])
+        else:
+            # TODO apply matrix to radius
+            row = polygonType, [int(values[0]), int(values[1]), -1, -1], [-1] * 3, float(values[2]), int(values[3])
+
+        return row, m.end()
+
+    @staticmethod
+    def fromRows(rows: list[tuple[int, list[int], list[int], float, int]]) -> "PolygonTable":
+        return PolygonTable(
+            np.array([row[0] for row in rows], dtype=np.int8),
+            np.array([row[1] for row in rows], dtype=np.int64).reshape(-1, 4),
+            np.array([row[2] for row in rows], dtype=np.int64).reshape(-1, 3),
+            np.array([row[3] for row in rows], dtype=float),
+            np.array([row[4] for row in rows], dtype=np.int64)
+        )
+
+    @staticmethod
+    def concatenate(tables: list["PolygonTable"]) -> "PolygonTable":
+        if len(tables) == 1:
+            return tables[0]
+
+        return PolygonTable(
+            np.concatenate([table.types for table in tables]),
+            np.concatenate([table.vertices for table in tables]),
+            np.concatenate([table.siblings for table in tables]),
+            np.concatenate([table.radii for table in tables]),
+            np.concatenate([table.materialIndices for table in tables])
+        )
+
+    def __init__(self, types: np.ndarray, vertices: np.ndarray, siblings: np.ndarray, radii: np.ndarray, materialIndices: np.ndarray):
+        self.types = types
+        self.vertices = vertices
+        self.siblings = siblings
+        self.radii = radii
+        self.materialIndices = materialIndices
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def offset(self, offsetVertex: int, offsetPolygon: int, materialsMapping: list[int]) -> "PolygonTable":
+        vertices = np.where(self.vertices >= 0, self.vertices + offsetVertex, self.vertices)
+        siblings = np.where(self.siblings >= 0, self.siblings + offsetPolygon, self.siblings)
+        materialIndices = np.array(materialsMapping, dtype=np.int64)[self.materialIndices]
+        return PolygonTable(self.types, vertices, siblings, self.radii, materialIndices)
+
+    def scaled(self, scale: float) -> "PolygonTable":
+        # only the radii are affected by scaling, Box and Tri are defined by their vertices alone
+        if not self.radii.any():
+            return self
+
+        return PolygonTable(self.types, self.vertices, self.siblings, self.radii * scale, self.materialIndices)
+
+    def asPolygonsString(self) -> str:
+        parts = []
+        formats = PolygonTable._FORMATS
+        rows = zip(self.types.tolist(), self.vertices.tolist(), self.siblings.tolist(), self.radii.tolist(), self.materialIndices.tolist())
+        for polygonIndex, (polygonType, vertices, siblings, radius, materialIndex) in enumerate(rows):
+            if polygonType == PolygonTable.TRI:
+                values = (polygonIndex, vertices[0], vertices[1], vertices[2], siblings[0], siblings[1], siblings[2], materialIndex)
+            elif polygonType == PolygonTable.BOX:
+                values = (polygonIndex, vertices[0], vertices[1], vertices[2], vertices[3], materialIndex)
+            elif polygonType == PolygonTable.SPHERE:
+                values = (polygonIndex, vertices[0], radius, materialIndex)
+            else:
+                values = (polygonIndex, vertices[0], vertices[1], radius, materialIndex)
+            parts.append(formats[polygonType] % values)
+
+        return "".join(parts)
+
+    def extendBoundingGeometry(self, boundingGeometry: BoundingGeometry, vertices: np.ndarray):
+        """
+        Extends the bounding geometry by the corners of Box and Tri and by the bounding boxes of the spheres of the
+        other polygons, in the order of the polygons.
+        """
+        isSphere = np.isin(self.types, PolygonTable._SPHERE_TYPES)
+        isUsed = self.vertices >= 0
+
+        # each corner results in one point whereas each sphere results in two (its min and max vertex)
+        pointsPerVertex = np.where(isSphere, 2, 1)[:, np.newaxis] * isUsed
+        starts = (np.cumsum(pointsPerVertex) - pointsPerVertex.ravel()).reshape(pointsPerVertex.shape)
+
+        points = np.empty((pointsPerVertex.sum(), 3))
+        isCorner = isUsed & ~isSphere[:, np.newaxis]
+        points[starts[isCorner]] = vertices[self.vertices[isCorner]]
+
+        isCenter = isUsed & isSphere[:, np.newaxis]
+        centers = vertices[self.vertices[isCenter]]
+        radii = np.broadcast_to(self.radii[:, np.newaxis], isCenter.shape)[isCenter][:, np.newaxis]
+        points[starts[isCenter]] = centers - radii
+        points[starts[isCenter] + 1] = centers + radii
+
+        boundingGeometry.extendByPoints(points)
@@ -1,19 +1,24 @@
-import copy
 from re import Match
-from typing import Any
+from typing import Any, Optional
 
 import numpy as np
 from matplotlib import pyplot
 
+import hashlib
 import os
 import re
 
-from natsort import natsorted
-
 from common.PlotManager import PlotManager
 from common.Util import Util
+from common.ymap.EntityItem import EntityItem
 from common.ymap.Flag import Flag
+from common.ymap.LodLevel import LodLevel
+from common.ymap.MapSet import MapSet
+from common.ymap.ParsedYmap import ParsedYmap
+from worker.static_col_creator.BoundBVH import BoundBVH
 from worker.static_col_creator.BoundComposite import BoundComposite
+from worker.static_col_creator.Material import Material
+from worker.static_col_creator.PolygonTable import PolygonTable
 
 
 class StaticCollisionCreator:
@@ -22,8 +27,19 @@ class StaticCollisionCreator:
     IGNORE_PREVIOUS_FLAG_DISABLE_EMBEDED_COLLISION = True
     IGNORE_IF_SCALING_IS_IDENTITY = False
 
+    # directory of the arrays of the parsed collision models (one .npz file per .bound file) or None to disable the cache
+    colModelCacheDirectory: Optional[str] = os.path.join(os.path.dirname(__file__), "..", "..", ".colModelCache")
+    # incremented whenever the arrays stored per collision model change
+    COL_MODEL_CACHE_VERSION = 2
+
+    # whether writing a col model cache failed already (to warn only once)
+    _colModelCacheWriteFailed = False
+
     inputDir: str
     outputDir: str
+    inputMaps: Optional[MapSet]
+    outputMaps: MapSet
+    inMemory: bool
 
     _shouldArchetypeBeUsedInStaticCol: dict[str, bool]
     _entityColModels: dict[str, BoundComposite]
@@ -32,24 +48,12 @@ class StaticCollisionCreator:
     _entityIndex: int
     _clusters: Any
 
-    @staticmethod
-    def getRegExYmapCEntityDef():
-        return '\\s*<Item type="CEntityDef">' + \
-               '\\s*<archetypeName>([^<]+)</archetypeName>' + \
-               '\\s*<flags value="([^"]+)"\\s*/>' + \
-               '(?:\\s*<[^/].*>)*?' + \
-               '\\s*<position x="([^"]+)" y="([^"]+)" z="([^"]+)"\\s*/>' + \
-               '\\s*<rotation x="([^"]+)" y="([^"]+)" z="([^"]+)" w="([^"]+)"\\s*/>' + \
-               '\\s*<scaleXY value="([^"]+)"\\s*/>' + \
-               '\\s*<scaleZ value="([^"]+)"\\s*/>' + \
-               '(?:\\s*<[^/].*>)*?' + \
-               '\\s*<lodLevel>LODTYPES_DEPTH_(?:ORPHAN)?HD</lodLevel>' + \
-               '(?:\\s*<[^/].*>)*?' + \
-               '\\s*</Item>'
-
-    def __init__(self, inputDir: str, outputDir: str):
+    def __init__(self, inputDir: str, outputDir: str, inputMaps: Optional[MapSet] = None, inMemory: bool = False):
         self.inputDir = inputDir
         self.outputDir = outputDir
+        self.inputMaps = inputMaps
+        self.inMemory = inMemory
+        self.outputMaps = MapSet(None if inMemory else self.getOutputDirMaps())
         self._shouldArchetypeBeUsedInStaticCol = {}
         self._entityColModels = {}
         # clustering-related state
@@ -63,8 +67,10 @@ class StaticCollisionCreator:
     def run(self):
         print("running static collision model creator...")
         self.createOutputDirs()
+        self.readInputMaps()
         self.processFiles()
         self.copyOthers()
+        self.writeOutputMaps()
         print("static collision model creator DONE")
 
     def createOutputDirs(self):
@@ -72,7 +78,8 @@ class StaticCollisionCreator:
             raise ValueError("Output dir " + self.outputDir + " must not exist")
 
         os.makedirs(self.outputDir)
-        os.mkdir(self.getOutputDirMaps())
+        if not self.inMemory:
+            os.mkdir(self.getOutputDirMaps())
         os.mkdir(self.getOutputDirCollisionModels())
 
         # if os.path.exists("cols"):
@@ -80,6 +87,14 @@ class StaticCollisionCreator:
         # else:
         #    os.mkdir(self.outputDir + "/cols")
 
+    def readInputMaps(self):
+        if self.inputMaps is None:
+            self.inputMaps = MapSet.readDirectory(self.inputDir)
+
+    def writeOutputMaps(self):
+        if not self.inMemory:
+            self.outputMaps.writeDirectory(self.getOutputDirMaps())
+
     def getOutputDirMaps(self):
         return os.path.join(self.outputDir, "maps")
 
@@ -250,27 +265,31 @@ class StaticCollisionCreator:
 
         return True
 
-    def replaceYmapCEntityDef(self, match: Match) -> str:
-        entity = match.group(1).lower()
-        flags = int(match.group(2))
+    def isHdEntity(self, entity: EntityItem) -> bool:
+        return entity.flags is not None and (entity.lodLevel == LodLevel.HD or entity.lodLevel == LodLevel.ORPHAN_HD)
+
+    def replaceYmapCEntityDef(self, entity: EntityItem, entityContent: str) -> str:
+        if not self.isHdEntity(entity):
+            return entityContent
+
+        archetypeName = entity.archetypeName.lower()
+        flags = entity.flags
 
-        scale = [float(match.group(10)), float(match.group(10)), float(match.group(11))]
+        scale = entity.scale
 
-        if not self.shouldEntityBeUsedInStaticCol(entity, flags, scale):
+        if not self.shouldEntityBeUsedInStaticCol(archetypeName, flags, scale):
             if StaticCollisionCreator.IGNORE_PREVIOUS_FLAG_DISABLE_EMBEDED_COLLISION:
                 flags &= ~Flag.DISABLE_EMBEDDED_COLLISION
-                return re.sub('(?<=<flags value=")[^"]+("\\s*/>)', str(flags) + "\\g<1>", match.group(0), flags=re.M)
+                return ParsedYmap.replaceValue(entityContent, "flags", str(flags))
             else:
-                return match.group(0)
+                return entityContent
 
         flags |= Flag.DISABLE_EMBEDDED_COLLISION
 
-        position = [float(match.group(3)), float(match.group(4)), float(match.group(5))]
-        rotationQuaternion = [float(match.group(9)), -float(match.group(6)), -float(match.group(7)), -float(match.group(8))]  # order is w, -x, -y, -z
+        position = entity.position
+        rotationQuaternion = entity.rotation  # order is w, -x, -y, -z
 
-        boundComposite = self.getEntityColModel(entity)
-
-        boundComposite.transform(rotationQuaternion, scale, position)
+        boundComposite = self.getEntityColModel(archetypeName).transformed(rotationQuaternion, scale, position)
 
         # Assign this instance to a cluster. In normal cases, clustering has
         # already been computed in processFile() and _clusters contains one
@@ -288,19 +307,96 @@ class StaticCollisionCreator:
 
         self.mergeColChildren(cluster, boundComposite)
 
-        return re.sub('(?<=<flags value=")[^"]+("\\s*/>)', str(flags) + "\\g<1>", match.group(0), flags=re.M)
+        return ParsedYmap.replaceValue(entityContent, "flags", str(flags))
 
     def getEntityColModel(self, entity: str) -> BoundComposite:
+        # the parsed model is shared by all instances of the archetype and must not be modified
         if entity not in self._entityColModels:
             boundPath = self.getColModelPathCandidate(entity)
-            boundContent = Util.readFile(boundPath)
-
-            boundContent = self.convertToBoundComposite(boundContent)
-            boundContent = self.convertToBoundBVH(boundContent)
-
-            self._entityColModels[entity] = BoundComposite.parse(boundContent)
+            stat = os.stat(boundPath)
+            signature = (stat.st_size, stat.st_mtime_ns)
+
+            boundComposite = self.readColModelCache(boundPath, signature)
+            if boundComposite is None:
+                boundContent = Util.readFile(boundPath)
+
+                boundContent = self.convertToBoundComposite(boundContent)
+                boundContent = self.convertToBoundBVH(boundContent)
+
+                boundComposite = BoundComposite.parse(boundContent)
+                self.writeColModelCache(boundPath, signature, boundComposite)
+
+            self._entityColModels[entity] = boundComposite
+
+        return self._entityColModels[entity]
+
+    def getColModelCachePath(self, boundPath: str) -> str:
+        key = hashlib.sha256(os.path.abspath(boundPath).encode()).hexdigest()
+        return os.path.join(StaticCollisionCreator.colModelCacheDirectory, key + ".npz")
+
+    def readColModelCache(self, boundPath: str, signature: tuple) -> Optional[BoundComposite]:
+        if StaticCollisionCreator.colModelCacheDirectory is None:
+            return None
+
+        try:
+            with np.load(self.getColModelCachePath(boundPath), allow_pickle=False) as arrays:
+                if arrays["version"] != StaticCollisionCreator.COL_MODEL_CACHE_VERSION or arrays["signature"].tolist() != list(signature) \
+                        or str(arrays["path"]) != os.path.abspath(boundPath):
+                    return None
+
+                children = []
+                for i in range(int(arrays["numChildren"])):
+                    prefix = str(i) + "."
+                    polygons = PolygonTable(arrays[prefix + "types"], arrays[prefix + "polygonVertices"], arrays[prefix + "siblings"],
+                                            arrays[prefix + "radii"], arrays[prefix + "materialIndices"])
+                    materials = [Material(materialIndex, polyFlags) for materialIndex, polyFlags in
+                                 zip(arrays[prefix + "materialIndex"].tolist(), arrays[prefix + "polyFlags"].tolist())]
+                    shrunk = arrays[prefix + "shrunk"] if prefix + "shrunk" in arrays else None
+                    flags1, flags2 = arrays[prefix + "flags"].tolist()
+                    children.append(BoundBVH(polygons, materials, float(arrays[prefix + "margin"]), arrays[prefix + "vertices"], shrunk, flags1, flags2))
+        except Exception:
+            return None
+
+        return BoundComposite(children)
+
+    def writeColModelCache(self, boundPath: str, signature: tuple, boundComposite: BoundComposite):
+        if StaticCollisionCreator.colModelCacheDirectory is None:
+            return
 
-        return copy.deepcopy(self._entityColModels[entity])
+        arrays = {
+            "version": np.array(StaticCollisionCreator.COL_MODEL_CACHE_VERSION),
+            "signature": np.array(signature, dtype=np.int64),
+            "path": np.array(os.path.abspath(boundPath)),
+            "numChildren": np.array(len(boundComposite.children)),
+        }
+        for i, child in enumerate(boundComposite.children):
+            prefix = str(i) + "."
+            polygons = child.getPolygons()
+            arrays[prefix + "types"] = polygons.types
+            arrays[prefix + "polygonVertices"] = polygons.vertices
+            arrays[prefix + "siblings"] = polygons.siblings
+            arrays[prefix + "radii"] = polygons.radii
+            arrays[prefix + "materialIndices"] = polygons.materialIndices
+            arrays[prefix + "materialIndex"] = np.array([material.materialIndex for material in child.materials], dtype=np.int64)
+            arrays[prefix + "polyFlags"] = np.array([material.polyFlags for material in child.materials], dtype=str)
+            arrays[prefix + "margin"] = np.array(child.margin)
+            arrays[prefix + "vertices"] = child.getVertices()
+            if child.getShrunk() is not None:
+                arrays[prefix + "shrunk"] = child.getShrunk()
+            arrays[prefix + "flags"] = np.array([child.flags1, child.flags2])
+
+        cacheFile = self.getColModelCachePath(boundPath)
+        # several worker processes may parse the same model, hence the temporary file is unique per process
+        tmpFile = cacheFile + "." + str(os.getpid()) + ".tmp"
+        try:
+            os.makedirs(StaticCollisionCreator.colModelCacheDirectory, exist_ok=True)
+            with open(tmpFile, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(tmpFile, cacheFile)
+        except OSError as e:
+            if not StaticCollisionCreator._colModelCacheWriteFailed:
+                StaticCollisionCreator._colModelCacheWriteFailed = True
+                print("\tWARNING: could not write collision model cache " + cacheFile + ": " + str(e))
 
     def convertToBoundComposite(self, boundContent: str) -> str:
         if boundContent.startswith("Version 43 31\n{\n\tType BoundComposite\n"):
@@ -412,10 +508,7 @@ class StaticCollisionCreator:
         self._colChildren[cluster].merge(boundComposite)
 
     def processFiles(self):
-        for mapFilename in natsorted(os.listdir(self.inputDir)):
-            if not mapFilename.endswith(".ymap.xml"):
-                continue
-
+        for mapFilename in self.inputMaps.getYmapFilenames():
             self.processFile(mapFilename)
 
         if self._plot_coords_2d:
@@ -427,28 +520,13 @@ class StaticCollisionCreator:
     def processFile(self, mapFilename: str):
         print("\tprocessing " + mapFilename)
 
-        mapFile = open(os.path.join(self.inputDir, mapFilename), 'r')
-        mapContent = mapFile.read()
-        mapFile.close()
+        ymap = self.inputMaps.getYmap(mapFilename, False)
 
         # <!-- clustering
-        pattern = re.compile('[\t ]*<Item type="CEntityDef">' +
-                             '\\s*<archetypeName>([^<]+)</archetypeName>' +
-                             '\\s*<flags value="([^"]+)"\\s*/>' +
-                             '(?:\\s*<[^/].*>)*?' +
-                             '\\s*<position x="([^"]+)" y="([^"]+)" z="([^"]+)"\\s*/>' +
-                             '(?:\\s*<[^/].*>)*?' +
-                             '\\s*<scaleXY value="([^"]+)"\s*/>' +
-                             '\\s*<scaleZ value="([^"]+)"\s*/>' +
-                             '(?:\\s*<[^/].*>)*?' +
-                             '\\s*<lodLevel>LODTYPES_DEPTH_(?:ORPHAN)?HD</lodLevel>' +
-                             '(?:\\s*<[^/].*>)*?' +
-                             '\\s*</Item>[\r\n]+')
-
         coords = []
-        for matchobj in re.finditer(pattern, mapContent):
-            if self.shouldEntityBeUsedInStaticCol(matchobj.group(1).lower(), int(matchobj.group(2)), [float(matchobj.group(6)), float(matchobj.group(6)), float(matchobj.group(7))]):
-                coords.append([float(matchobj.group(3)), float(matchobj.group(4)), float(matchobj.group(5))])
+        for entity in ymap.entities:
+            if self.isHdEntity(entity) and self.shouldEntityBeUsedInStaticCol(entity.archetypeName.lower(), entity.flags, entity.scale):
+                coords.append(entity.position)
 
         foundScolModel = len(coords) > 0
 
@@ -479,11 +557,9 @@ class StaticCollisionCreator:
             pyplot.scatter(coords_np[:, 0], coords_np[:, 1], marker='.', s=10, edgecolors='none', alpha=0.6)
 
         self._entityIndex = 0
-        mapContentNew = re.sub(StaticCollisionCreator.getRegExYmapCEntityDef(), self.replaceYmapCEntityDef, mapContent, flags=re.M)
+        mapContentNew = ymap.replaceEntities(lambda i, entityContent: self.replaceYmapCEntityDef(ymap.entities[i], entityContent))
 
-        mapFileNew = open(os.path.join(self.getOutputDirMaps(), mapFilename), 'w')
-        mapFileNew.write(mapContentNew)
-        mapFileNew.close()
+        self.outputMaps.setContent(mapFilename, mapContentNew)
 
         if not foundScolModel:
             return
@@ -535,4 +611,4 @@ class StaticCollisionCreator:
 
     def copyOthers(self):
         # copy other files
-        Util.copyFiles(self.inputDir, self.getOutputDirMaps(), lambda filename: not filename.endswith(".ymap.xml"))
+        self.outputMaps.copyOthers(self.inputMaps)
@@ -1,5 +1,5 @@
 import os
-import re
+from typing import Optional
 
 import numpy as np
 from matplotlib import pyplot
@@ -7,6 +7,7 @@ from natsort import natsorted
 
 from common.PlotManager import PlotManager
 from common.ymap.LodLevel import LodLevel
+from common.ymap.MapSet import MapSet
 from common.ytyp.YtypItem import YtypItem
 from common.ytyp.YtypParser import YtypParser
 
@@ -14,36 +15,36 @@ from common.ytyp.YtypParser import YtypParser
 class StatisticsPrinter:
     countProps: dict[str, dict[str, int]]
     inputDir: str
+    inputMaps: Optional[MapSet]
     ytypItems: dict[str, YtypItem]
 
-    def __init__(self, inputDir: str):
+    def __init__(self, inputDir: str, inputMaps: Optional[MapSet] = None):
         self.inputDir = inputDir
+        self.inputMaps = inputMaps
 
     def run(self):
+        self.readInputMaps()
         self.readYtypItems()
         self.countProps = {}
         self.processFiles()
 
+    def readInputMaps(self):
+        if self.inputMaps is None:
+            self.inputMaps = MapSet.readDirectory(self.inputDir)
+
     def readYtypItems(self):
-        self.ytypItems = YtypParser.readYtypDirectory(os.path.join(os.path.dirname(__file__), "..", "..", "resources", "ytyp"))
+        self.ytypItems = YtypParser.readYtypDirectoryCached(os.path.join(os.path.dirname(__file__), "..", "..", "resources", "ytyp"))
 
     def processFiles(self):
-        for filename in natsorted(os.listdir(self.inputDir)):
-            if not filename.endswith(".ymap.xml") or filename.endswith("_lod.ymap.xml"):
+        for filename in self.inputMaps.getYmapFilenames():
+            if filename.endswith("_lod.ymap.xml"):
                 continue
 
-            f = open(os.path.join(self.inputDir, filename), 'r')
-            content = f.read()
-
-            expression = '<Item type="CEntityDef">' + \
-                         '\\s*<archetypeName>([^<]+)</archetypeName>' + \
-                         '(?:\\s*<[^/].*>)*?' + \
-                         '\\s*<lodLevel>(?:' + LodLevel.HD + "|" + LodLevel.ORPHAN_HD + ')</lodLevel>' + \
-                         '(?:\\s*<[^/].*>)*?' + \
-                         '\\s*</Item>'
+            for entity in self.inputMaps.getEntities(filename):
+                if entity.lodLevel != LodLevel.HD and entity.lodLevel != LodLevel.ORPHAN_HD:
+                    continue
 
-            for match in re.finditer(expression, content):
-                archetypeName = match.group(1).lower()
+                archetypeName = entity.archetypeName.lower()
 
                 if archetypeName in self.ytypItems:
                     ytypName = self.ytypItems[archetypeName].parent
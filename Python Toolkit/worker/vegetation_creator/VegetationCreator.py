@@ -3,17 +3,17 @@ import math
 import numpy as np
 import os
 import random
-import re
+from typing import Optional
 
 from numpy import ndarray
 from scipy.spatial import Delaunay, KDTree
 from scipy.spatial.distance import pdist
 import matplotlib.pyplot as pyplot
 
-from natsort import natsorted
-
 from common.PlotManager import PlotManager
+from common.Template import Template
 from common.Util import Util
+from common.ymap.MapSet import MapSet
 
 
 class VegetationCreator:
@@ -258,14 +258,20 @@ class VegetationCreator:
 
     inputDir: str
     outputDir: str
+    inputMaps: Optional[MapSet]
+    outputMaps: MapSet
+    inMemory: bool
     prefix: str
-    contentTemplateEntity: str
-    contentTemplateMap: str
+    contentTemplateEntity: Template
+    contentTemplateMap: Template
 
 
-    def __init__(self, inputDir: str, outputDir: str, prefix: str):
+    def __init__(self, inputDir: str, outputDir: str, prefix: str, inputMaps: Optional[MapSet] = None, inMemory: bool = False):
         self.inputDir = inputDir
         self.outputDir = outputDir
+        self.inputMaps = inputMaps
+        self.inMemory = inMemory
+        self.outputMaps = MapSet(None if inMemory else outputDir)
         self.prefix = prefix
 
         # using a specific seed to be able to get reproducible results
@@ -275,37 +281,43 @@ class VegetationCreator:
         print("running vegetation creator...")
         self.readTemplates()
         self.createOutputDir()
+        self.readInputMaps()
         self.copyInput()
         self.processFiles()
+        self.writeOutputMaps()
         print("vegetation creator DONE")
 
     def createOutputDir(self):
+        if self.inMemory:
+            return
+
         if os.path.exists(self.outputDir):
             raise ValueError("Output dir " + self.outputDir + " must not exist")
 
         os.makedirs(self.outputDir)
 
+    def readInputMaps(self):
+        if self.inputMaps is None:
+            self.inputMaps = MapSet.readDirectory(self.inputDir)
+
+    def writeOutputMaps(self):
+        if not self.inMemory:
+            self.outputMaps.writeDirectory(self.outputDir)
 
     def readTemplates(self):
         templatesDir = os.path.join(os.path.dirname(__file__), "templates")
 
-        f = open(os.path.join(templatesDir, "template_entity.ymap.xml"), 'r')
-        self.contentTemplateEntity = f.read()
-        f.close()
-
-        f = open(os.path.join(templatesDir, "template.ymap.xml"), 'r')
-        self.contentTemplateMap = f.read()
-        f.close()
+        self.contentTemplateEntity = Template.readFile(os.path.join(templatesDir, "template_entity.ymap.xml"))
+        self.contentTemplateMap = Template.readFile(os.path.join(templatesDir, "template.ymap.xml"))
 
 
     def processFiles(self):
         mapNames = []
         points = []
         archetypes = []
-        for filename in natsorted(os.listdir(self.inputDir)):
-            if filename.endswith(".ymap.xml"):
-                mapNames.append(Util.getMapnameFromFilename(filename))
-                self.processFile(filename, points, archetypes)
+        for filename in self.inputMaps.getYmapFilenames():
+            mapNames.append(Util.getMapnameFromFilename(filename))
+            self.processFile(filename, points, archetypes)
 
         countInitPoints = len(points)
         if countInitPoints == 0:
@@ -424,44 +436,34 @@ class VegetationCreator:
         return random.choice(choices)
 
     def createYmap(self, mapName: str, points: list[list[float]], archetypes: list[str]):
-        contentEntities = ""
+        parts = []
         for i in range(len(points)):
             point = points[i]
             archetype = archetypes[i]
 
-            contentEntities += self.contentTemplateEntity \
-                .replace("${NAME}", archetype) \
-                .replace("${POSITION.X}", Util.floatToStr(point[0])) \
-                .replace("${POSITION.Y}", Util.floatToStr(point[1])) \
-                .replace("${POSITION.Z}", Util.floatToStr(point[2]))
+            self.contentTemplateEntity.renderTo(parts, {
+                "NAME": archetype,
+                "POSITION.X": Util.floatToStr(point[0]),
+                "POSITION.Y": Util.floatToStr(point[1]),
+                "POSITION.Z": Util.floatToStr(point[2])
+            })
 
-        map = self.contentTemplateMap \
-            .replace("${NAME}", mapName) \
-            .replace("${ENTITIES}\n", contentEntities)
+        map = self.contentTemplateMap.render({
+            "NAME": mapName,
+            "ENTITIES": parts
+        })
 
-        fileMap = open(os.path.join(self.outputDir, Util.getFilenameFromMapname(mapName)), 'w')
-        fileMap.write(map)
-        fileMap.close()
+        self.outputMaps.setContent(Util.getFilenameFromMapname(mapName), map)
 
     def processFile(self, filename: str, points: list[list[float]], archetypes: list[str]):
         print("\tprocessing " + filename)
 
-        f = open(os.path.join(self.inputDir, filename), 'r')
-        content = f.read()
-        f.close()
-
-        for match in re.finditer('<Item type="CEntityDef">' +
-                             '\\s*<archetypeName>([^<]+)</archetypeName>' +
-                             '(?:\\s*<[^/].*>)*?' +
-                             '\\s*<position x="([^"]+)" y="([^"]+)" z="([^"]+)"/>' +
-                             '(?:\\s*<[^/].*>)*?' +
-                             '\\s*</Item>', content):
-
-            archetypeName = match.group(1)
+        for entity in self.inputMaps.getEntities(filename):
+            archetypeName = entity.archetypeName
             if archetypeName not in VegetationCreator.ARCHETYPE_GROUP_MAPPING:
                 continue
 
-            points.append([float(match.group(2)), float(match.group(3)), float(match.group(4))])
+            points.append(entity.position)
             archetypes.append(archetypeName)
 
     def getNewMapName(self, mapNames: list[str]):
@@ -480,4 +482,6 @@ class VegetationCreator:
         return finalMapName
 
     def copyInput(self):
-        Util.copyFiles(self.inputDir, self.outputDir)
+        for filename in self.inputMaps.getYmapFilenames():
+            self.outputMaps.setContent(filename, self.inputMaps.getContent(filename))
+        self.outputMaps.copyOthers(self.inputMaps)